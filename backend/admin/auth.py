@@ -63,7 +63,7 @@ async def verify_admin_token(token: str):
             return None
         
         db = get_database()
-        user = await db.find_one("users", {"email": email})
+        user = await db.find_one("users", {"email": email}, projection="user_principal")
         
         if not user or user.get("role") != "admin":
             return None
@@ -7,6 +7,7 @@ import base64
 from typing import List, Dict, Optional, Any
 import logging
 from bson import ObjectId
+from db.catalog_view import refresh_products
 
 logger = logging.getLogger(__name__)
 load_dotenv()
@@ -324,6 +325,7 @@ class CloudinaryManager:
                 {"_id": ObjectId(product_id)},
                 {"$set": {"images": reordered_images}}
             )
+            await refresh_products(db, [product_id])
             
             logger.info(f"Reordered images for product {product_id}")
             return True
@@ -4,6 +4,7 @@ import logging
 from admin.connection_manager import manager
 from dotenv import load_dotenv
 from admin.utils.serialize import serialize_document
+from db.pagination import apply_cursor, keyset_sort, split_page
 from bson import ObjectId
 from starlette.websockets import WebSocketDisconnect
 
@@ -30,22 +31,26 @@ async def handle_get_users(websocket: WebSocket, filters: dict, db):
         if filters.get("is_active") is not None:
             query["is_active"] = filters["is_active"]
         
-        # Pagination
+        # Pagination: a cursor from the previous response continues after its last
+        # user without skipping; page/limit keeps working for the current panel
+        cursor = filters.get("cursor")
         page = filters.get("page", 1)
         limit = filters.get("limit", 100)  # Increased limit for admin view
-        skip = (page - 1) * limit
+        skip = 0 if cursor else (page - 1) * limit
         
-        # Get total count
-        total = await db.count_documents("users", query)
+        # Get total count (only for page mode, cursor mode never needs it)
+        total = None if cursor else await db.count_documents("users", query)
         
         # Get users
         users = await db.find_many(
             "users",
-            query,
-            sort=[("created_at", -1)],
+            apply_cursor(query, cursor),
+            sort=keyset_sort(),
             skip=skip,
-            limit=limit
+            limit=limit + 1,
+            projection="user_public"
         )
+        users, next_cursor = split_page(users, limit)
         
         # Remove sensitive data and serialize
         processed_users = []
@@ -69,8 +74,9 @@ async def handle_get_users(websocket: WebSocket, filters: dict, db):
                 "type": "users_data",
                 "users": processed_users,
                 "total": total,
-                "page": page,
-                "pages": (total + limit - 1) // limit
+                "page": None if cursor else page,
+                "pages": None if cursor else (total + limit - 1) // limit,
+                "next_cursor": next_cursor
             })
         except (WebSocketDisconnect, RuntimeError):
             logger.warning("Tried to send data but the connection is lost")
@@ -3,6 +3,7 @@ import logging
 from admin.utils.serialize import serialize_document
 from datetime import datetime
 from bson import ObjectId
+from db.catalog_view import refresh_brand
 from admin.connection_manager import manager
 from admin.config.cloudinary_config import CloudinaryManager
 
@@ -268,6 +269,8 @@ async def update_brand(websocket: WebSocket, data: dict, user_info: dict, db):
         )
 
         if result:
+            await refresh_brand(db, brand_id)
+            
             # Get updated brand
             updated_brand = await db.find_one("brands", {"_id": ObjectId(brand_id)})
             updated_brand = serialize_document(updated_brand)
@@ -349,6 +352,8 @@ async def delete_brand(websocket: WebSocket, data: dict, user_info: dict, db):
         result = await db.delete_one("brands", {"_id": ObjectId(brand_id)})
 
         if result:
+            await refresh_brand(db, brand_id)
+            
             # Send success response
             await websocket.send_json({
                 "type": "brand_deleted",
@@ -4,6 +4,7 @@ from admin.utils.serialize import serialize_document
 from datetime import datetime
 from admin.config.cloudinary_config import CloudinaryManager
 from bson import ObjectId
+from db.catalog_view import refresh_category
 from admin.connection_manager import manager
 
 logger = logging.getLogger(__name__)
@@ -281,6 +282,8 @@ async def update_category(websocket: WebSocket, data: dict, user_info: dict, db)
         )
 
         if result:
+            await refresh_category(db, category_id)
+            
             # Get updated category
             updated_cat = await db.find_one("categories", {"_id": ObjectId(category_id)})
             updated_cat = serialize_document(updated_cat)
@@ -371,6 +374,8 @@ async def delete_category(websocket: WebSocket, data: dict, user_info: dict, db)
         result = await db.delete_one("categories", {"_id": ObjectId(category_id)})
         
         if result:
+            await refresh_category(db, category_id)
+            
             # Send success response
             await websocket.send_json({
                 "type": "category_deleted",
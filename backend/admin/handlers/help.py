@@ -2,6 +2,7 @@ from fastapi import WebSocket
 from bson import ObjectId
 from datetime import datetime
 from admin.utils.serialize import serialize_document
+from db.pagination import MAX_PAGE_LIMIT, apply_cursor, keyset_sort, opt_in_limit, split_page
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,12 +23,16 @@ async def get_tickets(websocket: WebSocket, filters: dict, db):
         
         logger.info(f"Fetching tickets with query: {query}")
         
-        # Get tickets
+        # Get tickets, newest first. Panels that send limit or cursor get one page at a
+        # time and pass back next_cursor to load older tickets; older panels get them all
+        limit = opt_in_limit(filters.get("limit"), filters.get("cursor"), default=MAX_PAGE_LIMIT)
         tickets = await db.find_many(
             "support_tickets", 
-            query, 
-            sort=[("created_at", -1)]
+            apply_cursor(query, filters.get("cursor")), 
+            sort=keyset_sort(),
+            limit=limit + 1 if limit else 0
         )
+        tickets, next_cursor = split_page(tickets, limit)
         
         logger.info(f"Found {len(tickets)} tickets")
         
@@ -38,7 +43,7 @@ async def get_tickets(websocket: WebSocket, filters: dict, db):
                 # Get user info for this ticket
                 user_info = None
                 if ticket.get("user_id"):
-                    user_info = await db.find_one("users", {"_id": ticket["user_id"]})
+                    user_info = await db.find_one("users", {"_id": ticket["user_id"]}, projection="user_contact")
                 
                 # Manual serialization to handle datetime objects
                 serialized_ticket = {
@@ -142,7 +147,8 @@ async def get_tickets(websocket: WebSocket, filters: dict, db):
         await websocket.send_json({
             "type": "help_tickets_data",
             "tickets": enriched_tickets,
-            "total_count": len(enriched_tickets)
+            "total_count": len(enriched_tickets),
+            "next_cursor": next_cursor
         })
         
     except Exception as e:
@@ -186,7 +192,7 @@ async def get_ticket_detail(websocket: WebSocket, data: dict, db):
         # Get user information
         user_info = None
         if ticket.get("user_id"):
-            user_info = await db.find_one("users", {"_id": ticket["user_id"]})
+            user_info = await db.find_one("users", {"_id": ticket["user_id"]}, projection="user_contact")
         
         # Manual serialization with proper datetime handling
         serialized_ticket = {
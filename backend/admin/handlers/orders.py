@@ -6,9 +6,14 @@ from admin.utils.serialize import serialize_document
 from bson import ObjectId
 from typing import Dict, Any
 import math
+import os
 
 logger = logging.getLogger(__name__)
 
+DOWNLOAD_BATCH_SIZE = 1000
+# Most orders one export sends; filters["limit"] can only lower it
+DOWNLOAD_MAX_ORDERS = int(os.getenv('DOWNLOAD_MAX_ORDERS', 10000))
+
 async def send_orders(websocket: WebSocket, filters: dict, db):
     """Send orders with advanced filtering and pagination"""
     try:
@@ -60,81 +65,8 @@ async def send_orders(websocket: WebSocket, filters: dict, db):
         
         logger.info(f"Pagination info: {pagination_info}")
         
-        # Process orders with optimized queries
-        serialized_orders = []
-        
-        # Batch fetch users and delivery partners to reduce DB calls
-        user_ids = [order.get("user") for order in orders if order.get("user")]
-        delivery_partner_ids = [order.get("delivery_partner") for order in orders 
-                             if order.get("delivery_partner")]
-        
-        # Fetch users in batch
-        users_dict = {}
-        if user_ids:
-            users = await db.find_many("users", {"_id": {"$in": user_ids}})
-            users_dict = {str(user["_id"]): user for user in users}
-        
-        # Fetch delivery partners in batch
-        delivery_partners_dict = {}
-        if delivery_partner_ids:
-            partners = await db.find_many("users", {"_id": {"$in": delivery_partner_ids}})
-            delivery_partners_dict = {str(partner["_id"]): partner for partner in partners}
-        
-        # Batch fetch products for order items
-        product_ids = []
-        for order in orders:
-            if order.get("items"):
-                for item in order["items"]:
-                    if item.get("product"):
-                        product_ids.append(ObjectId(item["product"]))
-        
-        products_dict = {}
-        if product_ids:
-            products = await db.find_many("products", {"_id": {"$in": product_ids}})
-            products_dict = {str(product["_id"]): product for product in products}
-        
-        # Process each order
-        for order in orders:
-            try:
-                # Get user info
-                user_id = str(order.get("user", ""))
-                user = users_dict.get(user_id, {})
-                
-                # Get delivery partner info
-                delivery_partner_id = str(order.get("delivery_partner", "")) if order.get("delivery_partner") else None
-                delivery_partner = delivery_partners_dict.get(delivery_partner_id) if delivery_partner_id else None
-                
-                # Process order items
-                if order.get("items"):
-                    for item in order["items"]:
-                        product_id = str(item.get("product", ""))
-                        product = products_dict.get(product_id, {})
-                        item["product_name"] = product.get("name", "Unknown Product")
-                        item["product_image"] = product.get("images", [])
-                
-                # Serialize the order
-                serialized_order = serialize_document(order)
-                
-                # Add frontend-friendly field mappings
-                serialized_order["id"] = serialized_order["_id"]
-                serialized_order["total"] = serialized_order.get("total_amount", 0)
-                serialized_order["status"] = serialized_order.get("order_status", "pending")
-                
-                # Add user information
-                serialized_order["user_name"] = user.get("name", "Unknown")
-                serialized_order["user_email"] = user.get("email", "")
-                serialized_order["user_phone"] = user.get("phone", "")
-                
-                # Add delivery partner information
-                serialized_order["delivery_partner_name"] = (
-                    delivery_partner.get("name") if delivery_partner else None
-                )
-                
-                serialized_orders.append(serialized_order)
-                
-            except Exception as serialize_error:
-                logger.error(f"Error serializing order {order.get('_id')}: {serialize_error}")
-                continue
+        # Enrich the page with user, delivery partner and product details in batch
+        serialized_orders = await serialize_orders_with_details(orders, db)
         
         logger.info(f"Sending {len(serialized_orders)} serialized orders with pagination")
 
@@ -305,7 +237,7 @@ async def get_delivery_requests_for_order(websocket: WebSocket, data: dict, db):
 
         # Batch fetch partner details
         if partners:
-            partner_docs = await db.find_many("users", {"_id": {"$in": partners}})
+            partner_docs = await db.find_many("users", {"_id": {"$in": partners}}, projection="user_contact")
             partner_list = [
                 {
                     "id": str(partner["_id"]),
@@ -409,7 +341,7 @@ async def assign_delivery_partner(websocket: WebSocket, data: dict, db):
 #         logger.error(f"Error creating orders indexes: {e}")
 
 async def get_orders_for_download(websocket: WebSocket, filters: dict, db):
-    """Get orders for CSV download with specified filters"""
+    """Stream orders for CSV download in chunks so memory stays flat on large exports"""
     try:
         # Check if WebSocket is still connected
         if hasattr(websocket, 'client_state') and websocket.client_state.value != 1:
@@ -422,107 +354,50 @@ async def get_orders_for_download(websocket: WebSocket, filters: dict, db):
         
         logger.info(f"Download query: {query}")
         
-        # Get all orders matching the criteria (no pagination for download)
         sort_criteria = [("created_at", -1)]
         
-        # Limit to reasonable amount for download (max 10000 orders)
-        limit = min(filters.get("limit", 10000), 10000)
+        # Hard cap on exported orders
+        max_orders = min(filters.get("limit") or DOWNLOAD_MAX_ORDERS, DOWNLOAD_MAX_ORDERS)
+        batch_size = min(filters.get("batch_size", DOWNLOAD_BATCH_SIZE), DOWNLOAD_BATCH_SIZE)
         
-        orders = await db.find_many(
-            "orders", 
-            query, 
+        total_sent = 0
+        chunk_index = 0
+        
+        chunks = db.iter_many(
+            "orders",
+            query,
             sort=sort_criteria,
-            limit=limit
+            batch_size=batch_size,
+            max_docs=max_orders
         )
-        
-        logger.info(f"Found {len(orders)} orders for download")
-        
-        # Process orders with optimized queries (same logic as send_orders)
-        serialized_orders = []
-        
-        # Batch fetch users and delivery partners to reduce DB calls
-        user_ids = [order.get("user") for order in orders if order.get("user")]
-        delivery_partner_ids = [order.get("delivery_partner") for order in orders 
-                             if order.get("delivery_partner")]
-        
-        # Fetch users in batch
-        users_dict = {}
-        if user_ids:
-            users = await db.find_many("users", {"_id": {"$in": user_ids}})
-            users_dict = {str(user["_id"]): user for user in users}
-        
-        # Fetch delivery partners in batch
-        delivery_partners_dict = {}
-        if delivery_partner_ids:
-            partners = await db.find_many("users", {"_id": {"$in": delivery_partner_ids}})
-            delivery_partners_dict = {str(partner["_id"]): partner for partner in partners}
-        
-        # Batch fetch products for order items
-        product_ids = []
-        for order in orders:
-            if order.get("items"):
-                for item in order["items"]:
-                    if item.get("product"):
-                        product_ids.append(ObjectId(item["product"]))
-        
-        products_dict = {}
-        if product_ids:
-            products = await db.find_many("products", {"_id": {"$in": product_ids}})
-            products_dict = {str(product["_id"]): product for product in products}
-        
-        # Process each order
-        for order in orders:
-            try:
-                # Get user info
-                user_id = str(order.get("user", ""))
-                user = users_dict.get(user_id, {})
-                
-                # Get delivery partner info
-                delivery_partner_id = str(order.get("delivery_partner", "")) if order.get("delivery_partner") else None
-                delivery_partner = delivery_partners_dict.get(delivery_partner_id) if delivery_partner_id else None
-                
-                # Process order items
-                if order.get("items"):
-                    for item in order["items"]:
-                        product_id = str(item.get("product", ""))
-                        product = products_dict.get(product_id, {})
-                        item["product_name"] = product.get("name", "Unknown Product")
-                        item["product_image"] = product.get("images", [])
-                
-                # Serialize the order
-                serialized_order = serialize_document(order)
-                
-                # Add frontend-friendly field mappings
-                serialized_order["id"] = serialized_order["_id"]
-                serialized_order["total"] = serialized_order.get("total_amount", 0)
-                serialized_order["status"] = serialized_order.get("order_status", "pending")
-                
-                # Add user information
-                serialized_order["user_name"] = user.get("name", "Unknown")
-                serialized_order["user_email"] = user.get("email", "")
-                serialized_order["user_phone"] = user.get("phone", "")
-                
-                # Add delivery partner information
-                serialized_order["delivery_partner_name"] = (
-                    delivery_partner.get("name") if delivery_partner else None
-                )
-                
-                # Add delivery address for CSV
-                if order.get("delivery_address"):
-                    serialized_order["delivery_address"] = order["delivery_address"]
+        try:
+            async for orders in chunks:
+                if hasattr(websocket, 'client_state') and websocket.client_state.value != 1:
+                    logger.info("Client disconnected, cancelling orders download")
+                    return
                 
-                serialized_orders.append(serialized_order)
+                serialized_orders = await serialize_orders_with_details(orders, db, include_address=True)
+                total_sent += len(serialized_orders)
                 
-            except Exception as serialize_error:
-                logger.error(f"Error serializing order for download {order.get('_id')}: {serialize_error}")
-                continue
-        
-        logger.info(f"Sending {len(serialized_orders)} orders for download")
+                await websocket.send_json({
+                    "type": "orders_download_data",
+                    "orders": serialized_orders,
+                    "chunk": chunk_index,
+                    "has_more": True
+                })
+                chunk_index += 1
+        finally:
+            # Closes the server cursor right away when the loop stops early
+            await chunks.aclose()
+        
+        logger.info(f"Sent {total_sent} orders for download in {chunk_index} chunks")
 
         await websocket.send_json({
             "type": "orders_download_data",
-            "orders": serialized_orders,
-            "total_count": len(serialized_orders)
+            "orders": [],
+            "chunk": chunk_index,
+            "has_more": False,
+            "total_count": total_sent
         })
         
     except Exception as e:
@@ -535,4 +410,68 @@ async def get_orders_for_download(websocket: WebSocket, filters: dict, db):
                 "message": "Failed to fetch orders for download"
             })
         except:
-            logger.info("Could not send error message - client disconnected")
\ No newline at end of file
+            logger.info("Could not send error message - client disconnected")
+
+async def serialize_orders_with_details(orders: list, db, include_address: bool = False) -> list:
+    """Serialize a batch of orders with user, delivery partner and product details"""
+    serialized_orders = []
+    
+    # Batch fetch users and delivery partners to reduce DB calls
+    user_ids = list({order.get("user") for order in orders if order.get("user")})
+    delivery_partner_ids = list({order.get("delivery_partner") for order in orders 
+                                 if order.get("delivery_partner")})
+    
+    users_dict = {}
+    if user_ids or delivery_partner_ids:
+        users = await db.find_many("users", {"_id": {"$in": user_ids + delivery_partner_ids}}, projection="user_contact")
+        users_dict = {str(user["_id"]): user for user in users}
+    
+    # Batch fetch products for order items
+    product_ids = set()
+    for order in orders:
+        for item in order.get("items") or []:
+            if item.get("product"):
+                product_ids.add(ObjectId(item["product"]))
+    
+    products_dict = {}
+    if product_ids:
+        products = await db.find_many("products", {"_id": {"$in": list(product_ids)}}, projection="product_card")
+        products_dict = {str(product["_id"]): product for product in products}
+    
+    for order in orders:
+        try:
+            user = users_dict.get(str(order.get("user", "")), {})
+            delivery_partner = (
+                users_dict.get(str(order["delivery_partner"])) if order.get("delivery_partner") else None
+            )
+            
+            for item in order.get("items") or []:
+                product = products_dict.get(str(item.get("product", "")), {})
+                item["product_name"] = product.get("name", "Unknown Product")
+                item["product_image"] = product.get("images", [])
+            
+            serialized_order = serialize_document(order)
+            
+            # Add frontend-friendly field mappings
+            serialized_order["id"] = serialized_order["_id"]
+            serialized_order["total"] = serialized_order.get("total_amount", 0)
+            serialized_order["status"] = serialized_order.get("order_status", "pending")
+            
+            serialized_order["user_name"] = user.get("name", "Unknown")
+            serialized_order["user_email"] = user.get("email", "")
+            serialized_order["user_phone"] = user.get("phone", "")
+            
+            serialized_order["delivery_partner_name"] = (
+                delivery_partner.get("name") if delivery_partner else None
+            )
+            
+            if include_address and order.get("delivery_address"):
+                serialized_order["delivery_address"] = order["delivery_address"]
+            
+            serialized_orders.append(serialized_order)
+            
+        except Exception as serialize_error:
+            logger.error(f"Error serializing order {order.get('_id')}: {serialize_error}")
+            continue
+    
+    return serialized_orders
@@ -6,6 +6,8 @@ from admin.connection_manager import manager
 from admin.config.cloudinary_config import CloudinaryManager
 from bson import ObjectId
 from datetime import datetime
+from pymongo.errors import BulkWriteError
+from db.catalog_view import refresh_products
 
 logger = logging.getLogger(__name__)
 
@@ -166,6 +168,8 @@ async def create_product(websocket: WebSocket, data: dict, user_info: dict, db):
                     "progress": 100
                 })
         
+        await refresh_products(db, [product_id])
+        
         # Get created product with images
         created_product = await db.find_one("products", {"_id": ObjectId(product_id)})
         created_product = serialize_document(created_product)
@@ -335,6 +339,8 @@ async def update_product(websocket: WebSocket, data: dict, user_info: dict, db):
         )
         
         if result:
+            await refresh_products(db, [product_id])
+            
             # Get updated product
             updated_product = await db.find_one("products", {"_id": ObjectId(product_id)})
             updated_product = serialize_document(updated_product)
@@ -417,6 +423,8 @@ async def delete_product(websocket: WebSocket, data: dict, user_info: dict, db):
         result = await db.delete_one("products", {"_id": ObjectId(product_id)})
         
         if result:
+            await refresh_products(db, [product_id])
+            
             # Send success response
             await websocket.send_json({
                 "type": "product_deleted",
@@ -440,6 +448,151 @@ async def delete_product(websocket: WebSocket, data: dict, user_info: dict, db):
             "message": f"Failed to delete product: {str(e)}"
         })
 
+async def bulk_update_inventory(websocket: WebSocket, data: dict, user_info: dict, db):
+    """Sync stock (and optionally price) for many products in one round trip"""
+    try:
+        user_email = (user_info or {}).get("email", "system")
+        items = data.get("items", []) if data else []
+        
+        if not items:
+            await websocket.send_json({
+                "type": "error",
+                "message": "No inventory items provided"
+            })
+            return
+        
+        now = datetime.utcnow()
+        updates = {}
+        rejected = []
+        for index, item in enumerate(items):
+            product_id = item.get("id") or item.get("_id")
+            if not product_id or not ObjectId.is_valid(product_id):
+                rejected.append({"index": index, "error": "Invalid product id"})
+                continue
+            
+            update_data = {"updated_at": now, "updated_by": user_email}
+            try:
+                if "stock" in item:
+                    update_data["stock"] = int(item["stock"])
+                if "price" in item:
+                    update_data["price"] = float(item["price"])
+            except (TypeError, ValueError):
+                rejected.append({"index": index, "id": product_id, "error": "stock and price must be numbers"})
+                continue
+            if update_data.get("stock", 0) < 0 or update_data.get("price", 0) < 0:
+                rejected.append({"index": index, "id": product_id, "error": "stock and price can't be negative"})
+                continue
+            updates[product_id] = update_data
+        
+        result = await db.update_many_by_ids("products", updates)
+        await refresh_products(db, updates.keys())
+        
+        await websocket.send_json({
+            "type": "inventory_updated",
+            "matched": result["matched_count"],
+            "modified": result["modified_count"],
+            "skipped": len(items) - len(updates),
+            "rejected": rejected,
+            "failed": {
+                product_id: op["error"]
+                for product_id, op in result["results_by_id"].items() if not op["ok"]
+            }
+        })
+        
+        await broadcast_products_data(db)
+        
+        logger.info(f"Inventory sync: {result['modified_count']} of {len(items)} products updated by {user_email}")
+        
+    except Exception as e:
+        logger.error(f"Error syncing inventory: {e}")
+        await websocket.send_json({
+            "type": "error",
+            "message": f"Failed to sync inventory: {str(e)}"
+        })
+
+async def import_products(websocket: WebSocket, data: dict, user_info: dict, db):
+    """Import many products (without images) in one round trip"""
+    try:
+        user_email = (user_info or {}).get("email", "system")
+        rows = data.get("products", []) if data else []
+        
+        if not rows:
+            await websocket.send_json({
+                "type": "error",
+                "message": "No products provided for import"
+            })
+            return
+        
+        required_fields = ["name", "description", "price", "category", "brand", "stock"]
+        now = datetime.utcnow()
+        documents = []
+        # Row index of each entry in documents
+        row_indexes = []
+        rejected = []
+        
+        for index, row in enumerate(rows):
+            # 0 is a valid price or stock
+            missing = [field for field in required_fields if field not in row or row[field] in (None, "")]
+            if missing:
+                rejected.append({"index": index, "error": f"Missing fields: {', '.join(missing)}"})
+                continue
+            invalid = [field for field in ("category", "brand") if not ObjectId.is_valid(str(row[field]))]
+            if invalid:
+                rejected.append({"index": index, "error": f"Invalid id in fields: {', '.join(invalid)}"})
+                continue
+            try:
+                price = float(row["price"])
+                stock = int(row["stock"])
+            except (TypeError, ValueError):
+                rejected.append({"index": index, "error": "price and stock must be numbers"})
+                continue
+            row_indexes.append(index)
+            
+            documents.append({
+                "name": row["name"],
+                "description": row["description"],
+                "price": price,
+                "category": ObjectId(str(row["category"])),
+                "brand": ObjectId(str(row["brand"])),
+                "stock": stock,
+                "keywords": validate_and_clean_keywords(row.get("keywords", [])),
+                "tags": row.get("tags", []),
+                "attributes": row.get("attributes", {}),
+                "images": [],
+                "status": row.get("status", "active"),
+                "is_active": row.get("status", "active") == "active",
+                "created_at": now,
+                "created_by": user_email,
+                "updated_at": now
+            })
+        
+        try:
+            inserted_ids = await db.insert_many("products", documents, ordered=False) if documents else []
+        except BulkWriteError as e:
+            # Unordered: every document without a write error went in (ids are set in place)
+            errors = {error["index"]: error.get("errmsg") for error in (e.details or {}).get("writeErrors", [])}
+            inserted_ids = [str(document["_id"]) for position, document in enumerate(documents) if position not in errors]
+            rejected.extend({"index": row_indexes[position], "error": error} for position, error in errors.items())
+        await refresh_products(db, inserted_ids)
+        
+        await websocket.send_json({
+            "type": "products_imported",
+            "inserted": len(inserted_ids),
+            "product_ids": inserted_ids,
+            "rejected": rejected
+        })
+        
+        await broadcast_products_data(db)
+        
+        logger.info(f"Imported {len(inserted_ids)} products ({len(rejected)} rejected) by {user_email}")
+        
+    except Exception as e:
+        logger.error(f"Error importing products: {e}")
+        await websocket.send_json({
+            "type": "error",
+            "message": f"Failed to import products: {str(e)}"
+        })
+
 async def broadcast_products_data(db):
     """Broadcast fresh products data to all connected admins"""
     try:
@@ -569,6 +722,7 @@ async def handle_add_product_images(websocket: WebSocket, data: dict, user_info:
             {"_id": ObjectId(product_id)},
             {"$set": {"images": all_images}}
         )
+        await refresh_products(db, [product_id])
         
         await websocket.send_json({
             "type": "images_added",
@@ -13,7 +13,7 @@ async def get_requests(websocket: WebSocket, filters:dict,db):
         for request in requests:
             # print(request)
             user_id = request["user_id"]
-            user_data = await db.find_one("users",{"_id": user_id})
+            user_data = await db.find_one("users",{"_id": user_id}, projection="user_contact")
             request['user_name'] = user_data["name"]
             request['email'] = user_data["email"]
             request['phone'] = user_data["phone"]
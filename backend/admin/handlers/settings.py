@@ -1,10 +1,18 @@
 from fastapi import WebSocket
 import logging
+import os
 from datetime import datetime, timedelta
 from admin.utils.serialize import serialize_document
+from admin.handlers.orders import serialize_orders_with_details
+from db.db_connection import pool_metrics
+from db.resources import get_resources
 
 logger = logging.getLogger(__name__)
 
+ANALYTICS_MAX_ORDERS = 5000
+# Dashboard figures tolerate replication lag, keep the full-collection scans off the primary
+ANALYTICS_READ_PREFERENCE = os.getenv('ANALYTICS_READ_PREFERENCE', 'secondaryPreferred')
+
 async def send_inventory_status(websocket: WebSocket, db):
     """Send inventory status"""
     try:
@@ -30,6 +38,7 @@ async def send_inventory_status(websocket: WebSocket, db):
 
 async def handle_get_analytics(websocket: WebSocket, data: dict, db):
     """Get analytics data with orders for dashboard"""
+    db = db.with_read_preference(ANALYTICS_READ_PREFERENCE)
     try:
         period = data.get("period", "week")
         filters = data.get("filters", {})
@@ -51,12 +60,32 @@ async def handle_get_analytics(websocket: WebSocket, data: dict, db):
 
         logger.info(f"Date range: {start_date} to {end_date}")
 
-        # Get all orders (not just for period) for dashboard
-        logger.info("Fetching all orders...")
-        all_orders = await db.find_many("orders", {}, sort=[("created_at", -1)])
-        logger.info(f"Found {len(all_orders)} total orders")
+        # Totals over all orders (not just for period) are computed by the server; only
+        # the most recent ANALYTICS_MAX_ORDERS are serialized and sent for the charts,
+        # with orders_truncated telling the dashboard when there were more.
+        logger.info("Aggregating order totals...")
+        totals = await db.aggregate("orders", [
+            {"$group": {
+                "_id": None,
+                "total_orders": {"$sum": 1},
+                "delivered_count": {"$sum": {"$cond": [{"$eq": ["$order_status", "delivered"]}, 1, 0]}},
+                "total_revenue": {"$sum": {"$cond": [
+                    {"$eq": ["$order_status", "delivered"]}, {"$ifNull": ["$total_amount", 0]}, 0
+                ]}}
+            }}
+        ])
+        totals = totals[0] if totals else {}
+        total_orders = totals.get("total_orders", 0)
+        delivered_count = totals.get("delivered_count", 0)
+        total_revenue = totals.get("total_revenue", 0)
+        
+        serialized_orders = []
+        async for orders in db.iter_many("orders", {}, sort=[("created_at", -1)], max_docs=ANALYTICS_MAX_ORDERS):
+            serialized_orders.extend(await serialize_orders_with_details(orders, db))
         
-        if len(all_orders) == 0:
+        logger.info(f"Found {total_orders} total orders")
+        
+        if total_orders == 0:
             logger.warning("No orders found in database!")
             await websocket.send_json({
                 "type": "analytics_data",
@@ -71,68 +100,17 @@ async def handle_get_analytics(websocket: WebSocket, data: dict, db):
             })
             return
         
-        # Serialize orders for frontend
-        serialized_orders = []
-        
-        # Batch fetch users for order data
-        user_ids = [order.get("user") for order in all_orders if order.get("user")]
-        users_dict = {}
-        if user_ids:
-            logger.info(f"Fetching user data for {len(user_ids)} users...")
-            users = await db.find_many("users", {"_id": {"$in": user_ids}})
-            users_dict = {str(user["_id"]): user for user in users}
-            logger.info(f"Found {len(users)} users")
-        
-        # Batch fetch delivery partners
-        delivery_partner_ids = [order.get("delivery_partner") for order in all_orders 
-                             if order.get("delivery_partner")]
-        delivery_partners_dict = {}
-        if delivery_partner_ids:
-            partners = await db.find_many("users", {"_id": {"$in": delivery_partner_ids}})
-            delivery_partners_dict = {str(partner["_id"]): partner for partner in partners}
-        
-        for order in all_orders:
-            try:
-                # Get user info
-                user_id = str(order.get("user", ""))
-                user = users_dict.get(user_id, {})
-                
-                # Get delivery partner info
-                delivery_partner_id = str(order.get("delivery_partner", "")) if order.get("delivery_partner") else None
-                delivery_partner = delivery_partners_dict.get(delivery_partner_id) if delivery_partner_id else None
-                
-                serialized_order = serialize_document(order)
-                # Add frontend-friendly mappings
-                serialized_order["id"] = serialized_order["_id"]
-                serialized_order["total"] = serialized_order.get("total_amount", 0)
-                serialized_order["status"] = serialized_order.get("order_status", "pending")
-                serialized_order["user_name"] = user.get("name", "Unknown")
-                serialized_order["user_email"] = user.get("email", "")
-                serialized_order["user_phone"] = user.get("phone", "")
-                serialized_order["delivery_partner_name"] = (
-                    delivery_partner.get("name") if delivery_partner else None
-                )
-                
-                serialized_orders.append(serialized_order)
-            except Exception as e:
-                logger.error(f"Error serializing order {order.get('_id', 'unknown')}: {e}")
-                continue
-        
         logger.info(f"Serialized {len(serialized_orders)} orders")
         
-        # Calculate analytics
-        total_orders = len(serialized_orders)
-        delivered_orders = [order for order in serialized_orders if order.get("status") == "delivered"]
-        total_revenue = sum(order.get("total", 0) for order in delivered_orders)
-        
         logger.info(f"Analytics calculated:")
         logger.info(f"  Total orders: {total_orders}")
-        logger.info(f"  Delivered orders: {len(delivered_orders)}")
+        logger.info(f"  Delivered orders: {delivered_count}")
         logger.info(f"  Total revenue: {total_revenue}")
         
         response_data = {
             "type": "analytics_data",
             "orders": serialized_orders,
+            "orders_truncated": total_orders > len(serialized_orders),
             "analytics": {
                 "period": period,
                 "start_date": start_date.isoformat(),
@@ -246,4 +224,35 @@ async def update_pricing_config(websocket: WebSocket, data: dict, user_info: dic
         await websocket.send_json({
             "type": "error",
             "message": f"Failed to update pricing: {str(e)}"
+        })
+
+async def send_db_metrics(websocket: WebSocket, data: dict, db):
+    """Send per-query-shape latency, document and explain stats plus pool and cache gauges"""
+    try:
+        data = data or {}
+        snapshot = db.metrics.snapshot()
+        snapshot["pool"] = pool_metrics.snapshot()
+        snapshot["versions"] = db.versions.snapshot()
+        snapshot["cache"] = db.cache.snapshot()
+        listener = get_resources().change_streams
+        snapshot["change_streams"] = listener.snapshot() if listener else None
+        
+        if data.get("dump"):
+            dump_path = os.getenv("DB_METRICS_DUMP_PATH", "db_metrics.json")
+            db.metrics.dump(dump_path, {"pool": snapshot["pool"], "cache": snapshot["cache"]})
+            snapshot["dump_path"] = dump_path
+        
+        if data.get("reset"):
+            db.metrics.reset()
+        
+        await websocket.send_json({
+            "type": "db_metrics",
+            "data": snapshot
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting db metrics: {e}")
+        await websocket.send_json({
+            "type": "error",
+            "message": "Failed to fetch database metrics"
         })
\ No newline at end of file
@@ -3,7 +3,7 @@ from admin.connection_manager import manager
 from admin.auth import verify_admin_token, authenticate_admin
 from db.db_manager import get_database
 import logging
-from admin.handlers.products import send_products, create_product, delete_product, update_product
+from admin.handlers.products import send_products, create_product, delete_product, update_product, bulk_update_inventory, import_products
 from admin.handlers.brand import send_brands, create_brand, update_brand, delete_brand
 from admin.handlers.orders import send_orders,update_order_status,get_delivery_requests_for_order,assign_delivery_partner,get_orders_for_download
 from admin.handlers.category import send_categories, create_categories, update_category, delete_category
@@ -20,7 +20,8 @@ from admin.handlers.settings import (
     send_inventory_status, 
     handle_get_analytics, 
     get_pricing_config, 
-    update_pricing_config
+    update_pricing_config,
+    send_db_metrics
 )
 
 logger = logging.getLogger(__name__)
@@ -172,6 +173,12 @@ async def handle_admin_messages(websocket: WebSocket, user_info: dict):
             elif msg_type == "delete_product":
                 if websocket.client_state.value == 1:
                     await delete_product(websocket, message.get("data"), user_info, db)
+
+            elif msg_type == "bulk_update_inventory":
+                await bulk_update_inventory(websocket, message.get("data"), user_info, db)
+
+            elif msg_type == "import_products":
+                await import_products(websocket, message.get("data"), user_info, db)
            
             # Orders handlers
             elif msg_type == "get_orders":
@@ -237,6 +244,9 @@ async def handle_admin_messages(websocket: WebSocket, user_info: dict):
             elif msg_type == "get_inventory_status":
                 await send_inventory_status(websocket, db)
 
+            elif msg_type == "get_db_metrics":
+                await send_db_metrics(websocket, message.get("data"), db)
+
             # Customers handlers
             elif msg_type == "get_customers":
                 await send_customers(websocket, db)
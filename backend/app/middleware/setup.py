@@ -24,7 +24,8 @@ def setup_middleware(app: FastAPI):
         allow_origins = ["*"],
         allow_credentials = True,
         allow_methods = ["*"],
-        allow_headers = ["*"]
+        allow_headers = ["*"],
+        expose_headers = ["X-Next-Cursor", "ETag"]
     )
 
     #compression middleware
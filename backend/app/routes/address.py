@@ -12,7 +12,7 @@ from app.utils.mongo import fix_mongo_types
 from typing import List
 import os
 from dotenv import load_dotenv
-import httpx
+from db.resources import get_resources
 # from app.utils.address import get_fallback_address,get_fallback_coordinates,get_fallback_predictions
 
 logger = logging.getLogger(__name__)
@@ -219,16 +219,16 @@ async def search_addresses_proxy(request: AddressSearchRequest):
             'api_key': OLA_API_KEY
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params, timeout=10.0)
-            
-            if response.status_code == 200:
-                data = response.json()
-                return {"predictions": data.get("predictions", [])}
-            else:
-                logger.error(f"Ola Maps search error: {response.status_code}")
-                return {"predictions": []}
-                
+        client = get_resources().http_client
+        response = await client.get(url, params=params, timeout=10.0)
+
+        if response.status_code == 200:
+            data = response.json()
+            return {"predictions": data.get("predictions", [])}
+        else:
+            logger.error(f"Ola Maps search error: {response.status_code}")
+            return {"predictions": []}
+
     except Exception as e:
         logger.error(f"Address search proxy error: {e}")
         return {"predictions": []}
@@ -243,22 +243,22 @@ async def geocode_address(request: GeocodeRequest):
             'api_key': OLA_API_KEY
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params, timeout=10.0)
-            if response.status_code == 200:
-                data = response.json()
-                
-                if data.get('geocodingResults') and len(data['geocodingResults']) > 0:
-                    result = data['geocodingResults'][0]
-                    location = result.get('geometry', {}).get('location', {})
-                    
-                    return {
-                        'latitude': location.get('lat'),
-                        'longitude': location.get('lng'),
-                        'formatted_address': result.get('formatted_address'),
-                        'place_id': result.get('place_id')
-                    }
-        
+        client = get_resources().http_client
+        response = await client.get(url, params=params, timeout=10.0)
+        if response.status_code == 200:
+            data = response.json()
+
+            if data.get('geocodingResults') and len(data['geocodingResults']) > 0:
+                result = data['geocodingResults'][0]
+                location = result.get('geometry', {}).get('location', {})
+
+                return {
+                    'latitude': location.get('lat'),
+                    'longitude': location.get('lng'),
+                    'formatted_address': result.get('formatted_address'),
+                    'place_id': result.get('place_id')
+                }
+
         raise HTTPException(status_code=404, detail="Address not found")
         
     except HTTPException:
@@ -504,22 +504,22 @@ async def reverse_geocode_proxy(request: ReverseGeocodeRequest):
             'api_key': OLA_API_KEY
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params, timeout=10.0)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                if data.get('results') and len(data['results']) > 0:
-                    address_result = data['results'][0]
-                    
-                    return {
-                        'formatted_address': address_result.get('formatted_address'),
-                        'address_components': address_result.get('address_components', []),
-                        'latitude': request.latitude,
-                        'longitude': request.longitude
-                    }
-        
+        client = get_resources().http_client
+        response = await client.get(url, params=params, timeout=10.0)
+
+        if response.status_code == 200:
+            data = response.json()
+
+            if data.get('results') and len(data['results']) > 0:
+                address_result = data['results'][0]
+
+                return {
+                    'formatted_address': address_result.get('formatted_address'),
+                    'address_components': address_result.get('address_components', []),
+                    'latitude': request.latitude,
+                    'longitude': request.longitude
+                }
+
         raise HTTPException(status_code=404, detail="Address not found")
         
     except HTTPException:
@@ -1,15 +1,16 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
 import logging
-from db.db_manager import DatabaseManager, get_database
+from db.db_manager import DatabaseManager, get_catalog_database
 from schema.brand import BrandResponse
 from app.utils.mongo import fix_mongo_types
+from app.utils.http_cache import conditional_get
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.get("/", response_model=List[BrandResponse])
-async def get_brands(db: DatabaseManager = Depends(get_database)):
+@router.get("/", response_model=List[BrandResponse], dependencies=[Depends(conditional_get("brands", ["brands"]))])
+async def get_brands(db: DatabaseManager = Depends(get_catalog_database)):
     """Get all active brands"""
     try:
         brands = await db.find_many("brands", {"is_active": True}, sort=[("name", 1)])
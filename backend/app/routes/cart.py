@@ -1,9 +1,10 @@
 from bson import ObjectId
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 import logging
-from app.utils.auth import current_active_user
+from app.utils.auth import current_active_user, user_session_database
 from app.utils.mongo import fix_mongo_types
-from db.db_manager import DatabaseManager, get_database
+from db.db_manager import DatabaseManager
+from db.catalog_view import CATALOG_VIEW
 from schema.cart import CartRequest, UpdateCartItemRequest
 from schema.user import UserinDB
 import uuid
@@ -37,7 +38,7 @@ def process_product_images_for_cart(product):
 async def add_to_cart(
     req: CartRequest, 
     current_user: UserinDB = Depends(current_active_user),
-    db: DatabaseManager = Depends(get_database)    
+    db: DatabaseManager = Depends(user_session_database)    
 ):
     product_id = req.productId
     quantity = req.quantity
@@ -54,7 +55,7 @@ async def add_to_cart(
         product = await db.find_one("products", {
             "_id": ObjectId(product_id),
             "is_active": True
-        })
+        }, projection="product_stock")
         
         if not product:
             raise HTTPException(
@@ -138,7 +139,7 @@ async def add_to_cart(
 @router.get("/")
 async def get_cart(
     current_user: UserinDB = Depends(current_active_user),
-    db: DatabaseManager = Depends(get_database)
+    db: DatabaseManager = Depends(user_session_database)
 ):
     try:
         logger.info(f"Getting cart for user {current_user.email}")
@@ -148,56 +149,17 @@ async def get_cart(
         if not cart:
             return {"items": []}
         
+        # Product details for every item in one read from the catalog view
+        product_ids = [item["product"] for item in cart.get('items', []) if item.get("product")]
+        products = await db.find_many(CATALOG_VIEW, {"_id": {"$in": product_ids}}) if product_ids else []
+        products_by_id = {product["_id"]: product for product in products}
+        
         items_with_products = []
         for item in cart.get('items', []):
             try:
-                # Get product details with populated references
-                pipeline = [
-                    {"$match": {"_id": item["product"], "is_active": True}},
-                    {
-                        "$lookup": {
-                            "from": "categories",
-                            "localField": "category",
-                            "foreignField": "_id",
-                            "as": "category_data"
-                        }
-                    },
-                    {
-                        "$lookup": {
-                            "from": "brands",
-                            "localField": "brand",
-                            "foreignField": "_id",
-                            "as": "brand_data"
-                        }
-                    },
-                    {
-                        "$addFields": {
-                            "category": {
-                                "$ifNull": [
-                                    {"$arrayElemAt": ["$category_data", 0]},
-                                    {"name": "Uncategorized", "_id": None}
-                                ]
-                            },
-                            "brand": {
-                                "$ifNull": [
-                                    {"$arrayElemAt": ["$brand_data", 0]},
-                                    {"name": "No Brand", "_id": None}
-                                ]
-                            }
-                        }
-                    },
-                    {
-                        "$project": {
-                            "category_data": 0,
-                            "brand_data": 0
-                        }
-                    }
-                ]
-                
-                products_result = await db.aggregate("products", pipeline)
+                product = products_by_id.get(item.get("product"))
                 
-                if products_result:
-                    product = products_result[0]
+                if product:
                     product_fixed = fix_mongo_types(product)
                     
                     # Process images for mobile app
@@ -236,7 +198,7 @@ async def get_cart(
 async def update_cart_item(
     req: UpdateCartItemRequest,
     current_user: UserinDB = Depends(current_active_user),
-    db: DatabaseManager = Depends(get_database)
+    db: DatabaseManager = Depends(user_session_database)
 ):
     item_id = req.itemId
     quantity = req.quantity
@@ -311,7 +273,7 @@ async def update_cart_item(
 async def remove_from_cart(
     item_id: str = Query(..., description="Cart item ID to remove"),
     current_user: UserinDB = Depends(current_active_user),
-    db: DatabaseManager = Depends(get_database)
+    db: DatabaseManager = Depends(user_session_database)
 ):
     """Remove item from cart"""
     try:
@@ -361,7 +323,7 @@ async def remove_from_cart(
 @router.delete("/clear")
 async def clear_cart(
     current_user: UserinDB = Depends(current_active_user),
-    db: DatabaseManager = Depends(get_database)
+    db: DatabaseManager = Depends(user_session_database)
 ):
     """Clear user's cart"""
     try:
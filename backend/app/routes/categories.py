@@ -1,15 +1,16 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
 import logging
-from db.db_manager import DatabaseManager, get_database
+from db.db_manager import DatabaseManager, get_catalog_database
 from schema.category import CategoryResponse
 from app.utils.mongo import fix_mongo_types
+from app.utils.http_cache import conditional_get
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.get("/", response_model=List[CategoryResponse])
-async def get_categories(db: DatabaseManager = Depends(get_database)):
+@router.get("/", response_model=List[CategoryResponse], dependencies=[Depends(conditional_get("categories", ["categories"]))])
+async def get_categories(db: DatabaseManager = Depends(get_catalog_database)):
     """Get all active categories"""
     try:
         # Add better error handling and filters
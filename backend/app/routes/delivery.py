@@ -1,9 +1,11 @@
 from datetime import datetime
 from bson import ObjectId
-from fastapi import HTTPException,APIRouter, Depends, status
+from fastapi import HTTPException,APIRouter, Depends, status, Query, Response
+from typing import Optional
 from app.utils.auth import current_active_user
 from app.utils.mongo import fix_mongo_types
 from db.db_manager import DatabaseManager, get_database
+from db.pagination import DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT, NEXT_CURSOR_HEADER, apply_cursor, keyset_sort, opt_in_limit, split_page
 from schema.user import UserinDB
 import logging
 
@@ -12,6 +14,9 @@ logger = logging.getLogger(__name__)
 
 @router.get("/available")
 async def get_available_orders_for_delivery(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT, description=f"page size (default {DEFAULT_PAGE_LIMIT} with cursor); omit both for the full list"),
+    cursor: Optional[str] = Query(None),
     current_user: UserinDB = Depends(current_active_user),
     db: DatabaseManager = Depends(get_database)
 ):
@@ -24,14 +29,19 @@ async def get_available_orders_for_delivery(
                 detail="Access denied. Only delivery partners can access this endpoint."
             )
         
+        limit = opt_in_limit(limit, cursor)
         # Find orders that are confirmed but not yet assigned to any delivery partner
         orders = await db.find_many(
             "orders",
-            {
+            apply_cursor({
                 "order_status": {"$in" : ["confirmed","preparing","assigning","accepted"]}
-            },
-            sort=[("created_at", -1)]
+            }, cursor),
+            sort=keyset_sort(),
+            limit=limit + 1 if limit else 0
         )
+        orders, next_cursor = split_page(orders, limit)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
         # print(orders)
         
@@ -39,7 +49,7 @@ async def get_available_orders_for_delivery(
         for order in orders:
             try:
                 # Get user info for each order
-                user_info = await db.find_one("users", {"_id": order["user"]})
+                user_info = await db.find_one("users", {"_id": order["user"]}, projection="user_contact")
                 if user_info:
                     order["user_info"] = {
                         "name": user_info.get("name", "N/A"),
@@ -53,7 +63,7 @@ async def get_available_orders_for_delivery(
                         try:
                             if isinstance(item.get('product'), (str, ObjectId)):
                                 product_id = ObjectId(item['product']) if isinstance(item['product'], str) else item['product']
-                                product = await db.find_one("products", {"_id": product_id})
+                                product = await db.find_one("products", {"_id": product_id}, projection="product_card")
                                 if product:
                                     item["product_name"] = product["name"]
                                     item["product_image"] = product.get("images", [])
@@ -75,6 +85,8 @@ async def get_available_orders_for_delivery(
         
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Get available delivery orders error: {e}")
         raise HTTPException(
@@ -84,6 +96,9 @@ async def get_available_orders_for_delivery(
 
 @router.get("/assigned")
 async def get_assigned_orders_for_delivery(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT, description=f"page size (default {DEFAULT_PAGE_LIMIT} with cursor); omit both for the full list"),
+    cursor: Optional[str] = Query(None),
     current_user: UserinDB = Depends(current_active_user),
     db: DatabaseManager = Depends(get_database)
 ):
@@ -96,21 +111,26 @@ async def get_assigned_orders_for_delivery(
                 detail="Access denied. Only delivery partners can access this endpoint."
             )
         
+        limit = opt_in_limit(limit, cursor)
         # Find orders assigned to this delivery partner
         orders = await db.find_many(
             "orders",
-            {
+            apply_cursor({
                 "delivery_partner": ObjectId(current_user.id),
                 "order_status": {"$in":["assigned","out_for_delivery"]}
-            },
-            sort=[("created_at", -1)]
+            }, cursor),
+            sort=keyset_sort(),
+            limit=limit + 1 if limit else 0
         )
+        orders, next_cursor = split_page(orders, limit)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
         enhanced_orders = []
         for order in orders:
             try:
                 # Get user info for each order
-                user_info = await db.find_one("users", {"_id": order["user"]})
+                user_info = await db.find_one("users", {"_id": order["user"]}, projection="user_contact")
                 if user_info:
                     order["user_info"] = {
                         "name": user_info.get("name", "N/A"),
@@ -124,7 +144,7 @@ async def get_assigned_orders_for_delivery(
                         try:
                             if isinstance(item.get('product'), (str, ObjectId)):
                                 product_id = ObjectId(item['product']) if isinstance(item['product'], str) else item['product']
-                                product = await db.find_one("products", {"_id": product_id})
+                                product = await db.find_one("products", {"_id": product_id}, projection="product_card")
                                 if product:
                                     item["product_name"] = product["name"]
                                     item["product_image"] = product.get("images", [])
@@ -146,6 +166,8 @@ async def get_assigned_orders_for_delivery(
         
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Get assigned delivery orders error: {e}")
         raise HTTPException(
@@ -155,6 +177,9 @@ async def get_assigned_orders_for_delivery(
 
 @router.get("/delivered")
 async def get_delivered_orders_for_delivery(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT, description=f"page size (default {DEFAULT_PAGE_LIMIT} with cursor); omit both for the full list"),
+    cursor: Optional[str] = Query(None),
     current_user: UserinDB = Depends(current_active_user),
     db: DatabaseManager = Depends(get_database)
 ):
@@ -167,21 +192,26 @@ async def get_delivered_orders_for_delivery(
                 detail="Access denied. Only delivery partners can access this endpoint."
             )
         
+        limit = opt_in_limit(limit, cursor)
         # Find delivered orders by this delivery partner
         orders = await db.find_many(
             "orders",
-            {
+            apply_cursor({
                 "delivery_partner": ObjectId(current_user.id),
                 "order_status": "delivered"
-            },
-            sort=[("updated_at", -1)]  # Sort by delivery date
+            }, cursor, "updated_at"),
+            sort=keyset_sort("updated_at"),  # Sort by delivery date
+            limit=limit + 1 if limit else 0
         )
+        orders, next_cursor = split_page(orders, limit, "updated_at")
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
         enhanced_orders = []
         for order in orders:
             try:
                 # Get user info for each order
-                user_info = await db.find_one("users", {"_id": order["user"]})
+                user_info = await db.find_one("users", {"_id": order["user"]}, projection="user_contact")
                 if user_info:
                     order["user_info"] = {
                         "name": user_info.get("name", "N/A"),
@@ -195,7 +225,7 @@ async def get_delivered_orders_for_delivery(
                         try:
                             if isinstance(item.get('product'), (str, ObjectId)):
                                 product_id = ObjectId(item['product']) if isinstance(item['product'], str) else item['product']
-                                product = await db.find_one("products", {"_id": product_id})
+                                product = await db.find_one("products", {"_id": product_id}, projection="product_card")
                                 if product:
                                     item["product_name"] = product["name"]
                                     item["product_image"] = product.get("images", [])
@@ -217,6 +247,8 @@ async def get_delivered_orders_for_delivery(
         
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Get delivered orders error: {e}")
         raise HTTPException(
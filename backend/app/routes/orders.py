@@ -1,12 +1,16 @@
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from typing import Optional
 import logging
 from app.services.order_service import OrderService
-from app.utils.auth import current_active_user
-from db.db_manager import DatabaseManager, get_database
+from app.services.buy_again import buy_again
+from app.utils.auth import current_active_user, user_session_database
+from db.db_manager import DatabaseManager
+from db.pagination import DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT, NEXT_CURSOR_HEADER, apply_cursor, keyset_sort, opt_in_limit, split_page
 from schema.order import OrderResponse, OrderResponseEnhanced
 from schema.user import UserinDB
 from app.utils.mongo import fix_mongo_types
+from app.routes.products import process_product_images
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -15,7 +19,7 @@ router = APIRouter()
 async def create_order(
     order_data: dict,
     current_user: UserinDB = Depends(current_active_user),
-    db: DatabaseManager = Depends(get_database)
+    db: DatabaseManager = Depends(user_session_database)
 ):
     try:
         logger.info(f"Order creation request from user: {current_user.email}")
@@ -49,15 +53,25 @@ async def create_order(
 
 @router.get("/my")
 async def get_my_orders(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT, description=f"page size (default {DEFAULT_PAGE_LIMIT} with cursor); omit both for the full list"),
+    cursor: Optional[str] = Query(None),
+    summary: bool = Query(False, description="leave out status_change_history (returned empty)"),
     current_user: UserinDB = Depends(current_active_user),
-    db: DatabaseManager = Depends(get_database)
+    db: DatabaseManager = Depends(user_session_database)
 ):
     try:
+        limit = opt_in_limit(limit, cursor)
         orders = await db.find_many(
             "orders", 
-            {"user": ObjectId(current_user.id)},
-            sort=[("created_at", -1)]
+            apply_cursor({"user": ObjectId(current_user.id)}, cursor),
+            sort=keyset_sort(),
+            limit=limit + 1 if limit else 0,
+            projection="order_summary" if summary else None
         )
+        orders, next_cursor = split_page(orders, limit)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
         # Process each order to add product details
         for order in orders:
@@ -75,7 +89,7 @@ async def get_my_orders(
                             continue
 
                         # Fetch product details
-                        product = await db.find_one("products", {"_id": product_id})
+                        product = await db.find_one("products", {"_id": product_id}, projection="product_card")
                         if product:
                             item["product_name"] = product["name"]
                             item["product_image"] = product.get("images", [])
@@ -116,6 +130,8 @@ async def get_my_orders(
         logger.info(f"Returning {len(validated_orders)} orders")
         return validated_orders
         
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Get my orders error: {e}")
         import traceback
@@ -123,4 +139,36 @@ async def get_my_orders(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get orders"
-        )
\ No newline at end of file
+        )
+
+@router.get("/buy-again")
+async def get_buy_again(
+    limit: int = Query(20, ge=1, le=50),
+    current_user: UserinDB = Depends(current_active_user),
+    db: DatabaseManager = Depends(user_session_database)
+):
+    """Products the user orders most often, with current price and stock"""
+    try:
+        entries = await buy_again(db, current_user.id, limit)
+        return {
+            "items": [
+                {
+                    "product_id": str(entry["product"]["_id"]),
+                    "name": entry["product"].get("name"),
+                    "price": entry["product"].get("price"),
+                    "stock": entry["product"].get("stock", 0),
+                    "in_stock": (entry["product"].get("stock") or 0) > 0,
+                    "images": process_product_images(entry["product"]),
+                    "times_ordered": entry.get("orders", 0),
+                    "total_quantity": entry.get("quantity", 0),
+                    "last_ordered_at": entry.get("last_ordered_at")
+                }
+                for entry in entries
+            ]
+        }
+    except Exception as e:
+        logger.error(f"Get buy again error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get buy again list"
+        )
@@ -1,14 +1,39 @@
-from typing import Optional
+import asyncio
+from typing import Literal, Optional, Tuple
 from bson import ObjectId
 from fastapi import APIRouter, Depends, Query, HTTPException, status
 from schema.products import ProductResponse
-from db.db_manager import DatabaseManager, get_database
+from db.db_manager import DatabaseManager, get_database, get_catalog_database
+from db.pagination import apply_cursor, keyset_sort, split_page
+from db.catalog_view import CATALOG_VIEW, POPULARITY_FIELD
+from app.services.search_index import product_search_index
+from app.services.suggest_index import suggest_index
+from app.services.catalog_facets import empty_facets, get_facets
+from app.services.catalog_counts import count_products
+from app.services.catalog_sync import get_changes
+from app.services.columnar_catalog import columnar_catalog
+from app.services.product_stats import bestseller_ids, stats_recorder
+from app.services.recommendations import related_products
 import logging
 from app.utils.mongo import fix_mongo_types
+from app.utils.http_cache import conditional_get
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Most products one /products/batch call resolves
+MAX_BATCH_IDS = 100
+
+# Listing sort -> catalog_view field, paged on (field, _id) descending
+SORT_FIELDS = {"newest": "created_at", "popular": POPULARITY_FIELD}
+
+# Row layout of /products/changes; products are sent as arrays in this order
+SYNC_FIELDS = ["id", "name", "price", "stock", "category", "brand", "images", "keywords", "description"]
+
+# Listings also resolve category/brand names, so those versions count too
+product_list_etag = conditional_get("products", [CATALOG_VIEW, "categories", "brands"])
+product_detail_etag = conditional_get("product", [CATALOG_VIEW])
+
 def process_product_images(product):
     """Convert admin panel image objects to mobile app compatible URLs"""
     images = product.get("images", [])
@@ -76,8 +101,117 @@ def serialize_product_for_mobile(product):
         logger.error(f"Error serializing product: {e}")
         return None
 
-@router.get("")  # Handle both /products and /products/
-@router.get("/")
+async def _search_catalog(db: DatabaseManager, query: dict, search: str, skip: int, limit: int):
+    """Rank with the search index, apply the remaining filters to the candidates in Mongo,
+    and return one page of catalog_view documents in rank order plus the match count"""
+    # Filters evaluated in memory apply before the ranking is cut to its candidates
+    allowed = columnar_catalog.matcher(query) if columnar_catalog.ready else None
+    if allowed is not None:
+        ranked_ids = [product_id for product_id, _ in product_search_index.search_with_fallback(search, allowed=allowed)]
+        return columnar_catalog.documents(ranked_ids[skip:skip + limit]), len(ranked_ids)
+    
+    # Filtered in Mongo after ranking, so keep more candidates
+    candidates = product_search_index.filtered_max_candidates if query else None
+    ranked_ids = [product_id for product_id, _ in product_search_index.search_with_fallback(search, candidates)]
+    if not ranked_ids:
+        return [], 0
+    
+    if query:
+        matching = await db.find_many(CATALOG_VIEW, {**query, "_id": {"$in": ranked_ids}}, projection={"_id": 1})
+        allowed = {product["_id"] for product in matching}
+        ranked_ids = [product_id for product_id in ranked_ids if product_id in allowed]
+    
+    page_ids = ranked_ids[skip:skip + limit]
+    if not page_ids:
+        return [], len(ranked_ids)
+    
+    products = await db.find_many(CATALOG_VIEW, {"_id": {"$in": page_ids}})
+    products_by_id = {product["_id"]: product for product in products}
+    return [products_by_id[product_id] for product_id in page_ids if product_id in products_by_id], len(ranked_ids)
+
+async def build_product_query(
+    db: DatabaseManager,
+    category: Optional[str],
+    brand: Optional[str],
+    search: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+    in_stock: Optional[bool]
+) -> Optional[Tuple[dict, str, bool]]:
+    """Turn the listing filters into a catalog_view query.
+
+    Returns (query, search terms, whether the search index ranks the search), or None
+    when a category/brand name matches nothing so no product can match.
+    """
+    # catalog_view only holds active products, with category/brand embedded
+    query = {}
+
+    # Handle category filter
+    if category:
+        if ObjectId.is_valid(category):
+            query["category._id"] = ObjectId(category)
+        else:
+            cat = await db.find_one("categories", {
+                "name": {"$regex": category, "$options": "i"},
+                "is_active": True
+            })
+            if cat:
+                query["category._id"] = cat["_id"]
+            else:
+                return None
+                
+    # Handle brand filter
+    if brand:
+        if ObjectId.is_valid(brand):
+            query["brand._id"] = ObjectId(brand)
+        else:
+            brand_doc = await db.find_one("brands", {
+                "name": {"$regex": brand, "$options": "i"},
+                "is_active": True
+            })
+            if brand_doc:
+                query["brand._id"] = brand_doc["_id"]
+            else:
+                return None
+                
+    # Handle stock filter
+    if in_stock:
+        query["stock"] = {"$gt": 0}
+        
+    # Handle price range
+    if min_price is not None or max_price is not None:
+        query["price"] = {}
+        if min_price is not None:
+            query["price"]["$gte"] = min_price
+        if max_price is not None:
+            query["price"]["$lte"] = max_price
+            
+    # Handle search with better keyword matching; the regex scan is only the
+    # fallback for when the in-process index isn't loaded
+    search_terms = search.strip() if search else ""
+    use_index = bool(search_terms) and product_search_index.ready
+    if search and not use_index:
+        if search_terms:
+            search_keywords = [kw.strip() for kw in search_terms.split(',') if kw.strip()]
+            
+            or_query = [
+                {"name": {"$regex": search_terms, "$options": "i"}},
+                {"description": {"$regex": search_terms, "$options": "i"}},
+            ]
+            
+            # Add keyword searches
+            for keyword in search_keywords:
+                or_query.extend([
+                    {"keywords": {"$elemMatch": {"$regex": keyword, "$options": "i"}}},
+                    {"tags": {"$elemMatch": {"$regex": keyword, "$options": "i"}}}
+                ])
+            
+            query["$or"] = or_query
+    
+    return query, search_terms, use_index
+
+@router.get("", dependencies=[Depends(product_list_etag)])  # Handle both /products and /products/
+@router.get("/", dependencies=[Depends(product_list_etag)])
 async def get_products(
     category: Optional[str] = Query(None),
     brand: Optional[str] = Query(None),
@@ -87,143 +221,62 @@ async def get_products(
     in_stock: Optional[bool] = Query(None),
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
-    db: DatabaseManager = Depends(get_database) 
+    cursor: Optional[str] = Query(None, description="nextCursor from the previous page; replaces page"),
+    include_total: bool = Query(True, description="false skips counting; totalPages/totalProducts come back null"),
+    sort: Literal["newest", "popular"] = Query("newest", description="ignored for ranked search results"),
+    db: DatabaseManager = Depends(get_catalog_database) 
 ):
     """Get products with mobile app optimized response"""
     try:
         logger.info(f"Mobile app requesting products with filters: category={category}, brand={brand}, search={search}")
         
-        query = {"is_active": True}
-
-        # Handle category filter
-        if category:
-            if ObjectId.is_valid(category):
-                query["category"] = ObjectId(category)
-            else:
-                cat = await db.find_one("categories", {
-                    "name": {"$regex": category, "$options": "i"},
-                    "is_active": True
-                })
-                if cat:
-                    query["category"] = cat["_id"]
-                else:
-                    return {"products": [], "pagination": {"currentPage": page, "totalPages": 0, "totalProducts": 0}}
-                    
-        # Handle brand filter
-        if brand:
-            if ObjectId.is_valid(brand):
-                query["brand"] = ObjectId(brand)
-            else:
-                brand_doc = await db.find_one("brands", {
-                    "name": {"$regex": brand, "$options": "i"},
-                    "is_active": True
-                })
-                if brand_doc:
-                    query["brand"] = brand_doc["_id"]
-                else:
-                    return {"products": [], "pagination": {"currentPage": page, "totalPages": 0, "totalProducts": 0}}
-                    
-        # Handle stock filter
-        if in_stock:
-            query["stock"] = {"$gt": 0}
-            
-        # Handle price range
-        if min_price is not None or max_price is not None:
-            query["price"] = {}
-            if min_price is not None:
-                query["price"]["$gte"] = min_price
-            if max_price is not None:
-                query["price"]["$lte"] = max_price
-                
-        # Handle search with better keyword matching
-        if search:
-            search_terms = search.strip()
-            if search_terms:
-                search_keywords = [kw.strip() for kw in search_terms.split(',') if kw.strip()]
-                
-                or_query = [
-                    {"name": {"$regex": search_terms, "$options": "i"}},
-                    {"description": {"$regex": search_terms, "$options": "i"}},
-                ]
-                
-                # Add keyword searches
-                for keyword in search_keywords:
-                    or_query.extend([
-                        {"keywords": {"$elemMatch": {"$regex": keyword, "$options": "i"}}},
-                        {"tags": {"$elemMatch": {"$regex": keyword, "$options": "i"}}}
-                    ])
-                
-                query["$or"] = or_query
+        built = await build_product_query(db, category, brand, search, min_price, max_price, in_stock)
+        if built is None:
+            return {"products": [], "pagination": {"currentPage": page, "totalPages": 0, "totalProducts": 0}}
+        query, search_terms, use_index = built
         
         logger.info(f"Final query: {query}")
         
         # Calculate pagination
         skip = (page - 1) * limit
+        sort_field = SORT_FIELDS[sort]
         
-        # Use aggregation pipeline for better performance
-        pipeline = [
-            {"$match": query},
-            {
-                "$lookup": {
-                    "from": "categories",
-                    "localField": "category",
-                    "foreignField": "_id",
-                    "as": "category_data"
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "brands",
-                    "localField": "brand", 
-                    "foreignField": "_id",
-                    "as": "brand_data"
-                }
-            },
-            {
-                "$addFields": {
-                    "category": {
-                        "$ifNull": [
-                            {"$arrayElemAt": ["$category_data", 0]},
-                            {"name": "Uncategorized", "_id": None}
-                        ]
-                    },
-                    "brand": {
-                        "$ifNull": [
-                            {"$arrayElemAt": ["$brand_data", 0]},
-                            {"name": "No Brand", "_id": None}
-                        ]
-                    }
-                }
-            },
-            {
-                "$project": {
-                    "category_data": 0,
-                    "brand_data": 0
-                }
-            },
-            {"$sort": {"created_at": -1}},
-            {
-                "$facet": {
-                    "products": [
-                        {"$skip": skip},
-                        {"$limit": limit}
-                    ],
-                    "totalCount": [
-                        {"$count": "count"}
-                    ]
-                }
-            }
-        ]
-        
-        result = await db.aggregate("products", pipeline)
+        # Filter-and-sort listings come from the in-memory columnar catalog when it can evaluate the query
+        served = None
+        if not use_index and sort_field == "created_at" and columnar_catalog.ready:
+            served = columnar_catalog.list_page(query, skip=0 if cursor else skip, limit=limit + 1, cursor=cursor)
         
-        if not result:
-            products = []
-            total = 0
+        if use_index:
+            # Ranked by relevance, so pages are offsets into the ranking rather than keyset cursors
+            products, total = await _search_catalog(db, query, search_terms, skip, limit)
+            has_next_page = skip + len(products) < total
+            next_cursor = None
+            cursor = None
+        elif served is not None:
+            products, total = served
+            if cursor or not include_total:
+                total = None
+            products, next_cursor = split_page(products, limit)
+            has_next_page = next_cursor is not None
+        elif cursor:
+            # Keyset page: seek past the cursor on (sort_field, _id), no skip and no count
+            products = await db.find_many(
+                CATALOG_VIEW, apply_cursor(query, cursor, sort_field), sort=keyset_sort(sort_field), limit=limit + 1
+            )
+            products, next_cursor = split_page(products, limit, sort_field)
+            has_next_page = next_cursor is not None
+            total = None
         else:
-            products = result[0].get("products", [])
-            total_count = result[0].get("totalCount", [])
-            total = total_count[0]["count"] if total_count else 0
+            # One extra row tells whether there is a next page, so the (cached, possibly
+            # estimated) total is only needed for display
+            page_query = db.find_many(CATALOG_VIEW, query, sort=keyset_sort(sort_field), skip=skip, limit=limit + 1)
+            if include_total:
+                products, total = await asyncio.gather(page_query, count_products(db, query))
+            else:
+                products, total = await page_query, None
+            # Lets page-based clients switch to cursors from any page
+            products, next_cursor = split_page(products, limit, sort_field)
+            has_next_page = next_cursor is not None
         
         # ✅ Process products for mobile app with proper ID handling
         processed_products = []
@@ -247,17 +300,31 @@ async def get_products(
         if processed_products:
             logger.info(f"First product _id: {processed_products[0].get('_id')}")
         
+        if cursor:
+            return {
+                "products": processed_products,
+                "pagination": {
+                    "limit": limit,
+                    "nextCursor": next_cursor,
+                    "hasNextPage": has_next_page,
+                    "hasPrevPage": True
+                }
+            }
+        
         return {
             "products": processed_products,
             "pagination": {
+                "nextCursor": next_cursor,
                 "currentPage": page,
-                "totalPages": (total + limit - 1) // limit if total > 0 else 0,
+                "totalPages": (total + limit - 1) // limit if total is not None else None,
                 "totalProducts": total,
-                "hasNextPage": skip + len(products) < total,
+                "hasNextPage": has_next_page,
                 "hasPrevPage": page > 1
             }
         }
         
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Get products error: {e}")
         import traceback
@@ -267,10 +334,168 @@ async def get_products(
             detail=f"Failed to get products: {str(e)}"
         )
 
-@router.get("/{product_id}")
+@router.get("/suggest")
+async def suggest_products(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=25)
+):
+    """Autocomplete suggestions (product names, brands, categories, keywords) for a typed prefix"""
+    if not suggest_index.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Suggestions are not available yet"
+        )
+    return {"query": q, "suggestions": suggest_index.suggest(q, limit)}
+
+@router.get("/facets")
+async def get_product_facets(
+    category: Optional[str] = Query(None),
+    brand: Optional[str] = Query(None),
+    search: Optional[str] = Query(None),
+    min_price: Optional[float] = Query(None),
+    max_price: Optional[float] = Query(None),
+    in_stock: Optional[bool] = Query(None),
+    db: DatabaseManager = Depends(get_catalog_database)
+):
+    """Product counts per category, brand, price bucket and in-stock for the same filters as GET /products"""
+    try:
+        built = await build_product_query(db, category, brand, search, min_price, max_price, in_stock)
+        if built is None:
+            return empty_facets()
+        query, search_terms, use_index = built
+        return await get_facets(db, query, search_terms if use_index else None)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Get product facets error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get product facets"
+        )
+
+@router.get("/bestsellers", dependencies=[Depends(product_list_etag)])
+async def get_bestsellers(
+    limit: int = Query(10, ge=1, le=50),
+    db: DatabaseManager = Depends(get_catalog_database)
+):
+    """Best-selling products by recently weighted sales, best first"""
+    try:
+        # Overfetch: some top sellers may have been deactivated since
+        ranked = await bestseller_ids(db, limit * 2)
+        products = await db.find_many(CATALOG_VIEW, {"_id": {"$in": ranked}}) if ranked else []
+        products_by_id = {product["_id"]: product for product in products}
+        
+        processed_products = []
+        for product_id in ranked:
+            product = products_by_id.get(product_id)
+            serialized_product = serialize_product_for_mobile(product) if product else None
+            if serialized_product and serialized_product.get("_id"):
+                processed_products.append(serialized_product)
+            if len(processed_products) == limit:
+                break
+        
+        return {"products": processed_products}
+    except Exception as e:
+        logger.error(f"Get bestsellers error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get bestsellers"
+        )
+
+@router.get("/batch", dependencies=[Depends(product_detail_etag)])
+async def get_products_batch(
+    ids: str = Query(..., description=f"Comma-separated product ids, at most {MAX_BATCH_IDS}"),
+    db: DatabaseManager = Depends(get_catalog_database)
+):
+    """Resolve many products in one query, returned in the order the ids were given"""
+    product_ids = list(dict.fromkeys(product_id.strip() for product_id in ids.split(",") if product_id.strip()))
+    if not product_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No product ids given")
+    if len(product_ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_IDS} product ids per request"
+        )
+    invalid = [product_id for product_id in product_ids if not ObjectId.is_valid(product_id)]
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid product ID format: {', '.join(invalid)}"
+        )
+    
+    try:
+        products = await db.find_many(CATALOG_VIEW, {"_id": {"$in": [ObjectId(product_id) for product_id in product_ids]}})
+        products_by_id = {str(product["_id"]): product for product in products}
+        
+        processed_products = []
+        for product_id in product_ids:
+            product = products_by_id.get(product_id)
+            serialized_product = serialize_product_for_mobile(product) if product else None
+            if serialized_product and serialized_product.get("_id"):
+                processed_products.append(serialized_product)
+        
+        return {
+            "products": processed_products,
+            # Deleted or deactivated since the client saw them
+            "missing": [product_id for product_id in product_ids if product_id not in products_by_id]
+        }
+    except Exception as e:
+        logger.error(f"Get products batch error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get products"
+        )
+
+def _sync_row(product: dict) -> list:
+    category = product.get("category") or {}
+    brand = product.get("brand") or {}
+    return [
+        str(product["_id"]),
+        product.get("name"),
+        product.get("price"),
+        product.get("stock", 0),
+        str(category["_id"]) if category.get("_id") else None,
+        str(brand["_id"]) if brand.get("_id") else None,
+        process_product_images(product),
+        product.get("keywords") or [],
+        product.get("description")
+    ]
+
+@router.get("/changes")
+async def get_product_changes(
+    since: Optional[str] = Query(None, description="next token from the previous sync; omit for a full sync"),
+    limit: int = Query(500, ge=1, le=2000),
+    db: DatabaseManager = Depends(get_database)
+):
+    """Delta sync for the app's offline catalog: products added or changed, and ids removed, since a token.
+
+    Products come as rows laid out like ``fields``. Keep calling with ``next`` while
+    ``hasMore``; on ``reset`` drop the local catalog and sync again without ``since``.
+    """
+    try:
+        # Primary reads: a lagging secondary could hide writes older than the returned token
+        changes = await get_changes(db, since, limit)
+        return {
+            "reset": changes["reset"],
+            "fields": SYNC_FIELDS,
+            "products": [_sync_row(product) for product in changes["products"]],
+            "removed": changes["removed"],
+            "next": changes["next"],
+            "hasMore": changes["has_more"]
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Get product changes error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get product changes"
+        )
+
+@router.get("/{product_id}", dependencies=[Depends(product_detail_etag)])
 async def get_product(
     product_id: str,
-    db: DatabaseManager = Depends(get_database)
+    db: DatabaseManager = Depends(get_catalog_database)
 ):
     """Get a specific product by ID for mobile app"""
     try:
@@ -282,59 +507,18 @@ async def get_product(
                 detail="Invalid product ID format"
             )
         
-        # Use aggregation to get product with populated fields
-        pipeline = [
-            {"$match": {"_id": ObjectId(product_id), "is_active": True}},
-            {
-                "$lookup": {
-                    "from": "categories",
-                    "localField": "category",
-                    "foreignField": "_id",
-                    "as": "category_data"
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "brands",
-                    "localField": "brand",
-                    "foreignField": "_id",
-                    "as": "brand_data"
-                }
-            },
-            {
-                "$addFields": {
-                    "category": {
-                        "$ifNull": [
-                            {"$arrayElemAt": ["$category_data", 0]},
-                            {"name": "Uncategorized", "_id": None}
-                        ]
-                    },
-                    "brand": {
-                        "$ifNull": [
-                            {"$arrayElemAt": ["$brand_data", 0]},
-                            {"name": "No Brand", "_id": None}
-                        ]
-                    }
-                }
-            },
-            {
-                "$project": {
-                    "category_data": 0,
-                    "brand_data": 0
-                }
-            }
-        ]
+        # Single indexed read from the catalog view, category and brand already embedded
+        product = await db.find_one(CATALOG_VIEW, {"_id": ObjectId(product_id)})
         
-        products = await db.aggregate("products", pipeline)
-        
-        if not products:
+        if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found"
             )
+        stats_recorder.record_view(product["_id"])
         
         # ✅ Use the enhanced serialization function
-        product = serialize_product_for_mobile(products[0])
+        product = serialize_product_for_mobile(product)
         
         if not product or not product.get("_id"):
             logger.error(f"Product {product_id} missing _id after serialization")
@@ -355,6 +539,44 @@ async def get_product(
             detail="Failed to get product"
         )
 
+@router.get("/{product_id}/related")
+async def get_related_products(
+    product_id: str,
+    limit: int = Query(10, ge=1, le=20),
+    db: DatabaseManager = Depends(get_catalog_database)
+):
+    """Products frequently bought together with this one, most often first"""
+    if not ObjectId.is_valid(product_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid product ID format"
+        )
+    
+    try:
+        # Overfetch: some related products may be out of stock or no longer listed
+        related = await related_products(db, ObjectId(product_id), limit * 2)
+        ids = [entry["product"] for entry in related]
+        products = await db.find_many(CATALOG_VIEW, {"_id": {"$in": ids}, "stock": {"$gt": 0}}) if ids else []
+        products_by_id = {product["_id"]: product for product in products}
+        
+        processed_products = []
+        for entry in related:
+            product = products_by_id.get(entry["product"])
+            serialized_product = serialize_product_for_mobile(product) if product else None
+            if serialized_product and serialized_product.get("_id"):
+                serialized_product["confidence"] = round(entry["confidence"], 4)
+                processed_products.append(serialized_product)
+            if len(processed_products) == limit:
+                break
+        
+        return {"products": processed_products}
+    except Exception as e:
+        logger.error(f"Get related products error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get related products"
+        )
+
 # ✅ Add debug endpoint to test product serialization
 @router.get("/debug/serialization")
 async def debug_product_serialization(db: DatabaseManager = Depends(get_database)):
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 import logging
 from db.db_manager import DatabaseManager, get_database
+from app.utils.http_cache import conditional_get
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.get("/public")
+@router.get("/public", dependencies=[Depends(conditional_get("settings", ["pricing_config"]))])
 async def get_public_settings(db: DatabaseManager = Depends(get_database)):
     """Get public app settings"""
     try:
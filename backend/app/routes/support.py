@@ -1,10 +1,11 @@
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 import logging
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 from app.utils.auth import get_current_user
 from db.db_manager import DatabaseManager, get_database
+from db.pagination import DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT, NEXT_CURSOR_HEADER, apply_cursor, keyset_sort, opt_in_limit, split_page
 from schema.support import (
     SupportTicketCreate, SupportTicketResponse, SupportTicketStatus,
     ProductRequestCreate, ProductRequestResponse, ProductRequestStatus,
@@ -65,20 +66,30 @@ async def create_support_ticket(
 
 @router.get("/tickets", response_model=List[SupportTicketResponse])
 async def get_user_tickets(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT, description=f"page size (default {DEFAULT_PAGE_LIMIT} with cursor); omit both for the full list"),
+    cursor: Optional[str] = Query(None),
     current_user=Depends(get_current_user),
     db: DatabaseManager = Depends(get_database)
 ):
     """Get all support tickets for the current user"""
     try:
+        limit = opt_in_limit(limit, cursor)
         tickets = await db.find_many(
             "support_tickets",
-            {"user_id": ObjectId(current_user.id)},
-            sort=[("created_at", -1)]
+            apply_cursor({"user_id": ObjectId(current_user.id)}, cursor),
+            sort=keyset_sort(),
+            limit=limit + 1 if limit else 0
         )
+        tickets, next_cursor = split_page(tickets, limit)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
         fixed_tickets = [fix_mongo_types(ticket) for ticket in tickets]
         return [SupportTicketResponse(**ticket) for ticket in fixed_tickets]
         
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Get user tickets error: {e}")
         raise HTTPException(
@@ -363,16 +374,24 @@ async def create_product_request(
 
 @router.get("/tickets", response_model=List[SupportTicketResponse])
 async def get_user_tickets(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT, description=f"page size (default {DEFAULT_PAGE_LIMIT} with cursor); omit both for the full list"),
+    cursor: Optional[str] = Query(None),
     current_user=Depends(get_current_user),
     db: DatabaseManager = Depends(get_database)
 ):
     """Get all support tickets for the current user with message counts"""
     try:
+        limit = opt_in_limit(limit, cursor)
         tickets = await db.find_many(
             "support_tickets",
-            {"user_id": ObjectId(current_user.id)},
-            sort=[("created_at", -1)]
+            apply_cursor({"user_id": ObjectId(current_user.id)}, cursor),
+            sort=keyset_sort(),
+            limit=limit + 1 if limit else 0
         )
+        tickets, next_cursor = split_page(tickets, limit)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
         # Enhance tickets with message counts and latest message info
         enhanced_tickets = []
@@ -400,6 +419,8 @@ async def get_user_tickets(
         
         return enhanced_tickets
         
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Get user tickets error: {e}")
         raise HTTPException(
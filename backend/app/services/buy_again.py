@@ -0,0 +1,136 @@
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from db.catalog_view import CATALOG_VIEW
+import asyncio
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+# One document per user: {_id: user id, items: {<product id>: {orders, quantity,
+# last_ordered_at}}, updated_at}. Keyed by product id so an order is one $inc upsert.
+USER_PURCHASES = "user_purchases"
+
+BUY_AGAIN_PROJECTION = {"name": 1, "price": 1, "stock": 1, "images": 1, "image": 1}
+
+def _order_update(quantities: Dict[ObjectId, int], at: datetime) -> Dict[str, Any]:
+    increments, latest = {}, {"updated_at": at}
+    for product_id, quantity in quantities.items():
+        increments[f"items.{product_id}.orders"] = 1
+        increments[f"items.{product_id}.quantity"] = quantity
+        latest[f"items.{product_id}.last_ordered_at"] = at
+    return {"$inc": increments, "$max": latest}
+
+async def record_order(db, user_id: Any, quantities: Dict[ObjectId, int], at: datetime):
+    """Count one order's products into the user's purchase history"""
+    if not quantities:
+        return
+    user_id = ObjectId(user_id)
+    try:
+        result = await db.bulk_write(USER_PURCHASES, [UpdateOne({"_id": user_id}, _order_update(quantities, at))])
+        if not result["matched_count"]:
+            # First order since the collection existed: backfill from orders, which
+            # already include this one
+            await rebuild_user(db, user_id)
+    except Exception as e:
+        # The order is placed; rebuild_user recounts it from orders
+        logger.error(f"Failed to record order in {USER_PURCHASES} for user {user_id}: {e}")
+
+def _history_pipeline(match: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """orders -> user_purchases documents, for backfill and repair"""
+    return [
+        {"$match": {**match, "items.product": {"$type": "string"}}},
+        {"$unwind": "$items"},
+        {"$match": {"items.product": {"$type": "string"}}},
+        # A product on two lines of one order is still one order of it
+        {"$group": {
+            "_id": {"user": "$user", "product": "$items.product", "order": "$_id"},
+            "quantity": {"$sum": "$items.quantity"},
+            "at": {"$max": "$created_at"}
+        }},
+        {"$group": {
+            "_id": {"user": "$_id.user", "product": "$_id.product"},
+            "orders": {"$sum": 1},
+            "quantity": {"$sum": "$quantity"},
+            "last_ordered_at": {"$max": "$at"}
+        }},
+        {"$group": {
+            "_id": "$_id.user",
+            "items": {"$push": {"k": "$_id.product", "v": {
+                "orders": "$orders", "quantity": "$quantity", "last_ordered_at": "$last_ordered_at"
+            }}},
+            "updated_at": {"$max": "$last_ordered_at"}
+        }},
+        {"$set": {"items": {"$arrayToObject": "$items"}}},
+        {"$merge": {"into": USER_PURCHASES, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+
+async def rebuild_user(db, user_id: ObjectId):
+    await db.aggregate("orders", _history_pipeline({"user": user_id}))
+    # A user with no orders gets an empty history, so buy_again() doesn't rebuild on every call
+    await db.bulk_write(USER_PURCHASES, [
+        UpdateOne({"_id": user_id}, {"$setOnInsert": {"items": {}, "updated_at": datetime.utcnow()}}, upsert=True)
+    ])
+
+async def rebuild(db) -> int:
+    """Recompute every user's purchase history from orders"""
+    await db.aggregate("orders", _history_pipeline({}))
+    count = await db.count_documents(USER_PURCHASES, {})
+    logger.info(f"Rebuilt {USER_PURCHASES} for {count} users")
+    return count
+
+def rank(items: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Product ids, most often ordered first, then most recently ordered"""
+    return sorted(
+        items,
+        key=lambda product_id: (items[product_id].get("orders", 0), items[product_id].get("last_ordered_at") or datetime.min),
+        reverse=True
+    )
+
+async def buy_again(db, user_id: Any, limit: int) -> List[Dict[str, Any]]:
+    """The user's most frequently bought products that are still listed, with current price and stock"""
+    user_id = ObjectId(user_id)
+    history: Optional[Dict[str, Any]] = await db.find_one(USER_PURCHASES, {"_id": user_id})
+    if history is None:
+        # First visit since the collection existed (rebuild_user leaves a document even
+        # for users without orders)
+        await rebuild_user(db, user_id)
+        history = await db.find_one(USER_PURCHASES, {"_id": user_id})
+    items = (history or {}).get("items") or {}
+
+    # Overfetch: some past purchases are no longer listed
+    ranked = [product_id for product_id in rank(items) if ObjectId.is_valid(product_id)][:limit * 2]
+    if not ranked:
+        return []
+    products = await db.find_many(
+        CATALOG_VIEW, {"_id": {"$in": [ObjectId(product_id) for product_id in ranked]}}, projection=BUY_AGAIN_PROJECTION
+    )
+    products_by_id = {str(product["_id"]): product for product in products}
+
+    results = []
+    for product_id in ranked:
+        product = products_by_id.get(product_id)
+        if product is None:
+            continue
+        results.append({"product": product, **items[product_id]})
+        if len(results) == limit:
+            break
+    return results
+
+async def _main(argv: List[str]):
+    from db.resources import resources
+
+    if argv[1:2] != ["rebuild"]:
+        print("usage: python -m app.services.buy_again rebuild")
+        return 2
+    try:
+        await rebuild(resources.db)
+    finally:
+        await resources.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv)))
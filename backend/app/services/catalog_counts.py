@@ -0,0 +1,39 @@
+from typing import Dict, Any
+from dotenv import load_dotenv
+from db.catalog_view import CATALOG_VIEW, ORDER_FIELDS
+from db.query_cache import QueryCache
+from db.resources import resources
+import logging
+import os
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Unfiltered listings read the collection size from metadata instead of counting
+ESTIMATE_UNFILTERED = os.getenv('PRODUCT_COUNT_ESTIMATE_UNFILTERED', 'true').lower() == 'true'
+
+# Page totals per filter signature; a total may trail a catalog edit by up to the TTL.
+# Orders don't invalidate: only in-stock totals depend on them and those expire by TTL
+count_cache = resources.register_cache("counts", QueryCache(int(os.getenv('COUNT_CACHE_MAX_ENTRIES', 1000))))
+count_cache.enable(CATALOG_VIEW, float(os.getenv('COUNT_CACHE_TTL', 30)), ttl_only_fields=ORDER_FIELDS)
+
+async def count_products(db, query: Dict[str, Any]) -> int:
+    """Number of catalog_view documents matching ``query``, cached per normalized query"""
+    key = count_cache.make_key("count", CATALOG_VIEW, query)
+    hit, cached = count_cache.get(key, CATALOG_VIEW)
+    if hit:
+        return cached
+    generation = count_cache.generation(CATALOG_VIEW)
+
+    if not query and ESTIMATE_UNFILTERED:
+        count = await db.estimated_document_count(CATALOG_VIEW)
+    else:
+        count = await db.count_documents(CATALOG_VIEW, query)
+    count_cache.set(key, CATALOG_VIEW, count, generation)
+    return count
+
+async def on_catalog_change(db, product_ids):
+    """db.catalog_view listener for catalog edits (orders only notify stock listeners);
+    other workers' edits arrive through change streams or the TTL"""
+    count_cache.invalidate(CATALOG_VIEW)
@@ -0,0 +1,99 @@
+from typing import Dict, Any, List, Optional
+from dotenv import load_dotenv
+from db.catalog_view import CATALOG_VIEW, ORDER_FIELDS
+from db.query_cache import QueryCache
+from db.resources import resources
+from app.services.search_index import product_search_index
+from app.utils.mongo import fix_mongo_types
+import logging
+import os
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Lower edges of the price buckets; the last bucket is open-ended
+PRICE_BOUNDARIES = [
+    float(edge) for edge in os.getenv('FACET_PRICE_BOUNDARIES', '0,50,100,200,500,1000').split(",") if edge.strip()
+]
+
+# Short-lived: counts may lag a catalog edit in another worker by this much, and the
+# in-stock count lags orders by this much (orders don't invalidate it in any worker)
+facet_cache = resources.register_cache("facets", QueryCache(int(os.getenv('FACET_CACHE_MAX_ENTRIES', 500))))
+facet_cache.enable(CATALOG_VIEW, float(os.getenv('FACET_CACHE_TTL', 30)), ttl_only_fields=ORDER_FIELDS)
+
+def _group_by(field: str) -> List[Dict[str, Any]]:
+    return [
+        {"$group": {"_id": f"${field}._id", "name": {"$first": f"${field}.name"}, "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "name": 1}}
+    ]
+
+def facet_pipeline(query: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {"$match": query},
+        {
+            "$facet": {
+                "categories": _group_by("category"),
+                "brands": _group_by("brand"),
+                "price": [{
+                    "$bucket": {
+                        "groupBy": "$price",
+                        "boundaries": PRICE_BOUNDARIES + [float("inf")],
+                        "default": "other",
+                        "output": {"count": {"$sum": 1}}
+                    }
+                }],
+                "in_stock": [{"$match": {"stock": {"$gt": 0}}}, {"$count": "count"}],
+                "total": [{"$count": "count"}]
+            }
+        }
+    ]
+
+def empty_facets() -> Dict[str, Any]:
+    return {"total": 0, "in_stock": 0, "categories": [], "brands": [], "price": []}
+
+def _format(result: Dict[str, Any]) -> Dict[str, Any]:
+    def named(rows):
+        return [{"id": row["_id"], "name": row.get("name"), "count": row["count"]} for row in rows]
+
+    price = []
+    for row in result.get("price", []):
+        if row["_id"] == "other":
+            continue
+        index = PRICE_BOUNDARIES.index(row["_id"])
+        upper = PRICE_BOUNDARIES[index + 1] if index + 1 < len(PRICE_BOUNDARIES) else None
+        price.append({"min": row["_id"], "max": upper, "count": row["count"]})
+
+    return {
+        "total": result["total"][0]["count"] if result.get("total") else 0,
+        "in_stock": result["in_stock"][0]["count"] if result.get("in_stock") else 0,
+        "categories": named(result.get("categories", [])),
+        "brands": named(result.get("brands", [])),
+        "price": price
+    }
+
+async def get_facets(db, query: Dict[str, Any], search: Optional[str] = None) -> Dict[str, Any]:
+    """Facet counts for the products matching ``query`` (and, when given, the indexed ``search``)"""
+    key = facet_cache.make_key("facets", CATALOG_VIEW, query, " ".join((search or "").lower().split()))
+    hit, cached = facet_cache.get(key, CATALOG_VIEW)
+    if hit:
+        return cached
+    generation = facet_cache.generation(CATALOG_VIEW)
+
+    if search:
+        # The facet pipeline filters after ranking, so keep more candidates
+        candidates = product_search_index.filtered_max_candidates if query else None
+        ranked_ids = [product_id for product_id, _ in product_search_index.search_with_fallback(search, candidates)]
+        if not ranked_ids:
+            return empty_facets()
+        query = {**query, "_id": {"$in": ranked_ids}}
+
+    result = await db.aggregate(CATALOG_VIEW, facet_pipeline(query))
+    facets = fix_mongo_types(_format(result[0])) if result else empty_facets()
+    facet_cache.set(key, CATALOG_VIEW, facets, generation)
+    return facets
+
+async def on_catalog_change(db, product_ids):
+    """db.catalog_view listener for catalog edits (orders only notify stock listeners);
+    other workers' edits arrive through change streams or the TTL"""
+    facet_cache.invalidate(CATALOG_VIEW)
@@ -0,0 +1,133 @@
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from db.catalog_view import CATALOG_VIEW, CatalogListener, SYNC_FIELD, TOMBSTONES
+from db.versions import collection_versions
+import asyncio
+import logging
+import os
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Writes are stamped when they execute and may commit a moment later, so each poll
+# re-reads this far behind the newest stamp it has seen
+OVERLAP_SECONDS = float(os.getenv('CATALOG_FOLLOW_OVERLAP_SECONDS', 5))
+# More changed products than this in one poll reload the listeners in full
+MAX_REFRESH = int(os.getenv('CATALOG_FOLLOW_MAX_REFRESH', 5000))
+
+class CatalogFollower:
+    """Keeps this worker's in-process catalog structures current without change streams.
+
+    db.catalog_view listeners only hear about writes made by this worker. Every
+    ``poll_seconds`` the follower checks the shared catalog_view version counter
+    (db.versions, a cached read) and, when another worker has written since, reads the
+    ids stamped (SYNC_FIELD) or tombstoned since the last poll and hands them to its
+    listeners, which take the same (db, ids or None) arguments as catalog_view's.
+    Writes made by this worker come back too; a refresh of them is a cheap no-op.
+    """
+
+    def __init__(self, listeners: List[CatalogListener], poll_seconds: float = 5):
+        self.listeners = listeners
+        self.poll_seconds = poll_seconds
+        self.polls = 0
+        self.refreshed = 0
+        self._version: Optional[int] = None
+        self._synced_since = datetime.min
+        self._removed_since = datetime.min
+        self._db = None
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, listeners: List[CatalogListener]) -> Optional["CatalogFollower"]:
+        poll_seconds = float(os.getenv('CATALOG_FOLLOW_SECONDS', 5))
+        if poll_seconds <= 0:
+            return None
+        return cls(listeners, poll_seconds)
+
+    async def start(self, db):
+        """Start following from now; call before the listeners' initial loads so nothing falls in between"""
+        self._db = db
+        self._version = await self._read_version()
+        self._synced_since = await self._newest(CATALOG_VIEW, SYNC_FIELD)
+        self._removed_since = await self._newest(TOMBSTONES, "removed_at")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _read_version(self) -> Optional[int]:
+        if not collection_versions.tracks(CATALOG_VIEW):
+            return None
+        versions = await collection_versions.get(self._db.db, [CATALOG_VIEW])
+        return versions[CATALOG_VIEW]
+
+    async def _newest(self, collection: str, field: str) -> datetime:
+        documents = await self._db.find_many(collection, {field: {"$ne": None}}, projection={field: 1}, sort=[(field, -1)], limit=1)
+        return documents[0][field] if documents else datetime.min
+
+    async def _changed_since(self, collection: str, field: str, since: datetime) -> List[Dict[str, Any]]:
+        start = since - timedelta(seconds=OVERLAP_SECONDS) if since > datetime.min + timedelta(seconds=OVERLAP_SECONDS) else since
+        return await self._db.find_many(
+            collection, {field: {"$gte": start}}, projection={field: 1}, sort=[(field, 1)], limit=MAX_REFRESH + 1
+        )
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{CATALOG_VIEW} follower poll failed: {e}")
+
+    async def poll(self):
+        self.polls += 1
+        version = await self._read_version()
+        if version is not None and version == self._version:
+            return
+
+        changed = await self._changed_since(CATALOG_VIEW, SYNC_FIELD, self._synced_since)
+        removed = await self._changed_since(TOMBSTONES, "removed_at", self._removed_since)
+        if len(changed) > MAX_REFRESH or len(removed) > MAX_REFRESH:
+            product_ids = None
+        else:
+            product_ids = list({document["_id"] for document in changed + removed})
+        if changed:
+            self._synced_since = max(self._synced_since, changed[-1][SYNC_FIELD])
+        if removed:
+            self._removed_since = max(self._removed_since, removed[-1]["removed_at"])
+        # Only after the reads: a write landing in between is seen again next poll
+        self._version = version
+
+        if product_ids == []:
+            return
+        if product_ids is None:
+            # Too much to catch up on one product at a time (e.g. a catalog rebuild)
+            self._synced_since = await self._newest(CATALOG_VIEW, SYNC_FIELD)
+            self._removed_since = await self._newest(TOMBSTONES, "removed_at")
+        for callback in self.listeners:
+            try:
+                await callback(self._db, product_ids)
+            except Exception as e:
+                logger.error(f"{CATALOG_VIEW} follower listener failed: {e}")
+        self.refreshed += len(product_ids) if product_ids else 0
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "poll_seconds": self.poll_seconds,
+            "polls": self.polls,
+            "refreshed": self.refreshed,
+            "version": self._version,
+            "synced_since": self._synced_since,
+            "removed_since": self._removed_since
+        }
@@ -0,0 +1,377 @@
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime
+from bson import ObjectId
+from dotenv import load_dotenv
+from app.services.columnar_catalog import COLUMNS, ColumnarCatalog
+import numpy as np
+import asyncio
+import bson
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# File layout: MAGIC | uint64 meta length | BSON meta | pad | column arrays (64-byte
+# aligned) | record offsets (uint64, rows + 1) | concatenated BSON records. Rows are
+# stored in (created_at, _id) descending order, so readers need no sort.
+MAGIC = b"CATSNAP1"
+ALIGN = 64
+_HEADER = struct.Struct("<8sQ")
+
+def _align(value: int) -> int:
+    return (value + ALIGN - 1) // ALIGN * ALIGN
+
+def _ids_by_code(codes: Dict[ObjectId, int]) -> List[ObjectId]:
+    ordered = [None] * len(codes)
+    for key, code in codes.items():
+        ordered[code] = key
+    return ordered
+
+def _write(path: str, columns: Dict[str, np.ndarray], records: List[Any], meta: Dict[str, Any]):
+    blobs = [bson.encode(record.to_document()) for record in records]
+    offsets = np.zeros(len(blobs) + 1, dtype=np.uint64)
+    if blobs:
+        offsets[1:] = np.cumsum([len(blob) for blob in blobs])
+    sections = {**columns, "record_offsets": offsets}
+
+    layout, position = [], 0
+    for name, array in sections.items():
+        layout.append({"name": name, "dtype": array.dtype.str, "offset": position, "length": int(array.shape[0])})
+        position = _align(position + array.nbytes)
+    meta = {**meta, "columns": layout, "records_offset": position}
+
+    encoded_meta = bson.encode(meta)
+    data_start = _align(_HEADER.size + len(encoded_meta))
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as snapshot:
+        snapshot.write(_HEADER.pack(MAGIC, len(encoded_meta)))
+        snapshot.write(encoded_meta)
+        for entry, array in zip(layout, sections.values()):
+            snapshot.seek(data_start + entry["offset"])
+            snapshot.write(array.tobytes())
+        snapshot.seek(data_start + position)
+        for blob in blobs:
+            snapshot.write(blob)
+        # Zero-length trailing sections still need their offsets inside the file
+        snapshot.truncate(data_start + position + int(offsets[-1]))
+        snapshot.flush()
+        os.fsync(snapshot.fileno())
+    # Readers holding the old file keep their mapping; new opens see the new file
+    os.replace(temporary, path)
+
+async def write_snapshot(catalog: ColumnarCatalog, path: str) -> int:
+    """Publish ``catalog`` to ``path`` atomically; returns the snapshot version"""
+    order = catalog._sorted_rows()
+    columns = {name: np.ascontiguousarray(getattr(catalog, name)[order]) for name in COLUMNS}
+    # Records are replaced, never mutated, so encoding them off the event loop is safe
+    records = [catalog.records[row] for row in order]
+    version = time.time_ns()
+    meta = {
+        "version": version,
+        "built_at": datetime.utcnow(),
+        "rows": len(records),
+        "categories": _ids_by_code(catalog.category_codes),
+        "brands": _ids_by_code(catalog.brand_codes),
+    }
+    await asyncio.to_thread(_write, path, columns, records, meta)
+    return version
+
+class MappedRecord:
+    __slots__ = ("_buffer", "_start", "_end")
+
+    def __init__(self, buffer: mmap.mmap, start: int, end: int):
+        self._buffer = buffer
+        self._start = start
+        self._end = end
+
+    def to_document(self) -> Dict[str, Any]:
+        return bson.decode(self._buffer[self._start:self._end])
+
+class MappedRecords:
+    """Read-only stand-in for ColumnarCatalog.records, decoding a row's BSON on access"""
+
+    def __init__(self, buffer: mmap.mmap, offsets: np.ndarray, base: int):
+        self._buffer = buffer
+        self._offsets = offsets
+        self._base = base
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row: int) -> MappedRecord:
+        return MappedRecord(self._buffer, self._base + int(self._offsets[row]), self._base + int(self._offsets[row + 1]))
+
+def map_snapshot(path: str) -> Tuple[ColumnarCatalog, int]:
+    """Map a published snapshot as ColumnarCatalog state; the columns are zero-copy views of the file"""
+    with open(path, "rb") as snapshot:
+        buffer = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, meta_length = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a catalog snapshot")
+    meta = bson.decode(buffer[_HEADER.size:_HEADER.size + meta_length])
+    data_start = _align(_HEADER.size + meta_length)
+
+    sections = {
+        entry["name"]: np.frombuffer(buffer, dtype=np.dtype(entry["dtype"]), count=entry["length"], offset=data_start + entry["offset"])
+        for entry in meta["columns"]
+    }
+    rows = meta["rows"]
+
+    state = ColumnarCatalog.__new__(ColumnarCatalog)
+    state.size = rows
+    for name in COLUMNS:
+        setattr(state, name, sections[name])
+    state.records = MappedRecords(buffer, sections["record_offsets"], data_start + meta["records_offset"])
+    state.rows = {
+        ObjectId(int(hi).to_bytes(8, "big") + int(lo).to_bytes(4, "big")): row
+        for row, (hi, lo) in enumerate(zip(state.id_hi.tolist(), state.id_lo.tolist()))
+    }
+    state.free = []
+    state.category_codes = {key: code for code, key in enumerate(meta["categories"])}
+    state.brand_codes = {key: code for code, key in enumerate(meta["brands"])}
+    state._order = np.arange(rows)
+    return state, meta["version"]
+
+class CatalogSnapshots:
+    """One columnar catalog per host instead of one per uvicorn worker.
+
+    The builder (the worker holding ``<path>.lock``, or every worker with role
+    "builder") keeps the catalog current from Mongo as before and republishes the
+    snapshot file a moment after each change, plus a full reload every
+    CATALOG_SNAPSHOT_REBUILD_SECONDS. Readers map the file and swap to a new mapping
+    when it is replaced. Readers take over as builder if the lock frees up. Catalog
+    and stock changes made through a reader are appended to ``<path>.pending`` (product
+    ids, or ``*`` for a full reload); the builder drains that file every poll, re-reads
+    those products from Mongo and republishes. Changes made outside the app reach the
+    builder through change streams, or through CatalogFollower when they are off.
+    """
+
+    def __init__(self, catalog: ColumnarCatalog, path: str, role: str = "auto", poll_seconds: float = 2,
+                 publish_delay: float = 2, rebuild_seconds: float = 300):
+        self.catalog = catalog
+        self.path = path
+        self.role = role
+        self.poll_seconds = poll_seconds
+        self.publish_delay = publish_delay
+        self.rebuild_seconds = rebuild_seconds
+        self.is_builder = False
+        self.version: Optional[int] = None
+        self.publishes = 0
+        self._lock_fd: Optional[int] = None
+        self._mapped_stat: Optional[Tuple[int, int]] = None
+        self._publish_task: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self._db = None
+
+    @classmethod
+    def from_env(cls, catalog: ColumnarCatalog) -> Optional["CatalogSnapshots"]:
+        path = os.getenv('CATALOG_SNAPSHOT_PATH')
+        if not path:
+            return None
+        return cls(
+            catalog, path,
+            role=os.getenv('CATALOG_SNAPSHOT_ROLE', 'auto').lower(),
+            poll_seconds=float(os.getenv('CATALOG_SNAPSHOT_POLL_SECONDS', 2)),
+            publish_delay=float(os.getenv('CATALOG_SNAPSHOT_PUBLISH_DELAY', 2)),
+            rebuild_seconds=float(os.getenv('CATALOG_SNAPSHOT_REBUILD_SECONDS', 300))
+        )
+
+    def _try_lock(self) -> bool:
+        fd = os.open(f"{self.path}.lock", os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def start(self, db):
+        self._db = db
+        if self.role == "builder" or (self.role == "auto" and self._try_lock()):
+            await self._become_builder()
+        elif not self._map():
+            # Nothing published yet: serve from our own copy until a snapshot appears
+            await self.catalog.load(db)
+        self._task = asyncio.create_task(self._run())
+
+    async def _become_builder(self):
+        self.is_builder = True
+        self.catalog.detach()
+        # The full load covers whatever readers queued before now
+        self._take_pending()
+        await self.catalog.load(self._db)
+        await self.publish()
+        logger.info(f"Catalog snapshot builder for {self.path}")
+
+    async def publish(self):
+        try:
+            self.version = await write_snapshot(self.catalog, self.path)
+            self.publishes += 1
+        except Exception as e:
+            logger.error(f"Failed to publish catalog snapshot {self.path}: {e}")
+
+    def schedule_publish(self):
+        if self.is_builder and (self._publish_task is None or self._publish_task.done()):
+            self._publish_task = asyncio.create_task(self._publish_later())
+
+    async def _publish_later(self):
+        # Coalesces bursts (imports, bulk inventory updates) into one publish
+        await asyncio.sleep(self.publish_delay)
+        await self.publish()
+
+    async def on_catalog_change(self, db, product_ids):
+        """db.catalog_view listener, registered after the catalog's own"""
+        if self.is_builder:
+            self.schedule_publish()
+        else:
+            self._signal_builder(["*"] if product_ids is None else [str(product_id) for product_id in product_ids])
+
+    async def on_stock_change(self, db, deltas):
+        """db.catalog_view stock listener, registered after the catalog's own"""
+        if self.is_builder:
+            self.schedule_publish()
+        else:
+            self._signal_builder([str(product_id) for product_id in deltas])
+
+    def _signal_builder(self, entries: List[str]):
+        """Queue products this reader changed for the builder; the mapped snapshot can't be written here"""
+        if not entries:
+            return
+        try:
+            fd = os.open(f"{self.path}.pending", os.O_CREAT | os.O_WRONLY | os.O_APPEND, 0o644)
+            try:
+                # The builder empties the file under the same lock
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                os.write(fd, ("\n".join(entries) + "\n").encode())
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.error(f"Failed to signal catalog snapshot builder for {len(entries)} products: {e}")
+
+    def _take_pending(self) -> List[str]:
+        """Read and empty ``<path>.pending``"""
+        try:
+            fd = os.open(f"{self.path}.pending", os.O_RDWR)
+        except FileNotFoundError:
+            return []
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            chunks = []
+            while True:
+                chunk = os.read(fd, 1 << 16)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            os.ftruncate(fd, 0)
+        finally:
+            os.close(fd)
+        return b"".join(chunks).decode().split()
+
+    async def _apply_pending(self):
+        entries = self._take_pending()
+        if not entries:
+            return
+        if "*" in entries:
+            await self.catalog.load(self._db)
+        else:
+            await self.catalog.refresh(self._db, {ObjectId(entry) for entry in entries if ObjectId.is_valid(entry)})
+        self.schedule_publish()
+
+    async def on_remote_change(self, db, product_ids):
+        """CatalogFollower listener, after the catalog's own: another worker's change is the builder's to publish"""
+        self.schedule_publish()
+
+    def change_stream_subscriber(self):
+        async def on_event(collection: str, event: Dict[str, Any]):
+            self.schedule_publish()
+        return on_event
+
+    def _map(self) -> bool:
+        try:
+            stat = os.stat(self.path)
+            state, version = map_snapshot(self.path)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.error(f"Failed to map catalog snapshot {self.path}: {e}")
+            return False
+        self.catalog.attach(state)
+        self._mapped_stat = (stat.st_ino, stat.st_mtime_ns)
+        self.version = version
+        logger.info(f"Mapped catalog snapshot {version} ({len(state.rows)} products)")
+        return True
+
+    async def _run(self):
+        last_rebuild = time.monotonic()
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                if self.is_builder:
+                    await self._apply_pending()
+                    if time.monotonic() - last_rebuild >= self.rebuild_seconds:
+                        last_rebuild = time.monotonic()
+                        await self.catalog.load(self._db)
+                        await self.publish()
+                    continue
+                if self.role == "auto" and self._try_lock():
+                    await self._become_builder()
+                    last_rebuild = time.monotonic()
+                    continue
+                stat = os.stat(self.path)
+                if (stat.st_ino, stat.st_mtime_ns) != self._mapped_stat:
+                    self._map()
+            except asyncio.CancelledError:
+                raise
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"Catalog snapshot loop error: {e}")
+
+    async def stop(self):
+        for task in (self._task, self._publish_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._publish_task = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "role": "builder" if self.is_builder else "reader",
+            "version": self.version,
+            "publishes": self.publishes
+        }
+
+async def _main(argv: List[str]):
+    from db.resources import resources
+
+    path = os.getenv('CATALOG_SNAPSHOT_PATH')
+    if argv[1:2] != ["build"] or not path:
+        print("usage: CATALOG_SNAPSHOT_PATH=... python -m app.services.catalog_snapshot build")
+        return 2
+    catalog = ColumnarCatalog()
+    try:
+        await catalog.load(resources.db)
+        version = await write_snapshot(catalog, path)
+        print(f"Wrote {len(catalog)} products to {path} (version {version})")
+    finally:
+        await resources.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv)))
@@ -0,0 +1,96 @@
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timedelta
+from bson import ObjectId
+from dotenv import load_dotenv
+from db.catalog_view import CATALOG_VIEW, SYNC_FIELD, TOMBSTONES, TOMBSTONE_RETENTION_SECONDS
+from db.pagination import decode_cursor, encode_cursor, keyset_filter, keyset_sort
+import logging
+import os
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Changes newer than this are left for the next sync, so a write stamped just before a
+# sync but committed just after it is not skipped
+SETTLE_SECONDS = float(os.getenv('SYNC_SETTLE_SECONDS', 5))
+
+SYNC_PROJECTION = {
+    "name": 1, "description": 1, "price": 1, "stock": 1, "images": 1, "image": 1, "keywords": 1,
+    "category._id": 1, "brand._id": 1, SYNC_FIELD: 1
+}
+
+_MIN_ID = ObjectId("0" * 24)
+
+def _position(value: datetime, sort_field: str) -> str:
+    """Cursor just before everything stamped at or after ``value``"""
+    return encode_cursor({sort_field: value, "_id": _MIN_ID}, sort_field)
+
+def encode_token(products_cursor: str, removed_cursor: str) -> str:
+    # Cursors are urlsafe base64, which never contains "."
+    return f"{products_cursor}.{removed_cursor}"
+
+def decode_token(token: str) -> Tuple[str, str]:
+    """Split a sync token into its view and tombstone cursors; raises ValueError when malformed"""
+    products_cursor, dot, removed_cursor = token.partition(".")
+    if not dot or not products_cursor or not removed_cursor:
+        raise ValueError("Invalid sync token")
+    decode_cursor(products_cursor)
+    decode_cursor(removed_cursor)
+    return products_cursor, removed_cursor
+
+def _naive(value: Any) -> Any:
+    # json_util decodes datetimes tz-aware, pymongo hands back naive UTC
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    return value
+
+async def _read_stream(db, collection: str, sort_field: str, cursor: Optional[str], horizon: datetime, limit: int, projection: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], str, bool]:
+    """One page of a (sort_field, _id) ordered change stream below ``horizon``.
+
+    Returns the documents, the cursor to continue from and whether more are waiting.
+    """
+    query = {sort_field: {"$lt": horizon}}
+    if cursor:
+        query = {"$and": [keyset_filter(cursor, sort_field, 1), query]}
+    documents = await db.find_many(collection, query, projection=projection, sort=keyset_sort(sort_field, 1), limit=limit + 1)
+
+    if len(documents) > limit:
+        documents = documents[:limit]
+        return documents, encode_cursor(documents[-1], sort_field), True
+    # Caught up: everything below the horizon has been seen
+    return documents, _position(horizon, sort_field), False
+
+async def get_changes(db, since: Optional[str], limit: int) -> Dict[str, Any]:
+    """Catalog changes after sync token ``since`` (everything when None).
+
+    ``reset`` means the token is older than the tombstone retention, so removals may have
+    been missed and the client has to drop its copy and sync from scratch.
+    """
+    now = datetime.utcnow()
+    horizon = now - timedelta(seconds=SETTLE_SECONDS)
+
+    if since:
+        products_cursor, removed_cursor = decode_token(since)
+        removed_at, _ = decode_cursor(removed_cursor)
+        removed_at = _naive(removed_at)
+        if not isinstance(removed_at, datetime) or removed_at < now - timedelta(seconds=TOMBSTONE_RETENTION_SECONDS):
+            return {"reset": True, "products": [], "removed": [], "next": None, "has_more": False}
+    else:
+        # A first sync has nothing to delete
+        products_cursor, removed_cursor = None, _position(horizon, "removed_at")
+
+    products, products_cursor, more_products = await _read_stream(
+        db, CATALOG_VIEW, SYNC_FIELD, products_cursor, horizon, limit, SYNC_PROJECTION
+    )
+    removed, removed_cursor, more_removed = await _read_stream(
+        db, TOMBSTONES, "removed_at", removed_cursor, horizon, limit, {"_id": 1, "removed_at": 1}
+    )
+
+    return {
+        "reset": False,
+        "products": products,
+        "removed": [str(tombstone["_id"]) for tombstone in removed],
+        "next": encode_token(products_cursor, removed_cursor),
+        "has_more": more_products or more_removed
+    }
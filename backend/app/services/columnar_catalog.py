@@ -0,0 +1,284 @@
+from typing import Dict, Any, List, Optional, Tuple, Callable
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from dotenv import load_dotenv
+from db.pagination import decode_cursor
+from app.services.search_index import CatalogIndex
+import numpy as np
+import logging
+import os
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Column name -> dtype. Rows are product slots; a removed product's slot is reused
+COLUMNS = {
+    "price": np.float64,
+    "stock": np.int64,
+    "category": np.int32,
+    "brand": np.int32,
+    "created": np.int64,
+    "id_hi": np.uint64,
+    "id_lo": np.uint32,
+    "alive": np.bool_,
+}
+INITIAL_CAPACITY = 1024
+
+# Missing created_at sorts lowest, like a null in Mongo's descending sort
+NULL_TIME = np.iinfo(np.int64).min
+NO_CODE = -1
+_EPOCH = datetime(1970, 1, 1)
+
+_RANGE_OPS = {
+    "$gt": np.greater,
+    "$gte": np.greater_equal,
+    "$lt": np.less,
+    "$lte": np.less_equal,
+}
+
+def _micros(value: Any) -> int:
+    if not isinstance(value, datetime):
+        return NULL_TIME
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+def _id_parts(product_id: ObjectId) -> Tuple[int, int]:
+    """ObjectId as (high 8 bytes, low 4 bytes), which sort like the ObjectId itself"""
+    binary = product_id.binary
+    return int.from_bytes(binary[:8], "big"), int.from_bytes(binary[8:], "big")
+
+class ProductRecord:
+    """Display fields of one catalog_view document; anything uncommon rides in ``extra``"""
+
+    __slots__ = ("id", "name", "description", "price", "stock", "images", "keywords", "category", "brand", "created_at", "extra")
+
+    def __init__(self, document: Dict[str, Any]):
+        extra = dict(document)
+        self.id = extra.pop("_id")
+        self.name = extra.pop("name", None)
+        self.description = extra.pop("description", None)
+        self.price = extra.pop("price", None)
+        self.stock = extra.pop("stock", None)
+        self.images = extra.pop("images", None)
+        self.keywords = extra.pop("keywords", None)
+        self.category = extra.pop("category", None)
+        self.brand = extra.pop("brand", None)
+        self.created_at = extra.pop("created_at", None)
+        self.extra = extra
+
+    def to_document(self) -> Dict[str, Any]:
+        document = {
+            "_id": self.id,
+            "name": self.name,
+            "description": self.description,
+            "price": self.price,
+            "stock": self.stock,
+            "images": self.images,
+            "keywords": self.keywords,
+            "category": self.category,
+            "brand": self.brand,
+            "created_at": self.created_at,
+            **self.extra
+        }
+        return {key: value for key, value in document.items() if value is not None or key == "_id"}
+
+class ColumnarCatalog(CatalogIndex):
+    """catalog_view held in memory as NumPy columns for listing queries.
+
+    Price, stock, category/brand codes, created_at and the ObjectId (split in two
+    integers) are columns; display fields are ProductRecord objects in a parallel
+    list. A listing is a vectorized mask over the columns walked in a cached
+    (created_at, _id) descending order, so a page costs no sort and no Mongo round
+    trip. The order is recomputed lazily after the catalog changes. match() only
+    understands the filters build_product_query produces; anything else returns None
+    and the caller queries Mongo.
+    """
+
+    PROJECTION = None
+
+    def __init__(self):
+        super().__init__(os.getenv('COLUMNAR_CATALOG_ENABLED', 'true').lower() == 'true')
+        # Serving a read-only snapshot mapped by app.services.catalog_snapshot; updates
+        # arrive as new snapshots, not through load/refresh
+        self.mapped = False
+
+    def _reset(self):
+        self.size = 0
+        for name, dtype in COLUMNS.items():
+            setattr(self, name, np.zeros(INITIAL_CAPACITY, dtype=dtype))
+        self.records: List[Optional[ProductRecord]] = [None] * INITIAL_CAPACITY
+        self.rows: Dict[ObjectId, int] = {}
+        self.free: List[int] = []
+        self.category_codes: Dict[ObjectId, int] = {}
+        self.brand_codes: Dict[ObjectId, int] = {}
+        self._order: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def attach(self, state: "ColumnarCatalog"):
+        """Swap in mapped snapshot state (see catalog_snapshot.map_snapshot)"""
+        self.__dict__.update(vars(state))
+        self.mapped = True
+        self.ready = True
+
+    def detach(self):
+        """Go back to maintaining the catalog from Mongo; call load() next"""
+        self.mapped = False
+
+    async def load(self, db):
+        if not self.mapped:
+            await super().load(db)
+
+    async def refresh(self, db, product_ids):
+        if not self.mapped:
+            await super().refresh(db, product_ids)
+
+    def _grow(self):
+        capacity = len(self.records) * 2
+        for name, dtype in COLUMNS.items():
+            column = np.zeros(capacity, dtype=dtype)
+            column[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, column)
+        self.records.extend([None] * (capacity - len(self.records)))
+
+    @staticmethod
+    def _code(codes: Dict[ObjectId, int], summary: Any) -> int:
+        key = summary.get("_id") if isinstance(summary, dict) else None
+        if key is None:
+            return NO_CODE
+        return codes.setdefault(key, len(codes))
+
+    def add(self, product: Dict[str, Any]):
+        product_id = product["_id"]
+        row = self.rows.get(product_id)
+        if row is None:
+            if self.free:
+                row = self.free.pop()
+            else:
+                if self.size == len(self.records):
+                    self._grow()
+                row = self.size
+                self.size += 1
+            self.rows[product_id] = row
+
+        price = product.get("price")
+        self.records[row] = ProductRecord(product)
+        # NaN never satisfies a range, like a missing price in Mongo
+        self.price[row] = float(price) if isinstance(price, (int, float)) else np.nan
+        self.stock[row] = int(product.get("stock") or 0)
+        self.category[row] = self._code(self.category_codes, product.get("category"))
+        self.brand[row] = self._code(self.brand_codes, product.get("brand"))
+        self.created[row] = _micros(product.get("created_at"))
+        self.id_hi[row], self.id_lo[row] = _id_parts(product_id)
+        self.alive[row] = True
+        self._order = None
+
+    def remove(self, product_id: ObjectId):
+        row = self.rows.pop(product_id, None)
+        if row is None:
+            return
+        self.alive[row] = False
+        self.records[row] = None
+        self.free.append(row)
+        self._order = None
+
+    async def on_stock_change(self, db, deltas: Dict[ObjectId, int]):
+        """db.catalog_view stock listener: apply the increments in place, no Mongo read.
+
+        Stock isn't part of the row order, so the cached order stays valid. A mapped
+        snapshot is read-only; the snapshot builder picks the change up instead.
+        """
+        if not self.enabled or not self.ready or self.mapped:
+            return
+        for product_id, delta in deltas.items():
+            row = self.rows.get(product_id)
+            if row is None:
+                continue
+            self.stock[row] += delta
+            record = self.records[row]
+            record.stock = (record.stock or 0) + delta
+
+    def _sorted_rows(self) -> np.ndarray:
+        """Live rows in (created_at, _id) descending order"""
+        if self._order is None:
+            n = self.size
+            rows = np.lexsort((self.id_lo[:n], self.id_hi[:n], self.created[:n]))[::-1]
+            self._order = rows[self.alive[:n][rows]]
+        return self._order
+
+    def match(self, query: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Boolean mask over rows for a build_product_query query, None if it can't be evaluated here"""
+        n = self.size
+        mask = self.alive[:n].copy()
+        for field, condition in query.items():
+            if field in ("category._id", "brand._id"):
+                codes = self.category_codes if field == "category._id" else self.brand_codes
+                column = self.category if field == "category._id" else self.brand
+                code = codes.get(condition)
+                if code is None:
+                    mask[:] = False
+                else:
+                    mask &= column[:n] == code
+            elif field in ("price", "stock"):
+                column = getattr(self, field)[:n]
+                if not isinstance(condition, dict):
+                    mask &= column == condition
+                    continue
+                for op, value in condition.items():
+                    if op not in _RANGE_OPS or not isinstance(value, (int, float)):
+                        return None
+                    mask &= _RANGE_OPS[op](column, value)
+            else:
+                return None
+        return mask
+
+    def _after_cursor(self, cursor: str) -> np.ndarray:
+        value, last_id = decode_cursor(cursor)
+        if not isinstance(last_id, ObjectId):
+            raise ValueError("Invalid pagination cursor")
+        n = self.size
+        created = self.created[:n]
+        hi, lo = _id_parts(last_id)
+        value = _micros(value)
+        earlier_id = (self.id_hi[:n] < hi) | ((self.id_hi[:n] == hi) & (self.id_lo[:n] < lo))
+        return (created < value) | ((created == value) & earlier_id)
+
+    def list_page(self, query: Dict[str, Any], skip: int = 0, limit: int = 20, cursor: Optional[str] = None) -> Optional[Tuple[List[Dict[str, Any]], int]]:
+        """One page in (created_at, _id) descending order plus the match count (before the cursor)"""
+        mask = self.match(query)
+        if mask is None:
+            return None
+        total = int(np.count_nonzero(mask))
+        if cursor:
+            mask &= self._after_cursor(cursor)
+
+        ordered = self._sorted_rows()
+        hits = ordered[mask[ordered]]
+        return [self.records[row].to_document() for row in hits[skip:skip + limit]], total
+
+    def matcher(self, query: Dict[str, Any]) -> Optional[Callable[[ObjectId], bool]]:
+        """Predicate "in the catalog and satisfies ``query``", None if match() can't evaluate it"""
+        mask = self.match(query)
+        if mask is None:
+            return None
+        rows = self.rows
+        return lambda product_id: product_id in rows and bool(mask[rows[product_id]])
+
+    def documents(self, product_ids: List[ObjectId]) -> List[Dict[str, Any]]:
+        return [self.records[self.rows[product_id]].to_document() for product_id in product_ids if product_id in self.rows]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "mapped": self.mapped,
+            "products": len(self.rows),
+            "capacity": len(self.records),
+            "free_rows": len(self.free),
+            "column_bytes": sum(getattr(self, name).nbytes for name in COLUMNS)
+        }
+
+columnar_catalog = ColumnarCatalog()
@@ -1,7 +1,12 @@
 
 from datetime import datetime
+import asyncio
 from bson import ObjectId
+from pymongo import UpdateOne
 from db.db_manager import DatabaseManager
+from db.catalog_view import CATALOG_VIEW, POPULARITY_FIELD, notify_stock_changed, stamp
+from app.services.product_stats import record_sales, sales_increment
+from app.services import buy_again, recommendations
 from schema.order import OrderCreate
 
 
@@ -27,20 +32,57 @@ class OrderService:
         except Exception as Validation_error:
             raise ValueError(f"Invalid order data {str(Validation_error)}")
         
+        # Check stock for all products in one query
+        quantities = {}
         for item in validated_order.items:
-            product = await self.db.find_one("products", {"_id": ObjectId(item.product)})
+            product_id = ObjectId(item.product)
+            quantities[product_id] = quantities.get(product_id, 0) + item.quantity
+
+        products = await self.db.find_many(
+            "products",
+            {"_id": {"$in": list(quantities.keys())}},
+            projection="product_stock"
+        )
+        products_by_id = {product["_id"]: product for product in products}
+
+        for product_id, quantity in quantities.items():
+            product = products_by_id.get(product_id)
             if not product:
-                raise ValueError(f"Product not found: {item.product}")
-            if product["stock"] < item.quantity:
+                raise ValueError(f"Product not found: {product_id}")
+            if product["stock"] < quantity:
                 raise ValueError(f"Insufficient stock for product: {product['name']}")
         
-        # Decrement stock for all products
-        for item in validated_order.items:
-            await self.db.update_one(
+        # Reserve stock: each decrement only applies while enough is left, so a
+        # concurrent checkout that read the same stock can't drive it negative. The
+        # updates run concurrently (one round trip of latency) and each reports
+        # whether it matched, which a bulk write doesn't.
+        now = datetime.utcnow()
+        reserved = list(quantities.items())
+        applied = await asyncio.gather(*(
+            self.db.update_one(
                 "products",
-                {"_id": ObjectId(item.product)},
-                {"$inc": {"stock": -item.quantity}}
+                {"_id": product_id, "stock": {"$gte": quantity}},
+                {"$inc": {"stock": -quantity}, "$set": {"updated_at": now}}
             )
+            for product_id, quantity in reserved
+        ), return_exceptions=True)
+        if not all(result is True for result in applied):
+            # Give back the decrements that did apply before rejecting the order
+            await self.db.bulk_write("products", [
+                UpdateOne({"_id": product_id}, {"$inc": {"stock": quantity}, "$set": {"updated_at": now}})
+                for (product_id, quantity), result in zip(reserved, applied) if result is True
+            ], ordered=False)
+            raise ValueError("Failed to reserve stock for order")
+        # Mirror the decrement into the catalog view (inactive products, and view
+        # documents already short of stock, simply don't match)
+        await self.db.bulk_write(CATALOG_VIEW, [
+            UpdateOne({"_id": product_id, "stock": {"$gte": quantity}}, stamp({
+                "$inc": {"stock": -quantity, POPULARITY_FIELD: sales_increment(quantity, now)},
+                "$set": {"updated_at": now}
+            }))
+            for product_id, quantity in quantities.items()
+        ], ordered=False)
+        await notify_stock_changed(self.db, {product_id: -quantity for product_id, quantity in quantities.items()})
         
         # Create order
         order_dict = validated_order.dict()
@@ -51,13 +93,15 @@ class OrderService:
             "changed_by": current_user.name or "Customer"
         }]
         # Ensure created_at and updated_at are set
-        now = datetime.utcnow()
         order_dict["created_at"] = order_dict.get("created_at", now)
         order_dict["updated_at"] = order_dict.get("updated_at", now)
         order_dict["promo_code"] = order_data['promo_code']
         order_dict["promo_discount"] = order_data['promo_discount']
         # print("order data: ", order_dict)
         order_id = await self.db.insert_one("orders", order_dict)
+        await record_sales(self.db, quantities, now)
+        await recommendations.record_order(self.db, quantities.keys())
+        await buy_again.record_order(self.db, current_user.id, quantities, now)
         
         if order_data['promo_code']:
             update_coupon = await self.db.find_one("discount_coupons",{"code":order_data['promo_code']})
@@ -0,0 +1,262 @@
+from typing import Dict, Any, List, Optional
+from collections import Counter
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+from db.catalog_view import CATALOG_VIEW, PRODUCT_STATS, POPULARITY_FIELD
+import asyncio
+import logging
+import os
+import sys
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Scores use forward decay: an event at time t adds weight * 2^((t - EPOCH) / half-life).
+# Every stored score shrinks by the same factor as time passes, so increments need no
+# read-modify-write and an index on the stored value sorts by the decayed value.
+# current_value() turns a stored score into "units sold per half-life" terms.
+EPOCH = datetime(2024, 1, 1)
+HALF_LIFE_DAYS = float(os.getenv('POPULARITY_HALF_LIFE_DAYS', 14))
+# A product view counts as this fraction of a unit sold
+VIEW_WEIGHT = float(os.getenv('POPULARITY_VIEW_WEIGHT', 0.1))
+
+def decay_factor(at: datetime) -> float:
+    return 2.0 ** ((at - EPOCH).total_seconds() / (HALF_LIFE_DAYS * 86400))
+
+def current_value(stored: float, now: Optional[datetime] = None) -> float:
+    return stored / decay_factor(now or datetime.utcnow())
+
+def sales_increment(quantity: int, at: datetime) -> float:
+    """Stored-score increment for ``quantity`` units sold at ``at`` (also added to the view's POPULARITY_FIELD)"""
+    return quantity * decay_factor(at)
+
+async def record_sales(db, quantities: Dict[ObjectId, int], at: datetime):
+    """Fold one order's line items into product_stats"""
+    operations = []
+    for product_id, quantity in quantities.items():
+        increment = sales_increment(quantity, at)
+        operations.append(UpdateOne(
+            {"_id": product_id},
+            {
+                "$inc": {"sales_score": increment, "score": increment, "units_sold": quantity, "order_count": 1},
+                "$max": {"last_sold_at": at}
+            },
+            upsert=True
+        ))
+    try:
+        await db.bulk_write(PRODUCT_STATS, operations, ordered=False)
+    except Exception as e:
+        # The order is placed; the periodic rebuild recomputes sales from orders
+        logger.error(f"Failed to record sales in {PRODUCT_STATS}: {e}")
+
+class StatsRecorder:
+    """Background side of product_stats for one worker.
+
+    Product detail views are buffered and flushed to product_stats in one bulk write
+    every ``flush_seconds``. The flushed view scores are added to the catalog view's
+    POPULARITY_FIELD every ``sync_seconds``; writing the view on every flush would
+    change the catalog ETags every few seconds. With ``rebuild_seconds`` set, rebuild()
+    also runs on that interval (enable it on one worker, or run
+    ``python -m app.services.product_stats rebuild`` from a scheduler).
+    """
+
+    def __init__(self, flush_seconds: float = 10, rebuild_seconds: float = 0, sync_seconds: float = 300):
+        self.flush_seconds = flush_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.sync_seconds = sync_seconds
+        self.pending: Counter = Counter()
+        # Stored-score increments already in product_stats but not yet in the view
+        self.unsynced: Counter = Counter()
+        self.flushed = 0
+        self.synced = 0
+        self._db = None
+        self._tasks: List[asyncio.Task] = []
+
+    def record_view(self, product_id: ObjectId):
+        self.pending[product_id] += 1
+
+    async def start(self, db):
+        self._db = db
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._flush_periodically()))
+        if self.sync_seconds > 0:
+            self._tasks.append(asyncio.create_task(self._sync_periodically()))
+        if self.rebuild_seconds > 0:
+            self._tasks.append(asyncio.create_task(self._rebuild_periodically()))
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    async def _sync_periodically(self):
+        while True:
+            await asyncio.sleep(self.sync_seconds)
+            await self.sync_views()
+
+    async def _rebuild_periodically(self):
+        while True:
+            await asyncio.sleep(self.rebuild_seconds)
+            # rebuild() copies the full scores into the view
+            self.unsynced.clear()
+            try:
+                await rebuild(self._db)
+            except Exception as e:
+                logger.error(f"Scheduled {PRODUCT_STATS} rebuild failed: {e}")
+
+    async def flush(self):
+        if not self.pending or self._db is None:
+            return
+        pending, self.pending = self.pending, Counter()
+        now = datetime.utcnow()
+        factor = decay_factor(now)
+        operations = [
+            UpdateOne(
+                {"_id": product_id},
+                {
+                    "$inc": {"view_score": views * factor, "score": VIEW_WEIGHT * views * factor, "view_count": views},
+                    "$max": {"last_viewed_at": now}
+                },
+                upsert=True
+            )
+            for product_id, views in pending.items()
+        ]
+        try:
+            await self._db.bulk_write(PRODUCT_STATS, operations, ordered=False)
+            self.flushed += len(operations)
+        except Exception as e:
+            logger.error(f"Failed to flush {len(operations)} product views: {e}")
+            return
+        for product_id, views in pending.items():
+            self.unsynced[product_id] += VIEW_WEIGHT * views * factor
+
+    async def sync_views(self):
+        """Add the flushed view scores to the catalog view's POPULARITY_FIELD"""
+        if not self.unsynced or self._db is None:
+            return
+        unsynced, self.unsynced = self.unsynced, Counter()
+        # Not stamped: a popularity change alone shouldn't put products in the delta sync
+        operations = [
+            UpdateOne({"_id": product_id}, {"$inc": {POPULARITY_FIELD: increment}})
+            for product_id, increment in unsynced.items()
+        ]
+        try:
+            await self._db.bulk_write(CATALOG_VIEW, operations, ordered=False)
+            self.synced += len(operations)
+        except Exception as e:
+            # The next rebuild() copies the full scores
+            logger.error(f"Failed to add {len(operations)} view scores to {CATALOG_VIEW}: {e}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        await self.flush()
+        await self.sync_views()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "pending_views": len(self.pending),
+            "unsynced_views": len(self.unsynced),
+            "flushed": self.flushed,
+            "synced": self.synced
+        }
+
+stats_recorder = StatsRecorder(
+    flush_seconds=float(os.getenv('PRODUCT_VIEW_FLUSH_SECONDS', 10)),
+    rebuild_seconds=float(os.getenv('PRODUCT_STATS_REBUILD_HOURS', 0)) * 3600,
+    sync_seconds=float(os.getenv('PRODUCT_VIEW_SYNC_SECONDS', 300))
+)
+
+async def rebuild(db) -> int:
+    """Recompute sales scores from the whole order history and copy scores into catalog_view.
+
+    View scores can't be recomputed and are kept. Products with no sales left get zero.
+    """
+    started = datetime.utcnow()
+    half_life_ms = HALF_LIFE_DAYS * 86400 * 1000
+    await db.aggregate("orders", [
+        {"$unwind": "$items"},
+        {"$match": {"items.product": {"$type": "string"}, "created_at": {"$type": "date"}}},
+        # $toObjectId would abort the whole rebuild on one legacy non-id string
+        {"$set": {"product_id": {"$convert": {"input": "$items.product", "to": "objectId", "onError": None, "onNull": None}}}},
+        {"$match": {"product_id": {"$ne": None}}},
+        {"$group": {
+            "_id": "$product_id",
+            "sales_score": {"$sum": {"$multiply": [
+                "$items.quantity",
+                {"$pow": [2, {"$divide": [{"$subtract": ["$created_at", EPOCH]}, half_life_ms]}]}
+            ]}},
+            "units_sold": {"$sum": "$items.quantity"},
+            "order_count": {"$sum": 1},
+            "last_sold_at": {"$max": "$created_at"}
+        }},
+        {"$set": {"rebuilt_at": started}},
+        {"$merge": {
+            "into": PRODUCT_STATS,
+            "on": "_id",
+            "whenMatched": [{"$set": {
+                "sales_score": "$$new.sales_score",
+                "units_sold": "$$new.units_sold",
+                "order_count": "$$new.order_count",
+                "last_sold_at": "$$new.last_sold_at",
+                "rebuilt_at": "$$new.rebuilt_at",
+                "score": {"$add": ["$$new.sales_score", {"$multiply": [VIEW_WEIGHT, {"$ifNull": ["$view_score", 0]}]}]}
+            }}],
+            "whenNotMatched": "insert"
+        }}
+    ])
+    # Sold before but not in the order history any more (orders deleted)
+    await db.update_many(
+        PRODUCT_STATS,
+        {"rebuilt_at": {"$ne": started}, "sales_score": {"$gt": 0}},
+        [{"$set": {"sales_score": 0, "score": {"$multiply": [VIEW_WEIGHT, {"$ifNull": ["$view_score", 0]}]}}}]
+    )
+    await sync_catalog_view(db)
+    count = await db.count_documents(PRODUCT_STATS, {})
+    logger.info(f"Rebuilt {PRODUCT_STATS} for {count} products")
+    return count
+
+async def sync_catalog_view(db):
+    """Copy product_stats scores into the catalog view's POPULARITY_FIELD"""
+    await db.aggregate(PRODUCT_STATS, [
+        {"$project": {POPULARITY_FIELD: "$score"}},
+        {"$merge": {"into": CATALOG_VIEW, "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+    ])
+
+async def popularity_by_product(db) -> Dict[ObjectId, float]:
+    """Current (decayed) score of every product that has one"""
+    now = datetime.utcnow()
+    stats = await db.find_many(PRODUCT_STATS, {"score": {"$gt": 0}}, projection={"score": 1})
+    return {row["_id"]: current_value(row["score"], now) for row in stats}
+
+async def bestseller_ids(db, limit: int) -> List[ObjectId]:
+    """Products with the highest decayed sales, best first"""
+    stats = await db.find_many(
+        PRODUCT_STATS, {"sales_score": {"$gt": 0}}, projection={"_id": 1}, sort=[("sales_score", -1)], limit=limit
+    )
+    return [row["_id"] for row in stats]
+
+async def _main(argv: List[str]):
+    from db.resources import resources
+
+    if argv[1:2] != ["rebuild"]:
+        print("usage: python -m app.services.product_stats rebuild")
+        return 2
+    try:
+        await rebuild(resources.db)
+    finally:
+        await resources.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv)))
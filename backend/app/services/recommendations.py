@@ -0,0 +1,244 @@
+from typing import Dict, Any, List, Iterable, Tuple
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReplaceOne, UpdateOne
+from dotenv import load_dotenv
+import numpy as np
+import asyncio
+import logging
+import os
+import sys
+import time
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# One document per product: {_id, orders, related: [{product, count}], built_at}.
+# ``orders`` is how many orders contained the product and ``count`` how many of those
+# also contained ``product``; related is kept sorted by count, best first. built_at is
+# the time of the last write, by rebuild() or record_order(). Documents are only
+# created by rebuild(); a product first bought since then waits for the next one.
+RECOMMENDATIONS = "product_recommendations"
+
+# Related products served per product; a few times more are kept as candidates so
+# incremental updates can promote a product that is climbing
+TOP_K = int(os.getenv('RECOMMENDATIONS_TOP_K', 20))
+CANDIDATES = TOP_K * 3
+# Pairs seen together fewer times than this are noise, not recommendations
+MIN_CO_OCCURRENCE = int(os.getenv('RECOMMENDATIONS_MIN_CO_OCCURRENCE', 2))
+# Bulk/wholesale baskets say little about affinity and cost k^2 pairs
+MAX_BASKET_ITEMS = int(os.getenv('RECOMMENDATIONS_MAX_BASKET_ITEMS', 50))
+WINDOW_DAYS = int(os.getenv('RECOMMENDATIONS_WINDOW_DAYS', 365))
+# Orders folded into the pair counts at a time, bounding the pair arrays' memory
+CHUNK_ORDERS = 50000
+WRITE_BATCH = 1000
+
+def _basket(order: Dict[str, Any]) -> List[str]:
+    products = []
+    for item in order.get("items") or []:
+        product = item.get("product")
+        if isinstance(product, str) and ObjectId.is_valid(product):
+            products.append(product)
+    # Distinct, order kept so an oversized basket keeps its first lines
+    return list(dict.fromkeys(products))[:MAX_BASKET_ITEMS]
+
+def basket_pairs(members: np.ndarray, sizes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Every ordered (a, b), a != b, pair within each basket.
+
+    ``members`` holds the product codes of all baskets back to back and ``sizes``
+    each basket's length. Each member is repeated once per member of its basket and
+    lined up against that basket's members, then the self pairs are dropped.
+    """
+    starts = np.repeat(np.cumsum(sizes) - sizes, sizes)
+    per_member = np.repeat(sizes, sizes)
+    left = np.repeat(np.arange(len(members)), per_member)
+    # Offset of each generated pair within its member's block
+    offsets = np.arange(len(left)) - np.repeat(np.cumsum(per_member) - per_member, per_member)
+    right = np.repeat(starts, per_member) + offsets
+    keep = left != right
+    return members[left[keep]], members[right[keep]]
+
+class CoOccurrence:
+    """Sparse product x product co-occurrence counts accumulated chunk by chunk.
+
+    A pair (a, b) of dense product codes is the int64 key a << 32 | b; each chunk's
+    pairs are reduced with np.unique and the partial counts merged at the end, which
+    is the COO-sum a sparse matrix product would do.
+    """
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.product_orders: List[int] = []
+        self._members: List[int] = []
+        self._sizes: List[int] = []
+        self._keys: List[np.ndarray] = []
+        self._counts: List[np.ndarray] = []
+        self.orders = 0
+
+    def add(self, basket: List[str]):
+        if not basket:
+            return
+        self.orders += 1
+        for product in basket:
+            code = self.codes.setdefault(product, len(self.codes))
+            if code == len(self.product_orders):
+                self.product_orders.append(0)
+            self.product_orders[code] += 1
+        if len(basket) > 1:
+            self._members.extend(self.codes[product] for product in basket)
+            self._sizes.append(len(basket))
+            if len(self._sizes) >= CHUNK_ORDERS:
+                self._fold()
+
+    def _fold(self):
+        if not self._sizes:
+            return
+        left, right = basket_pairs(np.array(self._members, dtype=np.int64), np.array(self._sizes, dtype=np.int64))
+        # Product codes stay far below 2**32, so the pair key is unique
+        keys, counts = np.unique(left * (1 << 32) + right, return_counts=True)
+        self._keys.append(keys)
+        self._counts.append(counts)
+        self._members, self._sizes = [], []
+
+    def top_related(self, limit: int, min_count: int) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """product code -> (related codes, counts), best first, at most ``limit`` each"""
+        self._fold()
+        if not self._keys:
+            return {}
+        keys, inverse = np.unique(np.concatenate(self._keys), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate(self._counts)).astype(np.int64)
+        keep = counts >= min_count
+        keys, counts = keys[keep], counts[keep]
+        left, right = keys >> 32, keys & 0xFFFFFFFF
+
+        # Group by left product, highest count first, ties by code for a stable result
+        order = np.lexsort((right, -counts, left))
+        left, right, counts = left[order], right[order], counts[order]
+        group_starts = np.flatnonzero(np.r_[True, left[1:] != left[:-1]])
+        rank = np.arange(len(left)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(left)]))
+        top = rank < limit
+        left, right, counts = left[top], right[top], counts[top]
+
+        bounds = np.flatnonzero(np.r_[True, left[1:] != left[:-1], True])
+        return {
+            int(left[start]): (right[start:end], counts[start:end])
+            for start, end in zip(bounds[:-1], bounds[1:])
+        }
+
+async def rebuild(db, days: int = WINDOW_DAYS) -> int:
+    """Recompute every product's related list from the last ``days`` days of orders"""
+    started = time.perf_counter()
+    built_at = datetime.utcnow()
+    matrix = CoOccurrence()
+    async for orders in db.iter_many(
+        "orders", {"created_at": {"$gte": built_at - timedelta(days=days)}},
+        projection={"items.product": 1}, batch_size=5000
+    ):
+        for order in orders:
+            matrix.add(_basket(order))
+
+    related = matrix.top_related(CANDIDATES, MIN_CO_OCCURRENCE)
+    products = [None] * len(matrix.codes)
+    for product, code in matrix.codes.items():
+        products[code] = ObjectId(product)
+
+    operations = []
+    for code, (related_codes, counts) in related.items():
+        operations.append(ReplaceOne({"_id": products[code]}, {
+            "orders": matrix.product_orders[code],
+            "related": [
+                {"product": products[related_code], "count": int(count)}
+                for related_code, count in zip(related_codes.tolist(), counts.tolist())
+            ],
+            "built_at": built_at
+        }, upsert=True))
+        if len(operations) >= WRITE_BATCH:
+            await db.bulk_write(RECOMMENDATIONS, operations, ordered=False)
+            operations = []
+    if operations:
+        await db.bulk_write(RECOMMENDATIONS, operations, ordered=False)
+    # Products whose pairs fell out of the window or under MIN_CO_OCCURRENCE; not the
+    # ones record_order() touched during the rebuild
+    await db.delete_many(RECOMMENDATIONS, {"built_at": {"$lt": built_at}})
+
+    logger.info(
+        f"Rebuilt {RECOMMENDATIONS} for {len(related)} products from {matrix.orders} orders "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    return len(related)
+
+def _add_related(others: List[ObjectId], at: datetime) -> List[Dict[str, Any]]:
+    """Update pipeline counting one more order for a product bought with ``others``.
+
+    $sortArray needs MongoDB 5.2+ (checked at startup, see main.MIN_SERVER_VERSION).
+    """
+    related = {"$ifNull": ["$related", []]}
+    known = {"$filter": {"input": others, "cond": {"$in": ["$$this", {"$ifNull": ["$related.product", []]}]}}}
+    return [
+        {"$set": {
+            "built_at": at,
+            "orders": {"$add": [{"$ifNull": ["$orders", 0]}, 1]},
+            "related": {"$concatArrays": [
+                {"$map": {"input": related, "as": "entry", "in": {"$cond": [
+                    {"$in": ["$$entry.product", others]},
+                    {"product": "$$entry.product", "count": {"$add": ["$$entry.count", 1]}},
+                    "$$entry"
+                ]}}},
+                {"$map": {
+                    "input": {"$setDifference": [others, known]},
+                    "in": {"product": "$$this", "count": 1}
+                }}
+            ]}
+        }},
+        {"$set": {"related": {"$slice": [{"$sortArray": {"input": "$related", "sortBy": {"count": -1}}}, CANDIDATES]}}}
+    ]
+
+async def record_order(db, product_ids: Iterable[ObjectId]):
+    """Fold one new order into the related lists of the products in it, between rebuilds.
+
+    Products without a document are skipped rather than upserted: one order is no
+    basis for a confidence, and the next rebuild() counts it.
+    """
+    basket = list(dict.fromkeys(product_ids))[:MAX_BASKET_ITEMS]
+    if len(basket) < 2:
+        return
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne({"_id": product_id}, _add_related([other for other in basket if other != product_id], now))
+        for product_id in basket
+    ]
+    try:
+        await db.bulk_write(RECOMMENDATIONS, operations, ordered=False)
+    except Exception as e:
+        # The order is placed; the next rebuild counts it
+        logger.error(f"Failed to record order in {RECOMMENDATIONS}: {e}")
+
+async def related_products(db, product_id: ObjectId, limit: int) -> List[Dict[str, Any]]:
+    """Up to ``limit`` related entries, best first, each with its confidence (share of the product's orders)"""
+    document = await db.find_one(RECOMMENDATIONS, {"_id": product_id})
+    if not document:
+        return []
+    orders = document.get("orders") or 0
+    related = [entry for entry in document.get("related") or [] if entry.get("count", 0) >= MIN_CO_OCCURRENCE]
+    return [
+        {"product": entry["product"], "count": entry["count"], "confidence": entry["count"] / orders if orders else 0.0}
+        for entry in related[:limit]
+    ]
+
+async def _main(argv: List[str]):
+    from db.resources import resources
+
+    if argv[1:2] != ["rebuild"]:
+        print("usage: python -m app.services.recommendations rebuild [days]")
+        return 2
+    days = int(argv[2]) if len(argv) > 2 else WINDOW_DAYS
+    try:
+        await rebuild(resources.db, days)
+    finally:
+        await resources.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv)))
@@ -0,0 +1,432 @@
+from typing import Dict, Any, List, Optional, Tuple, Iterable, Callable
+from array import array
+from bson import ObjectId
+from bisect import bisect_left, insort
+from dotenv import load_dotenv
+from db.catalog_view import CATALOG_VIEW
+from db.change_streams import changed_fields
+import logging
+import math
+import os
+import re
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Field weights: a hit in the name counts three times one in the description
+FIELD_WEIGHTS = {"name": 3.0, "keywords": 2.0, "tags": 2.0, "description": 1.0}
+SEARCH_FIELDS = {field: 1 for field in FIELD_WEIGHTS}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# A query token also matches indexed terms it is a prefix of, scored lower than an exact hit
+MIN_PREFIX_LENGTH = 2
+PREFIX_WEIGHT = 0.7
+MAX_PREFIX_EXPANSIONS = 50
+
+# Fields the trigram (typo tolerant) index covers
+FUZZY_FIELDS = ("name", "keywords")
+MIN_FUZZY_TOKEN_LENGTH = 3
+# Fraction of dead product slots that triggers a trigram index compaction
+COMPACT_DEAD_RATIO = 0.25
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+def tokenize(text: Any) -> List[str]:
+    if not text:
+        return []
+    if isinstance(text, (list, tuple)):
+        return [token for item in text for token in tokenize(item)]
+    return _TOKEN_RE.findall(str(text).lower())
+
+def trigrams(word: str) -> set:
+    """Character trigrams of a word padded like pg_trgm (two spaces before, one after)"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TrigramIndex:
+    """Typo-tolerant word lookup: trigram -> word postings, word -> product postings.
+
+    Postings are ``array('I')`` of integer ordinals rather than sets of ObjectIds, so a
+    posting costs 4 bytes. Similarity between a query token and a word is trigram
+    Jaccard; a product scores the best similarity of its words per query token.
+    Removed products leave dead ordinals behind that are skipped at query time and
+    reclaimed by compact(). The vocabulary is capped at SEARCH_TRIGRAM_MAX_WORDS.
+    """
+
+    def __init__(self):
+        self.max_words = int(os.getenv('SEARCH_TRIGRAM_MAX_WORDS', 500000))
+        self.threshold = float(os.getenv('SEARCH_FUZZY_THRESHOLD', 0.3))
+        self.words: List[str] = []
+        self.word_ids: Dict[str, int] = {}
+        self.word_sizes = array('H')
+        self.trigram_postings: Dict[str, array] = {}
+        self.word_products: List[array] = []
+        # Product ordinal -> ObjectId (None once removed) and back
+        self.product_ids: List[Optional[ObjectId]] = []
+        self.product_ordinals: Dict[ObjectId, int] = {}
+        self.product_words: Dict[int, array] = {}
+        self.dead = 0
+        self._vocabulary_full = False
+
+    def _word_id(self, word: str) -> Optional[int]:
+        word_id = self.word_ids.get(word)
+        if word_id is not None:
+            return word_id
+        if len(self.words) >= self.max_words:
+            if not self._vocabulary_full:
+                self._vocabulary_full = True
+                logger.warning(f"Trigram vocabulary reached {self.max_words} words, new words are not indexed")
+            return None
+
+        word_id = len(self.words)
+        self.words.append(word)
+        self.word_ids[word] = word_id
+        grams = trigrams(word)
+        self.word_sizes.append(min(len(grams), 0xFFFF))
+        for gram in grams:
+            postings = self.trigram_postings.get(gram)
+            if postings is None:
+                postings = self.trigram_postings[gram] = array('I')
+            postings.append(word_id)
+        self.word_products.append(array('I'))
+        return word_id
+
+    def add(self, product_id: ObjectId, words: Iterable[str]):
+        self.remove(product_id)
+        ordinal = len(self.product_ids)
+        self.product_ids.append(product_id)
+        self.product_ordinals[product_id] = ordinal
+
+        word_ids = array('I')
+        for word in set(words):
+            word_id = self._word_id(word)
+            if word_id is not None:
+                self.word_products[word_id].append(ordinal)
+                word_ids.append(word_id)
+        self.product_words[ordinal] = word_ids
+
+    def remove(self, product_id: ObjectId):
+        ordinal = self.product_ordinals.pop(product_id, None)
+        if ordinal is None:
+            return
+        self.product_ids[ordinal] = None
+        self.product_words.pop(ordinal, None)
+        self.dead += 1
+        if self.dead > 1000 and self.dead > COMPACT_DEAD_RATIO * len(self.product_ids):
+            self.compact()
+
+    def compact(self):
+        """Rebuild with only live products so dead ordinals and orphaned words are reclaimed"""
+        live = [
+            (product_id, [self.words[word_id] for word_id in self.product_words[ordinal]])
+            for ordinal, product_id in enumerate(self.product_ids) if product_id is not None
+        ]
+        self.__init__()
+        for product_id, words in live:
+            self.add(product_id, words)
+        logger.info(f"Trigram index compacted to {len(live)} products, {len(self.words)} words")
+
+    def similar_words(self, token: str) -> List[Tuple[int, float]]:
+        grams = trigrams(token)
+        shared_counts: Dict[int, int] = {}
+        for gram in grams:
+            for word_id in self.trigram_postings.get(gram, ()):
+                shared_counts[word_id] = shared_counts.get(word_id, 0) + 1
+
+        size = len(grams)
+        similar = []
+        for word_id, shared in shared_counts.items():
+            similarity = shared / (size + self.word_sizes[word_id] - shared)
+            if similarity >= self.threshold:
+                similar.append((word_id, similarity))
+        return similar
+
+    def search(self, query: str, limit: Optional[int] = None, allowed: Optional[Callable[[ObjectId], bool]] = None) -> List[Tuple[ObjectId, float]]:
+        scores: Dict[int, float] = {}
+        for token in dict.fromkeys(tokenize(query)):
+            if len(token) < MIN_FUZZY_TOKEN_LENGTH:
+                continue
+            best: Dict[int, float] = {}
+            for word_id, similarity in self.similar_words(token):
+                for ordinal in self.word_products[word_id]:
+                    if self.product_ids[ordinal] is not None and similarity > best.get(ordinal, 0.0):
+                        best[ordinal] = similarity
+            for ordinal, similarity in best.items():
+                scores[ordinal] = scores.get(ordinal, 0.0) + similarity
+
+        if allowed is not None:
+            scores = {ordinal: score for ordinal, score in scores.items() if allowed(self.product_ids[ordinal])}
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if limit:
+            ranked = ranked[:limit]
+        return [(self.product_ids[ordinal], score) for ordinal, score in ranked]
+
+    def snapshot(self) -> Dict[str, Any]:
+        posting_bytes = sum(postings.itemsize * len(postings) for postings in self.trigram_postings.values())
+        posting_bytes += sum(postings.itemsize * len(postings) for postings in self.word_products)
+        posting_bytes += sum(words.itemsize * len(words) for words in self.product_words.values())
+        return {
+            "words": len(self.words),
+            "max_words": self.max_words,
+            "trigrams": len(self.trigram_postings),
+            "products": len(self.product_ordinals),
+            "dead_slots": self.dead,
+            "posting_bytes": posting_bytes,
+            "threshold": self.threshold
+        }
+
+class CatalogIndex:
+    """Base for in-process structures derived from catalog_view.
+
+    Subclasses set PROJECTION and implement _reset(), add(product) and remove(product_id);
+    full loads, incremental refreshes and the catalog_view listener / change stream hooks
+    are shared. A load builds into a fresh instance and swaps its state in, so readers
+    never see a half-built index; products changed during the load are refreshed after.
+    """
+
+    PROJECTION: Dict[str, Any] = {}
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.ready = False
+        self._reset()
+        self._loading = False
+        self._dirty: set = set()
+
+    def _reset(self):
+        raise NotImplementedError
+
+    def add(self, product: Dict[str, Any]):
+        raise NotImplementedError
+
+    def remove(self, product_id: ObjectId):
+        raise NotImplementedError
+
+    async def _prepare(self, db, building: "CatalogIndex"):
+        """Hook for loading side data into ``building`` before catalog_view is scanned"""
+
+    def _begin_load(self):
+        """Called on the instance being built before the first add() of a full load"""
+
+    def _end_load(self):
+        """Called on the instance being built after the last add() of a full load"""
+
+    async def load(self, db):
+        """(Re)build the whole index from catalog_view"""
+        if not self.enabled:
+            return
+        self._loading = True
+        self._dirty.clear()
+        building = type(self).__new__(type(self))
+        building._reset()
+        try:
+            await self._prepare(db, building)
+            building._begin_load()
+            async for chunk in db.iter_many(CATALOG_VIEW, {}, projection=self.PROJECTION):
+                for product in chunk:
+                    building.add(product)
+            building._end_load()
+        finally:
+            self._loading = False
+
+        self.__dict__.update(vars(building))
+        self.ready = True
+        logger.info(f"{type(self).__name__} loaded: {len(self)} products")
+
+        # Products that changed while the snapshot was being read
+        if self._dirty:
+            dirty, self._dirty = list(self._dirty), set()
+            await self.refresh(db, dirty)
+
+    async def refresh(self, db, product_ids: Iterable[ObjectId]):
+        """Re-read the given products from catalog_view; missing ones are dropped"""
+        product_ids = list(product_ids)
+        if not self.enabled or not product_ids:
+            return
+        if self._loading:
+            self._dirty.update(product_ids)
+            return
+        products = await db.find_many(CATALOG_VIEW, {"_id": {"$in": product_ids}}, projection=self.PROJECTION)
+        found = set()
+        for product in products:
+            self.add(product)
+            found.add(product["_id"])
+        for product_id in product_ids:
+            if product_id not in found:
+                self.remove(product_id)
+
+    async def on_catalog_change(self, db, product_ids: Optional[List[ObjectId]]):
+        """db.catalog_view listener"""
+        if product_ids is None:
+            await self.load(db)
+        else:
+            await self.refresh(db, product_ids)
+
+    def change_stream_subscriber(self, db):
+        """Subscriber for catalog_view change events published by ChangeStreamListener"""
+        indexed = {field.split(".", 1)[0] for field in self.PROJECTION or {}}
+
+        async def on_event(collection: str, event: Dict[str, Any]):
+            fields = changed_fields(event)
+            if indexed and fields is not None and not fields & indexed:
+                # e.g. an order's stock update: nothing this index reads changed
+                return
+            product_id = (event.get("documentKey") or {}).get("_id")
+            if product_id is not None:
+                await self.refresh(db, [product_id])
+            else:
+                # drop/rename or lost history
+                await self.load(db)
+        return on_event
+
+class ProductSearchIndex(CatalogIndex):
+    """In-process inverted index over catalog_view name, description, keywords and tags.
+
+    Postings map a term to {product_id: weighted term frequency}; ranking is BM25 over
+    the field-weighted frequencies. The vocabulary is kept sorted so prefix lookups
+    are a bisect. Built from catalog_view at startup and kept current through
+    db.catalog_view listeners (this worker) and change streams or, when those are off,
+    CatalogFollower (other workers).
+    """
+
+    PROJECTION = SEARCH_FIELDS
+
+    def __init__(self):
+        self.max_candidates = int(os.getenv('SEARCH_MAX_CANDIDATES', 1000))
+        # Cut used when other filters are applied after ranking (no ``allowed`` predicate)
+        self.filtered_max_candidates = int(os.getenv('SEARCH_FILTERED_MAX_CANDIDATES', 20000))
+        # Below this many exact/prefix hits the trigram index tops the results up
+        self.fuzzy_min_results = int(os.getenv('SEARCH_FUZZY_MIN_RESULTS', 5))
+        super().__init__(os.getenv('SEARCH_INDEX_ENABLED', 'true').lower() == 'true')
+
+    def _reset(self):
+        self.postings: Dict[str, Dict[ObjectId, float]] = {}
+        self.doc_terms: Dict[ObjectId, Dict[str, float]] = {}
+        self.doc_lengths: Dict[ObjectId, float] = {}
+        self.total_length = 0.0
+        self.vocabulary: List[str] = []
+        self.trigrams = TrigramIndex()
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def add(self, product: Dict[str, Any]):
+        """Index (or re-index) one catalog_view document"""
+        product_id = product["_id"]
+        self.remove(product_id)
+
+        terms: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(product.get(field)):
+                terms[token] = terms.get(token, 0.0) + weight
+        if not terms:
+            return
+
+        self.trigrams.add(product_id, [token for field in FUZZY_FIELDS for token in tokenize(product.get(field))])
+
+        length = sum(terms.values())
+        self.doc_terms[product_id] = terms
+        self.doc_lengths[product_id] = length
+        self.total_length += length
+        for term, frequency in terms.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                insort(self.vocabulary, term)
+            postings[product_id] = frequency
+
+    def remove(self, product_id: ObjectId):
+        self.trigrams.remove(product_id)
+        terms = self.doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(product_id, 0.0)
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self.postings[term]
+                index = bisect_left(self.vocabulary, term)
+                if index < len(self.vocabulary) and self.vocabulary[index] == term:
+                    self.vocabulary.pop(index)
+
+    def expand(self, token: str) -> List[Tuple[str, float]]:
+        """Indexed terms matching a query token: the exact term plus terms it prefixes"""
+        matches = []
+        if token in self.postings:
+            matches.append((token, 1.0))
+        if len(token) < MIN_PREFIX_LENGTH:
+            return matches
+
+        index = bisect_left(self.vocabulary, token)
+        while index < len(self.vocabulary) and len(matches) < MAX_PREFIX_EXPANSIONS:
+            term = self.vocabulary[index]
+            if not term.startswith(token):
+                break
+            if term != token:
+                matches.append((term, PREFIX_WEIGHT))
+            index += 1
+        return matches
+
+    def search(self, query: str, limit: Optional[int] = None, allowed: Optional[Callable[[ObjectId], bool]] = None) -> List[Tuple[ObjectId, float]]:
+        """Rank products for ``query``; each query token adds its best matching term's BM25 score.
+
+        ``allowed`` drops products before the ranking is cut to ``limit``, so filters
+        never lose matches to unfiltered candidates.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        total_docs = len(self.doc_terms)
+        if not tokens or not total_docs:
+            return []
+
+        average_length = self.total_length / total_docs
+        scores: Dict[ObjectId, float] = {}
+        for token in tokens:
+            token_scores: Dict[ObjectId, float] = {}
+            for term, match_weight in self.expand(token):
+                postings = self.postings[term]
+                idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for product_id, frequency in postings.items():
+                    norm = K1 * (1 - B + B * self.doc_lengths[product_id] / average_length)
+                    score = match_weight * idf * frequency * (K1 + 1) / (frequency + norm)
+                    if score > token_scores.get(product_id, 0.0):
+                        token_scores[product_id] = score
+            for product_id, score in token_scores.items():
+                scores[product_id] = scores.get(product_id, 0.0) + score
+
+        if allowed is not None:
+            scores = {product_id: score for product_id, score in scores.items() if allowed(product_id)}
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit or self.max_candidates]
+
+    def search_with_fallback(self, query: str, limit: Optional[int] = None, allowed: Optional[Callable[[ObjectId], bool]] = None) -> List[Tuple[ObjectId, float]]:
+        """Exact/prefix ranking first; when it finds too few, append typo-tolerant trigram matches"""
+        limit = limit or self.max_candidates
+        ranked = self.search(query, limit, allowed)
+        if len(ranked) >= self.fuzzy_min_results:
+            return ranked
+
+        seen = {product_id for product_id, _ in ranked}
+        for product_id, score in self.trigrams.search(query, limit, allowed):
+            if product_id not in seen:
+                ranked.append((product_id, score))
+                seen.add(product_id)
+        return ranked[:limit]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "products": len(self.doc_terms),
+            "terms": len(self.vocabulary),
+            "postings": sum(len(postings) for postings in self.postings.values()),
+            "trigrams": self.trigrams.snapshot()
+        }
+
+product_search_index = ProductSearchIndex()
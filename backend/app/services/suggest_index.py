@@ -0,0 +1,192 @@
+from typing import Dict, Any, List, Optional, Tuple
+from bson import ObjectId
+from bisect import bisect_left, insort
+import heapq
+from dotenv import load_dotenv
+from app.services.search_index import CatalogIndex, tokenize
+from app.services.product_stats import popularity_by_product
+import logging
+import os
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_FIELDS = {"name": 1, "keywords": 1, "category": 1, "brand": 1}
+
+# A name is also reachable from its later words ("oil" -> "Fortune Sunflower Oil"), up to this many
+MAX_NAME_SUFFIXES = 4
+# Most suggestions one request can ask for
+MAX_LIMIT = 25
+# Rankings for prefixes up to this long are memoized until the index next changes; they
+# match the most keys and are what every user types first
+MEMO_PREFIX_LENGTH = 2
+# Suggestion kinds, in the order they win a popularity tie
+KIND_ORDER = {"product": 0, "brand": 1, "category": 2, "keyword": 3}
+
+def normalize(text: Any) -> str:
+    return " ".join(tokenize(text))
+
+class Suggestion:
+    __slots__ = ("key", "kind", "text", "ref_id", "products", "score")
+
+    def __init__(self, key: str, kind: str, text: str, ref_id: Optional[ObjectId]):
+        self.key = key
+        self.kind = kind
+        self.text = text
+        self.ref_id = ref_id
+        self.products: set = set()
+        self.score = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "text": self.text,
+            "type": self.kind,
+            "id": str(self.ref_id) if self.ref_id else None,
+            "products": len(self.products)
+        }
+
+class SuggestIndex(CatalogIndex):
+    """Autocomplete over product names, brands, categories and keywords.
+
+    Lookup keys live in one sorted list of (prefix text, suggestion key) pairs, so the
+    matches for a query are one contiguous slice found by bisect; the top ones by score
+    come from a bounded heap over the whole slice. Each suggestion's score is the summed
+    popularity of the products behind it, where a product's popularity is one plus its
+    decayed product_stats score (read on every full load).
+    """
+
+    PROJECTION = SUGGEST_FIELDS
+
+    def __init__(self):
+        super().__init__(os.getenv('SUGGEST_INDEX_ENABLED', 'true').lower() == 'true')
+
+    def _reset(self):
+        self.keys: List[Tuple[str, Tuple[str, str]]] = []
+        self.suggestions: Dict[Tuple[str, str], Suggestion] = {}
+        self.product_suggestions: Dict[ObjectId, List[Tuple[str, str]]] = {}
+        self.popularity: Dict[ObjectId, float] = {}
+        self.memo: Dict[str, List[Suggestion]] = {}
+        # During a full load keys are appended and sorted once at the end
+        self._bulk = False
+
+    def _begin_load(self):
+        self._bulk = True
+
+    def _end_load(self):
+        self.keys.sort()
+        self._bulk = False
+
+    def __len__(self) -> int:
+        return len(self.product_suggestions)
+
+    async def _prepare(self, db, building: "SuggestIndex"):
+        try:
+            building.popularity = await popularity_by_product(db)
+        except Exception as e:
+            logger.error(f"Failed to read product popularity, suggestions rank by product count: {e}")
+
+    def _entries(self, product: Dict[str, Any]) -> List[Tuple[str, str, str, Optional[ObjectId]]]:
+        """(kind, key, display text, referenced id) for everything a product makes suggestible"""
+        entries = []
+        name = product.get("name")
+        if name:
+            entries.append(("product", normalize(name), name, product["_id"]))
+        for kind in ("brand", "category"):
+            summary = product.get(kind)
+            if isinstance(summary, dict) and summary.get("_id") and summary.get("name"):
+                entries.append((kind, normalize(summary["name"]), summary["name"], summary["_id"]))
+        for keyword in product.get("keywords") or []:
+            if isinstance(keyword, str) and keyword.strip():
+                entries.append(("keyword", normalize(keyword), keyword.strip(), None))
+        return [entry for entry in entries if entry[1]]
+
+    @staticmethod
+    def _lookup_keys(kind: str, key: str) -> List[str]:
+        if kind != "product":
+            return [key]
+        words = key.split(" ")
+        return [" ".join(words[i:]) for i in range(min(len(words), MAX_NAME_SUFFIXES))]
+
+    def add(self, product: Dict[str, Any]):
+        product_id = product["_id"]
+        self.remove(product_id)
+        self.memo.clear()
+        weight = 1.0 + self.popularity.get(product_id, 0.0)
+
+        suggestion_keys = []
+        for kind, key, text, ref_id in self._entries(product):
+            # A product's own name is one suggestion per product; the rest are shared
+            suggestion_key = (kind, str(product_id) if kind == "product" else key)
+            if suggestion_key in suggestion_keys:
+                continue
+            suggestion = self.suggestions.get(suggestion_key)
+            if suggestion is None:
+                suggestion = self.suggestions[suggestion_key] = Suggestion(key, kind, text, ref_id)
+                for lookup in self._lookup_keys(kind, key):
+                    if self._bulk:
+                        self.keys.append((lookup, suggestion_key))
+                    else:
+                        insort(self.keys, (lookup, suggestion_key))
+            suggestion.products.add(product_id)
+            suggestion.score += weight
+            suggestion_keys.append(suggestion_key)
+        self.product_suggestions[product_id] = suggestion_keys
+
+    def remove(self, product_id: ObjectId):
+        weight = 1.0 + self.popularity.get(product_id, 0.0)
+        self.memo.clear()
+        for suggestion_key in self.product_suggestions.pop(product_id, []):
+            suggestion = self.suggestions.get(suggestion_key)
+            if suggestion is None:
+                continue
+            suggestion.products.discard(product_id)
+            suggestion.score -= weight
+            if suggestion.products:
+                continue
+            del self.suggestions[suggestion_key]
+            for lookup in self._lookup_keys(suggestion.kind, suggestion.key):
+                if self._bulk:
+                    # Unsorted until _end_load; only a product read twice by one scan gets here
+                    self.keys.remove((lookup, suggestion_key))
+                    continue
+                index = bisect_left(self.keys, (lookup, suggestion_key))
+                if index < len(self.keys) and self.keys[index] == (lookup, suggestion_key):
+                    self.keys.pop(index)
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        limit = min(limit, MAX_LIMIT)
+        ranked = self.memo.get(prefix)
+        if ranked is None:
+            ranked = self._rank(prefix)
+            if len(prefix) <= MEMO_PREFIX_LENGTH:
+                self.memo[prefix] = ranked
+        return [suggestion.to_dict() for suggestion in ranked[:limit]]
+
+    def _rank(self, prefix: str) -> List[Suggestion]:
+        """The MAX_LIMIT best suggestions with a lookup key starting with ``prefix``"""
+        start = bisect_left(self.keys, (prefix,))
+        # Every key starting with prefix sorts before prefix + the highest code point
+        end = bisect_left(self.keys, (prefix + "\U0010ffff",), start)
+        # A name can match through several of its suffixes; count it once
+        matched = {suggestion_key for _, suggestion_key in self.keys[start:end]}
+        return heapq.nsmallest(
+            MAX_LIMIT,
+            (self.suggestions[suggestion_key] for suggestion_key in matched),
+            key=lambda suggestion: (-suggestion.score, KIND_ORDER[suggestion.kind], suggestion.text)
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "products": len(self.product_suggestions),
+            "suggestions": len(self.suggestions),
+            "keys": len(self.keys)
+        }
+
+suggest_index = SuggestIndex()
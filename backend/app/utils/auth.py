@@ -38,11 +38,11 @@ async def get_user(db: DatabaseManager, username: str):
         return None
     return user
 
-async def get_user_by_id(db: DatabaseManager, user_id: str):
+async def get_user_by_id(db: DatabaseManager, user_id: str, projection = None):
     """Get user by ID"""
     if not ObjectId.is_valid(user_id):
         return None
-    user = await db.find_one('users', {"_id": ObjectId(user_id)})
+    user = await db.find_one('users', {"_id": ObjectId(user_id)}, projection=projection)
     return user
 
 def verify_password(plain_pass: str, hash_pass: str):
@@ -80,7 +80,7 @@ async def decode_token(token: str, db: DatabaseManager):
         raise credentials_exception
 
     # ✅ Get user by ID instead of email
-    user = await get_user_by_id(db, user_id)
+    user = await get_user_by_id(db, user_id, projection="user_principal")
     if user is None:
         raise credentials_exception
     
@@ -99,6 +99,15 @@ async def current_active_user(
     """Get current active user from token"""
     return await decode_token(token, db)
 
+async def user_session_database(
+    current_user: UserinDB = Depends(current_active_user),
+    db: DatabaseManager = Depends(get_database)
+):
+    """Database view bound to a causally consistent session for the current user,
+    so their cart and order reads always see their own earlier writes"""
+    async with db.causal_session(current_user.id) as session_db:
+        yield session_db
+
 async def get_current_user(current_user: UserinDB = Depends(current_active_user)):
     """Get current user with active status check"""
     if not current_user.is_active:
@@ -135,7 +144,7 @@ async def authenticate_websocket(websocket: WebSocket):
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return None
 
-        user = await db.find_one("users", {"email": user_data.email})
+        user = await db.find_one("users", {"email": user_data.email}, projection="user_principal")
 
         if not user:
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
@@ -0,0 +1,50 @@
+from typing import List, Optional
+from fastapi import Depends, HTTPException, Request, Response, status
+from db.db_manager import DatabaseManager, get_database
+from dotenv import load_dotenv
+import logging
+import os
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Bump on deploys that change a response shape so clients drop their cached copies
+ETAG_SALT = os.getenv('ETAG_SALT', '1')
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison: W/ prefixes are ignored, * matches anything"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+def conditional_get(route: str, collections: List[str], default_cache_control: str = "no-cache"):
+    """Dependency giving a GET route an ETag built from the versions of ``collections``.
+
+    A request whose If-None-Match still matches gets a 304 before the route body runs.
+    Cache-Control comes from CACHE_CONTROL_<ROUTE> (``default_cache_control`` otherwise);
+    "no-cache" lets clients keep a copy but revalidate it on every use.
+    """
+    cache_control = os.getenv(f"CACHE_CONTROL_{route.upper()}", default_cache_control)
+
+    async def dependency(request: Request, response: Response, db: DatabaseManager = Depends(get_database)):
+        try:
+            versions = await db.versions.get(db.db, collections)
+        except Exception as e:
+            # Serve without a validator rather than fail the request
+            logger.error(f"Failed to read versions for {route} ETag: {e}")
+            return
+        etag = f'"{route}-{ETAG_SALT}-' + ".".join(str(versions[name]) for name in collections) + '"'
+
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if _matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
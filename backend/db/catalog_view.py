@@ -0,0 +1,264 @@
+from typing import Dict, Any, List, Iterable, Optional, Callable, Awaitable
+from bson import ObjectId
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+import sys
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Active products with their category and brand summaries embedded, so catalog
+# reads are single finds instead of $lookup aggregations. Admin product, category
+# and brand handlers keep it current; rebuild() backfills it from scratch:
+#
+#     python -m db.catalog_view rebuild
+CATALOG_VIEW = "catalog_view"
+
+CATEGORY_SUMMARY = {"_id": 1, "name": 1, "image": 1}
+BRAND_SUMMARY = {"_id": 1, "name": 1, "logo": 1}
+UNCATEGORIZED = {"name": "Uncategorized", "_id": None}
+NO_BRAND = {"name": "No Brand", "_id": None}
+
+# Server-clock time of the last write to a view document (any writer, not just the
+# admin's updated_at) and, for products that left the view, a tombstone. Together
+# they feed the /products/changes delta sync.
+SYNC_FIELD = "synced_at"
+TOMBSTONES = "product_tombstones"
+TOMBSTONE_RETENTION_SECONDS = int(os.getenv('SYNC_TOMBSTONE_RETENTION_DAYS', 30)) * 86400
+
+# Decayed sales/view scores (app.services.product_stats); each view document carries
+# its product's score as ``popularity`` so the "popular" sort is an indexed find
+PRODUCT_STATS = "product_stats"
+POPULARITY_FIELD = "popularity"
+
+def stamp(update: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the SYNC_FIELD bump to an update on the view"""
+    if not any(key.startswith('$') for key in update):
+        update = {"$set": update}
+    return {**update, "$currentDate": {**update.get("$currentDate", {}), SYNC_FIELD: True}}
+
+# In-process structures derived from the view (search index, ...) register here to
+# hear about changes right away; other workers hear through change streams.
+# Callbacks get the changed product ids, or None after a full rebuild.
+CatalogListener = Callable[[Any, Optional[List[ObjectId]]], Awaitable[None]]
+_listeners: List[CatalogListener] = []
+
+def add_listener(callback: CatalogListener):
+    if callback not in _listeners:
+        _listeners.append(callback)
+
+async def notify_changed(db, product_ids: Iterable[Any]):
+    """For writers that update view documents in place rather than through refresh_products"""
+    ids = _object_ids(product_ids)
+    if ids:
+        await _notify(db, ids)
+
+async def _notify(db, product_ids: Optional[List[ObjectId]]):
+    for callback in _listeners:
+        try:
+            await callback(db, product_ids)
+        except Exception as e:
+            logger.error(f"{CATALOG_VIEW} listener failed: {e}")
+
+# Orders only move stock (and popularity, which nothing in-process reads from the view),
+# so they skip the listeners above: re-reading and re-indexing every product in the
+# order would put a find per index on the checkout path. Stock listeners get the
+# change applied to each product's stock instead.
+# Everything an order writes on a view document
+ORDER_FIELDS = ("stock", POPULARITY_FIELD, SYNC_FIELD, "updated_at")
+
+StockListener = Callable[[Any, Dict[ObjectId, int]], Awaitable[None]]
+_stock_listeners: List[StockListener] = []
+
+def add_stock_listener(callback: StockListener):
+    if callback not in _stock_listeners:
+        _stock_listeners.append(callback)
+
+async def notify_stock_changed(db, deltas: Dict[Any, int]):
+    """For writers that only $inc view documents' stock, with the increment per product id"""
+    changes = {ObjectId(product_id): delta for product_id, delta in deltas.items() if ObjectId.is_valid(str(product_id))}
+    for callback in _stock_listeners:
+        try:
+            await callback(db, changes)
+        except Exception as e:
+            logger.error(f"{CATALOG_VIEW} stock listener failed: {e}")
+
+def catalog_pipeline(match: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Aggregation turning matching active products into catalog_view documents.
+
+    $lookup with both localField and a pipeline needs MongoDB 5.0+.
+    """
+    return [
+        {"$match": {**match, "is_active": True}},
+        {
+            "$lookup": {
+                "from": "categories",
+                "localField": "category",
+                "foreignField": "_id",
+                "pipeline": [{"$project": CATEGORY_SUMMARY}],
+                "as": "category_data"
+            }
+        },
+        {
+            "$lookup": {
+                "from": "brands",
+                "localField": "brand",
+                "foreignField": "_id",
+                "pipeline": [{"$project": BRAND_SUMMARY}],
+                "as": "brand_data"
+            }
+        },
+        {
+            "$lookup": {
+                "from": PRODUCT_STATS,
+                "localField": "_id",
+                "foreignField": "_id",
+                "pipeline": [{"$project": {"score": 1}}],
+                "as": "stats_data"
+            }
+        },
+        {
+            "$addFields": {
+                "category": {"$ifNull": [{"$arrayElemAt": ["$category_data", 0]}, UNCATEGORIZED]},
+                "brand": {"$ifNull": [{"$arrayElemAt": ["$brand_data", 0]}, NO_BRAND]},
+                POPULARITY_FIELD: {"$ifNull": [{"$arrayElemAt": ["$stats_data.score", 0]}, 0]},
+                SYNC_FIELD: "$$NOW"
+            }
+        },
+        {"$project": {"category_data": 0, "brand_data": 0, "stats_data": 0}}
+    ]
+
+def _object_ids(ids: Iterable[Any]) -> List[ObjectId]:
+    object_ids = []
+    for value in ids:
+        if isinstance(value, ObjectId):
+            object_ids.append(value)
+        elif isinstance(value, str) and ObjectId.is_valid(value):
+            object_ids.append(ObjectId(value))
+    return object_ids
+
+async def refresh_products(db, product_ids: Iterable[Any]):
+    """Re-materialize the given products; ones that are now inactive or deleted leave the view"""
+    ids = _object_ids(product_ids)
+    if not ids:
+        return
+    try:
+        active = await db.find_many("products", {"_id": {"$in": ids}, "is_active": True}, projection={"_id": 1})
+        active_ids = [product["_id"] for product in active]
+        if active_ids:
+            await db.aggregate("products", catalog_pipeline({"_id": {"$in": active_ids}}) + [
+                {"$merge": {"into": CATALOG_VIEW, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+            ])
+
+            # Back in the view; the upsert replaces any earlier removal
+            await db.delete_many(TOMBSTONES, {"_id": {"$in": active_ids}})
+
+        active_set = set(active_ids)
+        removed = [product_id for product_id in ids if product_id not in active_set]
+        if removed:
+            leaving = await db.find_many(CATALOG_VIEW, {"_id": {"$in": removed}}, projection={"_id": 1})
+            if leaving:
+                await db.bulk_write(TOMBSTONES, [
+                    UpdateOne({"_id": product["_id"]}, {"$currentDate": {"removed_at": True}}, upsert=True)
+                    for product in leaving
+                ], ordered=False)
+            await db.delete_many(CATALOG_VIEW, {"_id": {"$in": removed}})
+
+        await _notify(db, ids)
+    except Exception as e:
+        # The product write already succeeded; a rebuild repairs the view
+        logger.error(f"Failed to refresh {CATALOG_VIEW} for {len(ids)} products: {e}")
+
+async def refresh_category(db, category_id: Any):
+    """Push a category's new name/image (or its deletion) into every product embedding it"""
+    await _refresh_summary(db, "categories", "category", category_id, CATEGORY_SUMMARY, UNCATEGORIZED)
+
+async def refresh_brand(db, brand_id: Any):
+    """Push a brand's new name/logo (or its deletion) into every product embedding it"""
+    await _refresh_summary(db, "brands", "brand", brand_id, BRAND_SUMMARY, NO_BRAND)
+
+async def _refresh_summary(db, collection: str, field: str, doc_id: Any, projection: Dict[str, Any], missing: Dict[str, Any]):
+    ids = _object_ids([doc_id])
+    if not ids:
+        return
+    try:
+        # Collected first: a deleted category/brand no longer matches afterwards
+        affected = []
+        if _listeners:
+            affected = await db.find_many(CATALOG_VIEW, {f"{field}._id": ids[0]}, projection={"_id": 1})
+
+        summary = await db.find_one(collection, {"_id": ids[0]}, projection=projection)
+        await db.update_many(CATALOG_VIEW, {f"{field}._id": ids[0]}, stamp({"$set": {field: summary or missing}}))
+
+        if affected:
+            await _notify(db, [product["_id"] for product in affected])
+    except Exception as e:
+        logger.error(f"Failed to refresh {field} {doc_id} in {CATALOG_VIEW}: {e}")
+
+def _content(document: str) -> Dict[str, Any]:
+    """A view document with the fields a rebuild always rewrites blanked, for comparing content"""
+    return {"$mergeObjects": [document, {SYNC_FIELD: None, POPULARITY_FIELD: None}]}
+
+async def rebuild(db) -> int:
+    """Regenerate the whole view.
+
+    Documents whose content didn't change keep their SYNC_FIELD, so delta-sync clients
+    don't download the whole catalog again, and products that left the view get
+    tombstones like refresh_products gives them. Scores are always recopied.
+    """
+    before = {document["_id"] for document in await db.find_many(CATALOG_VIEW, {}, projection={"_id": 1})}
+    after = {document["_id"] for document in await db.find_many("products", {"is_active": True}, projection={"_id": 1})}
+
+    await db.aggregate("products", catalog_pipeline({}) + [{"$merge": {
+        "into": CATALOG_VIEW,
+        "on": "_id",
+        "whenMatched": [{"$replaceWith": {"$cond": [
+            {"$eq": [_content("$$new"), _content("$$ROOT")]},
+            {"$mergeObjects": ["$$ROOT", {POPULARITY_FIELD: f"$$new.{POPULARITY_FIELD}"}]},
+            "$$new"
+        ]}}],
+        "whenNotMatched": "insert"
+    }}])
+
+    removed = list(before - after)
+    if removed:
+        await db.bulk_write(TOMBSTONES, [
+            UpdateOne({"_id": product_id}, {"$currentDate": {"removed_at": True}}, upsert=True)
+            for product_id in removed
+        ], ordered=False)
+        await db.delete_many(CATALOG_VIEW, {"_id": {"$in": removed}})
+    returned = list(after - before)
+    if returned:
+        await db.delete_many(TOMBSTONES, {"_id": {"$in": returned}})
+
+    count = await db.count_documents(CATALOG_VIEW, {})
+    logger.info(f"Rebuilt {CATALOG_VIEW} with {count} products")
+    await _notify(db, None)
+    return count
+
+async def ensure_built(db):
+    """Backfill the view on first start, or when it predates SYNC_FIELD or POPULARITY_FIELD"""
+    if await db.find_one(CATALOG_VIEW, {}, projection={"_id": 1}) is None:
+        await rebuild(db)
+    elif await db.find_one(CATALOG_VIEW, {"$or": [{SYNC_FIELD: None}, {POPULARITY_FIELD: None}]}, projection={"_id": 1}) is not None:
+        await rebuild(db)
+
+async def _main(argv: List[str]):
+    from db.resources import resources
+
+    if argv[1:2] != ["rebuild"]:
+        print("usage: python -m db.catalog_view rebuild")
+        return 2
+    try:
+        await rebuild(resources.db)
+    finally:
+        await resources.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv)))
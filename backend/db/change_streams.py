@@ -0,0 +1,166 @@
+from typing import Dict, Any, List, Optional, Callable, Set
+from pymongo.errors import OperationFailure, PyMongoError
+from dotenv import load_dotenv
+import asyncio
+import inspect
+import logging
+import os
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Collections whose edits must reach every worker's caches and in-process indexes
+DEFAULT_WATCHED_COLLECTIONS = "products,catalog_view,categories,brands,pricing_config,discount_coupons,users,collection_versions"
+
+# Server error codes meaning the stream cannot continue from the stored token
+_HISTORY_LOST_CODES = {
+    136,    # CappedPositionLost
+    260,    # InvalidResumeToken
+    280,    # ChangeStreamFatalError
+    286,    # ChangeStreamHistoryLost
+}
+# $changeStream on a standalone mongod
+_NOT_REPLICA_SET_CODES = {40573}
+
+Subscriber = Callable[[str, Dict[str, Any]], Any]
+
+def changed_fields(event: Dict[str, Any]) -> Optional[Set[str]]:
+    """Top-level fields an update event set or removed; None for inserts, replaces, deletes and the rest"""
+    if event.get("operationType") != "update" or "changedFields" not in event:
+        return None
+    return {path.split(".", 1)[0] for path in event["changedFields"]}
+
+def change_stream_settings() -> Dict[str, Any]:
+    return {
+        "enabled": os.getenv('CHANGE_STREAMS_ENABLED', 'false').lower() == 'true',
+        "collections": [
+            name.strip() for name in os.getenv('CHANGE_STREAM_COLLECTIONS', DEFAULT_WATCHED_COLLECTIONS).split(",")
+            if name.strip()
+        ],
+        "max_backoff": float(os.getenv('CHANGE_STREAM_MAX_BACKOFF', 30)),
+    }
+
+class ChangeStreamListener:
+    """Watch the database for writes to selected collections and publish them to subscribers.
+
+    Each uvicorn worker runs its own listener, so an edit made through any worker (or
+    directly in Mongo) invalidates every worker's caches. The resume token of the last
+    delivered event is kept; after a disconnect the stream resumes from it and replays
+    what was missed. If the server no longer has that history every subscriber is told
+    to flush (collection ``"*"``).
+
+    Change streams need a replica set. Locally a single node is enough::
+
+        mongod --replSet rs0 --dbpath ./data
+        mongosh --eval "rs.initiate()"
+        MONGO_URI=mongodb://localhost:27017/?replicaSet=rs0
+    """
+
+    def __init__(self, database, collections: List[str], max_backoff: float = 30):
+        self.database = database
+        self.collections = collections
+        self.max_backoff = max_backoff
+        self.resume_token: Optional[Dict[str, Any]] = None
+        self.subscribers: List[tuple] = []
+        self.events_seen = 0
+        self.restarts = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, callback: Subscriber, collections: Optional[List[str]] = None):
+        """Call ``callback(collection, event)`` for changes to ``collections`` (all watched when None)"""
+        self.subscribers.append((set(collections) if collections else None, callback))
+
+    def subscribe_cache(self, cache: Any):
+        """Invalidate ``cache`` per collection when it supports that, otherwise clear it"""
+        def invalidate(collection: str, event: Dict[str, Any]):
+            if collection != "*" and hasattr(cache, "invalidate"):
+                if hasattr(cache, "ignores") and cache.ignores(collection, changed_fields(event)):
+                    return
+                cache.invalidate(collection)
+            elif hasattr(cache, "clear"):
+                cache.clear()
+        self.subscribe(invalidate)
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Change stream listener watching {', '.join(self.collections)}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Change stream listener stopped")
+
+    def _pipeline(self) -> List[Dict[str, Any]]:
+        return [
+            {"$match": {"ns.coll": {"$in": self.collections}}},
+            # Subscribers only need to know what changed, not the documents themselves:
+            # for updates, the names of the changed fields (see changed_fields)
+            {"$project": {
+                "ns": 1, "operationType": 1, "documentKey": 1, "clusterTime": 1,
+                "changedFields": {"$concatArrays": [
+                    {"$map": {"input": {"$objectToArray": {"$ifNull": ["$updateDescription.updatedFields", {}]}}, "in": "$$this.k"}},
+                    {"$ifNull": ["$updateDescription.removedFields", []]}
+                ]}
+            }}
+        ]
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            try:
+                async with self.database.watch(self._pipeline(), resume_after=self.resume_token) as stream:
+                    backoff = 1.0
+                    async for event in stream:
+                        # A drop/rename invalidates the stream, its token can't be resumed after
+                        self.resume_token = None if event.get("operationType") == "invalidate" else stream.resume_token
+                        self.events_seen += 1
+                        await self._publish(event)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in _NOT_REPLICA_SET_CODES:
+                    logger.error("Change streams need a replica set; cross-worker cache invalidation is off")
+                    return
+                if e.code in _HISTORY_LOST_CODES:
+                    logger.warning(f"Change stream history lost ({e}), flushing caches and starting fresh")
+                    self.resume_token = None
+                    await self._publish({"operationType": "invalidate_all", "ns": {"coll": "*"}})
+                else:
+                    logger.error(f"Change stream failed: {e}")
+            except PyMongoError as e:
+                logger.warning(f"Change stream disconnected: {e}")
+            except Exception as e:
+                logger.error(f"Change stream listener error: {e}")
+
+            self.restarts += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _publish(self, event: Dict[str, Any]):
+        collection = event.get("ns", {}).get("coll") or "*"
+        for collections, callback in self.subscribers:
+            if collections is not None and collection != "*" and collection not in collections:
+                continue
+            try:
+                result = callback(collection, event)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Change stream subscriber failed for {collection}: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "collections": self.collections,
+            "running": self._task is not None and not self._task.done(),
+            "events_seen": self.events_seen,
+            "restarts": self.restarts,
+            "subscribers": len(self.subscribers),
+            "has_resume_token": self.resume_token is not None
+        }
@@ -1,11 +1,149 @@
 import motor.motor_asyncio
+from pymongo import monitoring
+from collections import deque
 from dotenv import load_dotenv
+from typing import Dict, Any
+import asyncio
+import logging
 import os
+import time
 
 load_dotenv()
 
-client = motor.motor_asyncio.AsyncIOMotorClient(os.getenv('MONGO_URI'))
+logger = logging.getLogger(__name__)
+
+def pool_settings() -> Dict[str, Any]:
+    """Motor client pool options, overridable through the environment"""
+    return {
+        "maxPoolSize": int(os.getenv('MONGO_MAX_POOL_SIZE', 100)),
+        "minPoolSize": int(os.getenv('MONGO_MIN_POOL_SIZE', 10)),
+        "maxIdleTimeMS": int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 300000)),
+        "waitQueueTimeoutMS": int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000)),
+        "serverSelectionTimeoutMS": int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+        "connectTimeoutMS": int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 10000)),
+        # zstd needs the zstandard package and snappy python-snappy; unavailable
+        # compressors are skipped by the driver with a warning
+        "compressors": os.getenv('MONGO_COMPRESSORS', 'zstd,snappy,zlib'),
+    }
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """CMAP listener keeping connection pool gauges and checkout wait times"""
+
+    def __init__(self):
+        self.open_connections = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_failures: Dict[str, int] = {}
+        self.pool_cleared = 0
+        self.max_wait_ms = 0.0
+        self.total_wait_ms = 0.0
+        self.wait_samples = deque(maxlen=1024)
+        # Drivers before 4.7 don't report checkout duration, fall back to FIFO start times
+        self._checkout_started = deque(maxlen=10000)
+
+    def pool_created(self, event):
+        logger.info(f"Connection pool created for {event.address}")
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self.pool_cleared += 1
+        logger.warning(f"Connection pool cleared for {event.address}")
+
+    def pool_closed(self, event):
+        logger.info(f"Connection pool closed for {event.address}")
+
+    def connection_created(self, event):
+        self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.open_connections = max(0, self.open_connections - 1)
+
+    def connection_check_out_started(self, event):
+        self.waiting += 1
+        self._checkout_started.append(time.perf_counter())
+
+    def connection_check_out_failed(self, event):
+        self.waiting = max(0, self.waiting - 1)
+        self._observe_wait(getattr(event, "duration", None))
+        reason = str(event.reason)
+        self.checkout_failures[reason] = self.checkout_failures.get(reason, 0) + 1
+        logger.warning(f"Connection checkout failed on {event.address}: {reason}")
+
+    def connection_checked_out(self, event):
+        self.waiting = max(0, self.waiting - 1)
+        self.in_use += 1
+        self.checkouts += 1
+        self._observe_wait(getattr(event, "duration", None))
+
+    def connection_checked_in(self, event):
+        self.in_use = max(0, self.in_use - 1)
+
+    def _observe_wait(self, duration):
+        started = self._checkout_started.popleft() if self._checkout_started else None
+        if duration is not None:
+            wait_ms = duration * 1000
+        elif started is not None:
+            wait_ms = (time.perf_counter() - started) * 1000
+        else:
+            return
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        self.wait_samples.append(wait_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self.wait_samples)
+
+        def percentile(pct):
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))], 3)
+
+        settings = pool_settings()
+        return {
+            "max_pool_size": settings["maxPoolSize"],
+            "min_pool_size": settings["minPoolSize"],
+            "open_connections": self.open_connections,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.checkout_failures,
+            "pool_cleared": self.pool_cleared,
+            "checkout_wait_ms": {
+                "avg": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0,
+                "p50": percentile(50),
+                "p95": percentile(95),
+                "p99": percentile(99),
+                "max": round(self.max_wait_ms, 3)
+            }
+        }
+
+pool_metrics = PoolMetrics()
+
+def create_client() -> motor.motor_asyncio.AsyncIOMotorClient:
+    return motor.motor_asyncio.AsyncIOMotorClient(
+        os.getenv('MONGO_URI'),
+        event_listeners=[pool_metrics],
+        **pool_settings()
+    )
+
+client = create_client()
 
 def get_connection():
     if client:
-        return client
\ No newline at end of file
+        return client
+
+async def warm_pool(mongo_client: motor.motor_asyncio.AsyncIOMotorClient = None):
+    """Open minPoolSize connections up front so the first requests don't pay for them"""
+    mongo_client = mongo_client or client
+    min_size = pool_settings()["minPoolSize"]
+    if min_size <= 0:
+        return
+    # Concurrent pings each check out their own connection
+    await asyncio.gather(*[mongo_client.admin.command('ping') for _ in range(min_size)])
+    logger.info(f"Connection pool warmed to {pool_metrics.open_connections} connections")
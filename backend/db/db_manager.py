@@ -1,30 +1,259 @@
-from typing import Dict,Any,List
-from db.db_connection import get_connection
+from typing import Dict,Any,List,Optional,AsyncIterator,Union,Tuple
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+import asyncio
+import copy
+from db.projections import get_projection
+from db.metrics import query_metrics
+from db.query_cache import query_cache
+from db.versions import collection_versions
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest, _ServerMode
+from pymongo.write_concern import WriteConcern
+from bson import ObjectId
 from dotenv import load_dotenv
 import os
 import logging
+import time
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_BATCH_SIZE = 500
+
+# Either a projection profile name from db.projections or a raw projection dict
+Projection = Optional[Union[str, Dict[str, Any]]]
+
+# Either a read preference mode name ("secondaryPreferred") or a pymongo read preference
+ReadPreferenceArg = Optional[Union[str, _ServerMode]]
+
+# Secondaries lagging more than this are not used for secondary reads (-1 = no limit, min 90)
+MAX_STALENESS_SECONDS = int(os.getenv('MONGO_MAX_STALENESS_SECONDS', -1))
+# Where reads inside a causal session go once the session carries the user's last write time
+READ_YOUR_WRITES_PREFERENCE = os.getenv('READ_YOUR_WRITES_PREFERENCE', 'secondaryPreferred')
+CAUSAL_SESSIONS_ENABLED = os.getenv('CAUSAL_SESSIONS_ENABLED', 'true').lower() == 'true'
+# Users whose last operation/cluster time is remembered per process
+CAUSAL_TOKENS_MAX = int(os.getenv('CAUSAL_TOKENS_MAX', 10000))
+
+_READ_PREFERENCE_MODES = {
+    "primarypreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondarypreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+def resolve_read_preference(read_preference: ReadPreferenceArg) -> Optional[_ServerMode]:
+    """Turn a mode name into a pymongo read preference; pymongo objects and None pass through"""
+    if read_preference is None or isinstance(read_preference, _ServerMode):
+        return read_preference
+
+    mode = read_preference.replace("_", "").lower()
+    if mode == "primary":
+        return Primary()
+    try:
+        return _READ_PREFERENCE_MODES[mode](max_staleness=MAX_STALENESS_SECONDS)
+    except KeyError:
+        raise ValueError(f"Unknown read preference: {read_preference}")
+
+class CausalSession:
+    """A causally consistent Motor session plus where its reads should go"""
+
+    def __init__(self, session, key: Optional[str], read_preference: ReadPreferenceArg):
+        self.session = session
+        self.key = key
+        self.read_preference = read_preference
+
 class DatabaseManager:
-    def __init__(self,client: AsyncIOMotorClient, db_name: str):
+    def __init__(self,client: AsyncIOMotorClient, db_name: str, read_preference: ReadPreferenceArg = None):
         self.client = client
-        self.db = client[db_name]
+        self.db = client.get_database(db_name, read_preference=resolve_read_preference(read_preference))
+        self.read_preference = read_preference
+        self.metrics = query_metrics
+        self.cache = query_cache
+        self.versions = collection_versions
+        # Session bound by causal_session; methods use it when no session is passed
+        self.session: Optional[CausalSession] = None
+        # Shared with every view made by with_read_preference/causal_session
+        self._causal_tokens: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._views: Dict[str, "DatabaseManager"] = {}
+        # Background explain tasks, held until done so they aren't garbage collected
+        self._tasks: set = set()
+
+    def with_read_preference(self, read_preference: ReadPreferenceArg) -> "DatabaseManager":
+        """View of this manager whose reads default to ``read_preference``.
+
+        Views share the client, pool, metrics and causal tokens and are cached, so
+        calling this per request costs a dict lookup.
+        """
+        key = read_preference if isinstance(read_preference, str) else repr(read_preference)
+        view = self._views.get(key) if self.session is None else None
+        if view is None:
+            view = copy.copy(self)
+            view.db = self.db.with_options(read_preference=resolve_read_preference(read_preference))
+            view.read_preference = read_preference
+            # Session-bound views live for one request, only cache the shared ones
+            if self.session is None:
+                self._views[key] = view
+        return view
+
+    @asynccontextmanager
+    async def causal_session(self, key: Optional[str] = None) -> AsyncIterator["DatabaseManager"]:
+        """Yield a view bound to a causally consistent session for ``key`` (a user id).
+
+        Writes made through the view record their operation and cluster time under
+        ``key``. The next session for the same key starts from that time, so its
+        reads can be served by a secondary (READ_YOUR_WRITES_PREFERENCE): the member
+        waits until it has replicated the user's last write before answering. With
+        no recorded time for the key (first request, or the write went through
+        another worker process) reads stay on the primary.
+        """
+        if not CAUSAL_SESSIONS_ENABLED:
+            yield self
+            return
+
+        key = str(key) if key is not None else None
+        token = self._causal_tokens.get(key) if key is not None else None
+
+        async with await self.client.start_session(causal_consistency=True) as session:
+            read_preference = "primary"
+            if token:
+                session.advance_cluster_time(token["cluster_time"])
+                session.advance_operation_time(token["operation_time"])
+                read_preference = READ_YOUR_WRITES_PREFERENCE
+
+            view = copy.copy(self)
+            view.session = CausalSession(session, key, read_preference)
+            try:
+                yield view
+            finally:
+                self._remember_causal_token(view.session)
+
+    def _remember_causal_token(self, session: Optional[CausalSession]):
+        if session is None or session.key is None:
+            return
+        operation_time = session.session.operation_time
+        if operation_time is None:
+            return
+        self._causal_tokens[session.key] = {
+            "operation_time": operation_time,
+            "cluster_time": session.session.cluster_time
+        }
+        self._causal_tokens.move_to_end(session.key)
+        while len(self._causal_tokens) > CAUSAL_TOKENS_MAX:
+            self._causal_tokens.popitem(last=False)
+
+    def _collection(self, collection: str, read_preference: ReadPreferenceArg = None, session: Optional[CausalSession] = None):
+        """Collection handle honouring a per-call read preference and the session's concerns"""
+        if session is not None and read_preference is None:
+            read_preference = session.read_preference
+        if read_preference is None and session is None:
+            return self.db[collection]
+
+        options = {}
+        if read_preference is not None:
+            options["read_preference"] = resolve_read_preference(read_preference)
+        if session is not None:
+            # Causal guarantees across members need majority reads and writes
+            options["read_concern"] = ReadConcern("majority")
+            options["write_concern"] = WriteConcern("majority")
+        return self.db.get_collection(collection, **options)
+
+    def _session(self, session: Optional[CausalSession]) -> Optional[CausalSession]:
+        return session if session is not None else self.session
+
+    def enable_cache(self, collection: str, ttl: float = 60):
+        """Cache find_one/find_many/count_documents results for ``collection``.
+
+        Any write to the collection through a DatabaseManager in this process drops
+        its cached reads; other processes' writes show up once ``ttl`` expires.
+        """
+        self.cache.enable(collection, ttl)
+
+    def _cache_key(self, operation: str, collection: str, session: Optional[CausalSession], *parts: Any) -> Optional[str]:
+        # Session reads need their causal guarantees, they always go to the server
+        if session is not None or not self.cache.is_enabled(collection):
+            return None
+        return self.cache.make_key(operation, collection, *parts)
+
+    def _after_write(self, collection: str, session: Optional[CausalSession]):
+        if self.cache.is_enabled(collection):
+            self.cache.invalidate(collection)
+        self.versions.bump(self.db, collection)
+        # Record right away rather than on session exit, the user's next request may already be in flight
+        self._remember_causal_token(session)
         
-    async def find_one(self, collection:str, filter_dict:Dict[str,Any]):
+    def _observe(self, operation: str, collection: str, query: Any, started: float, docs: List[Any] = None, doc_count: int = None, explain_command: Dict[str, Any] = None):
+        """Record timing for one call and explain its shape in the background when slow"""
+        stats = self.metrics.record(operation, collection, query, started, docs=docs, doc_count=doc_count)
+        if stats is None:
+            return
+        if explain_command is None:
+            stats.explain = {"status": "not_explainable"}
+            return
+        task = asyncio.ensure_future(self._capture_explain(stats, explain_command))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _capture_explain(self, stats, explain_command: Dict[str, Any]):
+        try:
+            explain = await self.db.command("explain", explain_command, verbosity="executionStats")
+            stats.explain = self.metrics.summarize_explain(explain)
+            if stats.explain["collscan"] or stats.explain["poor_index"]:
+                logger.warning(
+                    f"Query on {stats.collection} {stats.shape} uses {stats.explain['stages']}: "
+                    f"{stats.explain['docs_examined']} docs examined for {stats.explain['returned']} returned"
+                )
+        except Exception as e:
+            logger.warning(f"Failed to explain slow query on {stats.collection}: {e}")
+            stats.explain = {"status": "failed", "error": str(e)}
+
+    async def server_version(self) -> Tuple[int, ...]:
+        """The server's (major, minor, patch) from buildInfo"""
+        info = await self.db.command("buildInfo")
+        return tuple(info.get("versionArray", [])[:3])
+
+    async def find_one(self, collection:str, filter_dict:Dict[str,Any], projection: Projection = None, read_preference: ReadPreferenceArg = None, session: Optional[CausalSession] = None):
+        started = time.perf_counter()
+        session = self._session(session)
+        cache_key = self._cache_key("find_one", collection, session, filter_dict, get_projection(projection))
+        if cache_key:
+            hit, cached = self.cache.get(cache_key, collection)
+            if hit:
+                return cached
+            generation = self.cache.generation(collection)
         try:
-            result = await self.db[collection].find_one(filter_dict)
+            result = await self._collection(collection, read_preference, session).find_one(
+                filter_dict, get_projection(projection), session=session and session.session
+            )
+            if cache_key:
+                self.cache.set(cache_key, collection, result, generation)
+            self._observe(
+                "find_one", collection, filter_dict, started,
+                docs=[result] if result else [],
+                explain_command={"find": collection, "filter": filter_dict, "limit": 1}
+            )
             return result
         except Exception as e:
             logger.error(f'Error finding data in {collection}: {e}')
             raise 
 
-    async def find_many(self, collection:str, filter_dict: Dict[str,Any] = None, skip: int = 0, limit:int = 0, sort:List = None):
+    async def find_many(self, collection:str, filter_dict: Dict[str,Any] = None, skip: int = 0, limit:int = 0, sort:List = None, projection: Projection = None, read_preference: ReadPreferenceArg = None, session: Optional[CausalSession] = None):
+        started = time.perf_counter()
+        session = self._session(session)
+        cache_key = self._cache_key("find", collection, session, filter_dict or {}, get_projection(projection), sort, skip, limit)
+        if cache_key:
+            hit, cached = self.cache.get(cache_key, collection)
+            if hit:
+                return cached
+            generation = self.cache.generation(collection)
         try:
-            cursor = self.db[collection].find(filter_dict or {})
+            cursor = self._collection(collection, read_preference, session).find(
+                filter_dict or {}, get_projection(projection), session=session and session.session
+            )
             if sort:
                 cursor = cursor.sort(sort)
             if skip:
@@ -33,58 +262,392 @@ class DatabaseManager:
                 cursor = cursor.limit(limit)
             
             result = await cursor.to_list(length = None)
+            if cache_key:
+                self.cache.set(cache_key, collection, result, generation)
+            self._observe(
+                "find", collection, {"filter": filter_dict or {}, "sort": sort}, started,
+                docs=result,
+                explain_command=_find_command(collection, filter_dict, sort, skip, limit)
+            )
             return result
         except Exception as e:
             raise e
 
-    async def insert_one(self, collection:str, document: Dict[str,Any]):
+    async def iter_many(
+        self,
+        collection: str,
+        filter_dict: Dict[str, Any] = None,
+        sort: List = None,
+        projection: Projection = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_docs: Optional[int] = None,
+        cancel_event: Optional[asyncio.Event] = None,
+        read_preference: ReadPreferenceArg = None,
+        session: Optional[CausalSession] = None,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream matching documents in chunks of ``batch_size``.
+
+        Only one chunk is held in memory at a time. ``max_docs`` is a hard cap on
+        the number of documents yielded. Setting ``cancel_event`` stops the scan at the
+        next chunk; a caller that breaks out of the loop should ``await aclose()`` the
+        iterator, which closes the server cursor right away.
+        """
+        session = self._session(session)
+        cursor = self._collection(collection, read_preference, session).find(
+            filter_dict or {}, get_projection(projection), session=session and session.session
+        )
+        if sort:
+            cursor = cursor.sort(sort)
+        if max_docs:
+            cursor = cursor.limit(max_docs)
+        cursor = cursor.batch_size(batch_size)
+
+        observe = ("iter_find", collection, {"filter": filter_dict or {}, "sort": sort},
+                   _find_command(collection, filter_dict, sort, 0, max_docs or 0))
+        chunks = self._iter_cursor(cursor, batch_size, max_docs, cancel_event, observe)
         try:
-            result = await self.db[collection].insert_one(document)
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            # Propagate aclose() from the caller so the server cursor closes now, not at GC
+            await chunks.aclose()
+
+    async def iter_aggregate(
+        self,
+        collection: str,
+        pipeline: List[Dict[str, Any]],
+        projection: Projection = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_docs: Optional[int] = None,
+        cancel_event: Optional[asyncio.Event] = None,
+        read_preference: ReadPreferenceArg = None,
+        session: Optional[CausalSession] = None,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream aggregation results in chunks of ``batch_size``, see ``iter_many``"""
+        projection = get_projection(projection)
+        if projection:
+            pipeline = list(pipeline) + [{"$project": projection}]
+        if max_docs:
+            pipeline = list(pipeline) + [{"$limit": max_docs}]
+        session = self._session(session)
+        cursor = self._collection(collection, read_preference, session).aggregate(
+            pipeline, batchSize=batch_size, allowDiskUse=True, session=session and session.session
+        )
+
+        observe = ("iter_aggregate", collection, pipeline,
+                   {"aggregate": collection, "pipeline": pipeline, "cursor": {}})
+        chunks = self._iter_cursor(cursor, batch_size, max_docs, cancel_event, observe)
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            # Propagate aclose() from the caller so the server cursor closes now, not at GC
+            await chunks.aclose()
+
+    async def _iter_cursor(self, cursor, batch_size: int, max_docs: Optional[int], cancel_event: Optional[asyncio.Event], observe: tuple):
+        started = time.perf_counter()
+        yielded = 0
+        sample = None
+        try:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    logger.info("Cursor iteration cancelled")
+                    break
+
+                length = batch_size
+                if max_docs:
+                    length = min(batch_size, max_docs - yielded)
+                    if length <= 0:
+                        break
+
+                chunk = await cursor.to_list(length=length)
+                if not chunk:
+                    break
+
+                yielded += len(chunk)
+                if sample is None:
+                    sample = chunk[:10]
+                yield chunk
+
+                if len(chunk) < length:
+                    break
+        except Exception as e:
+            logger.error(f"Error iterating cursor: {e}")
+            raise
+        finally:
+            await cursor.close()
+            operation, collection, query, explain_command = observe
+            # Byte sampling only looks at the first few documents of the scan
+            self._observe(operation, collection, query, started, docs=sample, doc_count=yielded, explain_command=explain_command)
+
+    async def insert_one(self, collection:str, document: Dict[str,Any], session: Optional[CausalSession] = None):
+        started = time.perf_counter()
+        session = self._session(session)
+        try:
+            result = await self._collection(collection, session=session).insert_one(document, session=session and session.session)
+            self._observe("insert_one", collection, {}, started)
+            self._after_write(collection, session)
             return str(result.inserted_id)
         except Exception as e:
             raise e
     
-    async def update_one(self, collection: str, filter_dict: Dict[str, Any], update_dict: Dict[str, Any]):
+    async def insert_many(self, collection: str, documents: List[Dict[str, Any]], ordered: bool = True, session: Optional[CausalSession] = None):
+        """Insert many documents in one round trip and return their ids as strings"""
+        if not documents:
+            return []
+        started = time.perf_counter()
+        session = self._session(session)
+        try:
+            result = await self._collection(collection, session=session).insert_many(
+                documents, ordered=ordered, session=session and session.session
+            )
+            self._observe("insert_many", collection, {}, started, doc_count=len(documents))
+            self._after_write(collection, session)
+            return [str(inserted_id) for inserted_id in result.inserted_ids]
+        except BulkWriteError as e:
+            # Some documents may have gone in; e.details["writeErrors"] says which didn't
+            self._after_write(collection, session)
+            logger.error(f'Error inserting many into {collection}: {len((e.details or {}).get("writeErrors", []))} failed')
+            raise
+        except Exception as e:
+            logger.error(f'Error inserting many into {collection}: {e}')
+            raise
+
+    async def bulk_write(self, collection: str, operations: List[Any], ordered: bool = True, session: Optional[CausalSession] = None) -> Dict[str, Any]:
+        """Apply many pymongo write operations in one round trip.
+
+        Write errors are not raised; they are reported per operation so callers can
+        decide what to do with partial failures. With ``ordered=True`` operations after
+        the first failure are reported as not executed.
+        """
+        if not operations:
+            return _bulk_result(None, 0, [], ordered)
+        started = time.perf_counter()
+        session = self._session(session)
+        try:
+            result = await self._collection(collection, session=session).bulk_write(
+                operations, ordered=ordered, session=session and session.session
+            )
+            self._observe("bulk_write", collection, {}, started, doc_count=len(operations))
+            self._after_write(collection, session)
+            return _bulk_result(result.bulk_api_result, len(operations), [], ordered)
+        except BulkWriteError as e:
+            self._after_write(collection, session)
+            details = e.details or {}
+            logger.warning(f"Bulk write on {collection} had {len(details.get('writeErrors', []))} failed operations")
+            return _bulk_result(details, len(operations), details.get("writeErrors", []), ordered)
+        except Exception as e:
+            logger.error(f'Error in bulk write on {collection}: {e}')
+            raise
+
+    async def update_many_by_ids(self, collection: str, updates: Dict[Any, Dict[str, Any]], ordered: bool = False, session: Optional[CausalSession] = None) -> Dict[str, Any]:
+        """Apply a different update to each document id in one round trip.
+
+        ``updates`` maps a document id (str or ObjectId) to an update dict; plain
+        field dicts are wrapped in ``$set`` like ``update_one`` does.
+        """
+        ids = list(updates.keys())
+        operations = []
+        for doc_id in ids:
+            update_dict = updates[doc_id]
+            if not any(key.startswith('$') for key in update_dict.keys()):
+                update_dict = {"$set": update_dict}
+            if isinstance(doc_id, str) and ObjectId.is_valid(doc_id):
+                doc_id = ObjectId(doc_id)
+            operations.append(UpdateOne({"_id": doc_id}, update_dict))
+
+        result = await self.bulk_write(collection, operations, ordered=ordered, session=session)
+        result["results_by_id"] = {
+            str(ids[op["index"]]): op for op in result["operations"]
+        }
+        return result
+
+    async def update_one(self, collection: str, filter_dict: Dict[str, Any], update_dict: Union[Dict[str, Any], List[Dict[str, Any]]], session: Optional[CausalSession] = None):
+        """Update one document; ``update_dict`` is operators, plain fields (wrapped in $set) or a pipeline list"""
+        started = time.perf_counter()
+        session = self._session(session)
         try:
-            if any(key.startswith('$') for key in update_dict.keys()):
-                result = await self.db[collection].update_one(filter_dict, update_dict)
-            else:
-                result = await self.db[collection].update_one(filter_dict, {"$set": update_dict})
+            if isinstance(update_dict, dict) and not any(key.startswith('$') for key in update_dict.keys()):
+                update_dict = {"$set": update_dict}
+            result = await self._collection(collection, session=session).update_one(
+                filter_dict, update_dict, session=session and session.session
+            )
+            self._after_write(collection, session)
+            self._observe(
+                "update_one", collection, filter_dict, started,
+                explain_command={"update": collection, "updates": [{"q": filter_dict, "u": update_dict}]}
+            )
             return result.modified_count > 0
         except Exception as e:
             raise e
     
-    async def update_many(self, collection: str, filter_dict: Dict[str, Any], update_dict: Dict[str, Any]):
+    async def update_many(self, collection: str, filter_dict: Dict[str, Any], update_dict: Union[Dict[str, Any], List[Dict[str, Any]]], session: Optional[CausalSession] = None):
+        """Update every matching document; ``update_dict`` takes the same forms as in update_one"""
+        started = time.perf_counter()
+        session = self._session(session)
         try:
-            if any(key.startswith('$') for key in update_dict.keys()):
-                result = await self.db[collection].update_many(filter_dict, update_dict)
-            else:
-                result = await self.db[collection].update_many(filter_dict, {"$set": update_dict})
+            if isinstance(update_dict, dict) and not any(key.startswith('$') for key in update_dict.keys()):
+                update_dict = {"$set": update_dict}
+            result = await self._collection(collection, session=session).update_many(
+                filter_dict, update_dict, session=session and session.session
+            )
+            self._after_write(collection, session)
+            self._observe(
+                "update_many", collection, filter_dict, started,
+                explain_command={"update": collection, "updates": [{"q": filter_dict, "u": update_dict, "multi": True}]}
+            )
             return result.modified_count > 0
         except Exception as e:
             raise e
 
-    async def count_documents(self,collection:str,filter_dict:Dict[str,Any] = None):
+    async def count_documents(self,collection:str,filter_dict:Dict[str,Any] = None, read_preference: ReadPreferenceArg = None, session: Optional[CausalSession] = None):
+        started = time.perf_counter()
+        session = self._session(session)
+        cache_key = self._cache_key("count", collection, session, filter_dict or {})
+        if cache_key:
+            hit, cached = self.cache.get(cache_key, collection)
+            if hit:
+                return cached
+            generation = self.cache.generation(collection)
         try:
-            return await self.db[collection].count_documents(filter_dict or {})
+            count = await self._collection(collection, read_preference, session).count_documents(
+                filter_dict or {}, session=session and session.session
+            )
+            if cache_key:
+                self.cache.set(cache_key, collection, count, generation)
+            self._observe(
+                "count", collection, filter_dict, started,
+                explain_command={"count": collection, "query": filter_dict or {}}
+            )
+            return count
         except Exception as e:
             raise e
     
-    async def delete_one(self, collection:str, filter_dict:Dict[str,Any]):
+    async def estimated_document_count(self, collection:str, read_preference: ReadPreferenceArg = None):
+        """Collection size from metadata; no filter, no scan, may be slightly off after unclean shutdowns"""
+        started = time.perf_counter()
+        try:
+            count = await self._collection(collection, read_preference).estimated_document_count()
+            self._observe("estimated_count", collection, None, started)
+            return count
+        except Exception as e:
+            raise e
+    
+    async def delete_one(self, collection:str, filter_dict:Dict[str,Any], session: Optional[CausalSession] = None):
+        started = time.perf_counter()
+        session = self._session(session)
+        try:
+            result = await self._collection(collection, session=session).delete_one(
+                filter_dict, session=session and session.session
+            )
+            self._after_write(collection, session)
+            self._observe(
+                "delete_one", collection, filter_dict, started,
+                explain_command={"delete": collection, "deletes": [{"q": filter_dict, "limit": 1}]}
+            )
+            return result.deleted_count
+        except Exception as e:
+            raise e
+
+    async def delete_many(self, collection:str, filter_dict:Dict[str,Any], session: Optional[CausalSession] = None):
+        started = time.perf_counter()
+        session = self._session(session)
         try:
-            result = await self.db[collection].delete_one(filter_dict)
+            result = await self._collection(collection, session=session).delete_many(
+                filter_dict, session=session and session.session
+            )
+            self._after_write(collection, session)
+            self._observe(
+                "delete_many", collection, filter_dict, started,
+                explain_command={"delete": collection, "deletes": [{"q": filter_dict, "limit": 0}]}
+            )
             return result.deleted_count
         except Exception as e:
             raise e
 
-    async def aggregate(self,collection:str, pipeline:List[Dict[str,Any]]):
+    async def aggregate(self,collection:str, pipeline:List[Dict[str,Any]], projection: Projection = None, read_preference: ReadPreferenceArg = None, session: Optional[CausalSession] = None):
+        started = time.perf_counter()
+        session = self._session(session)
         try:
-            cursor = self.db[collection].aggregate(pipeline)
-            return await cursor.to_list(length=None)
+            projection = get_projection(projection)
+            if projection:
+                pipeline = list(pipeline) + [{"$project": projection}]
+            cursor = self._collection(collection, read_preference, session).aggregate(
+                pipeline, session=session and session.session
+            )
+            result = await cursor.to_list(length=None)
+            target = _write_target(pipeline)
+            if target:
+                self._after_write(target, session)
+            self._observe(
+                "aggregate", collection, pipeline, started,
+                docs=result,
+                explain_command={"aggregate": collection, "pipeline": pipeline, "cursor": {}}
+            )
+            return result
         except Exception as e:
             logger.error(f"Error performing aggregation: {e}")
             raise
 
+def _write_target(pipeline: List[Dict[str, Any]]) -> Optional[str]:
+    """Collection a trailing $out/$merge stage writes to (same database only)"""
+    if not pipeline:
+        return None
+    stage = pipeline[-1]
+    target = stage.get("$out") or (stage.get("$merge") or {}).get("into") if isinstance(stage, dict) else None
+    if isinstance(target, dict):
+        target = target.get("coll")
+    return target if isinstance(target, str) else None
+
+def _find_command(collection: str, filter_dict: Dict[str, Any], sort: List, skip: int, limit: int) -> Dict[str, Any]:
+    """Build the find command used to explain a slow find"""
+    command = {"find": collection, "filter": filter_dict or {}}
+    if sort:
+        command["sort"] = {field: direction for field, direction in sort}
+    if skip:
+        command["skip"] = skip
+    if limit:
+        command["limit"] = limit
+    return command
+
+def _bulk_result(details: Optional[Dict[str, Any]], total: int, write_errors: List[Dict[str, Any]], ordered: bool) -> Dict[str, Any]:
+    """Normalize a pymongo bulk result into counts plus a per-operation status list"""
+    details = details or {}
+    errors_by_index = {error["index"]: error for error in write_errors}
+    first_error = min(errors_by_index) if errors_by_index else None
+
+    operations = []
+    for index in range(total):
+        if index in errors_by_index:
+            operations.append({
+                "index": index,
+                "ok": False,
+                "error": errors_by_index[index].get("errmsg"),
+                "code": errors_by_index[index].get("code")
+            })
+        elif ordered and first_error is not None and index > first_error:
+            operations.append({"index": index, "ok": False, "error": "not executed"})
+        else:
+            operations.append({"index": index, "ok": True})
+
+    return {
+        "inserted_count": details.get("nInserted", 0),
+        "matched_count": details.get("nMatched", 0),
+        "modified_count": details.get("nModified", 0),
+        "deleted_count": details.get("nRemoved", 0),
+        "upserted_count": details.get("nUpserted", 0),
+        "upserted_ids": {
+            upsert["index"]: str(upsert["_id"]) for upsert in details.get("upserted", [])
+        },
+        "failed_count": sum(1 for op in operations if not op["ok"]),
+        "operations": operations
+    }
+
 def get_database():
-    client = get_connection()
-    return DatabaseManager(client,os.getenv('DB_NAME'))
\ No newline at end of file
+    """FastAPI dependency returning the process-wide DatabaseManager (no per-request allocation)"""
+    from db.resources import resources
+    return resources.db
+
+def get_catalog_database():
+    """FastAPI dependency for catalog browsing; stale-tolerant reads go to secondaries when available"""
+    return get_database().with_read_preference(os.getenv('CATALOG_READ_PREFERENCE', 'secondaryPreferred'))
\ No newline at end of file
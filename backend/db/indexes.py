@@ -0,0 +1,221 @@
+from typing import Dict, Any, List, Optional, Tuple
+from db.catalog_view import TOMBSTONE_RETENTION_SECONDS
+import logging
+
+logger = logging.getLogger(__name__)
+
+ASC = 1
+DESC = -1
+
+# Index options that make two indexes with the same keys different
+_COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+class IndexSpec:
+    """A declared index and the query shape that needs it"""
+
+    def __init__(self, collection: str, keys: List[Tuple[str, int]], used_by: str, **options):
+        self.collection = collection
+        self.keys = [(field, direction) for field, direction in keys]
+        self.used_by = used_by
+        self.options = {key: value for key, value in options.items() if value is not None}
+        self.name = self.options.pop("name", None) or "_".join(f"{field}_{direction}" for field, direction in self.keys)
+
+    def matches(self, info: Dict[str, Any]) -> bool:
+        """Check an entry from index_information() against this spec"""
+        if not _same_keys(info, self.keys):
+            return False
+        return all(info.get(option) == self.options.get(option) for option in _COMPARED_OPTIONS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "collection": self.collection,
+            "name": self.name,
+            "keys": self.keys,
+            "used_by": self.used_by,
+            **self.options
+        }
+
+INDEX_REGISTRY: Dict[str, List[IndexSpec]] = {}
+
+def declare_index(collection: str, keys: List[Tuple[str, int]], used_by: str, **options) -> IndexSpec:
+    """Register the index a query shape needs; reconcile_indexes creates it at startup"""
+    spec = IndexSpec(collection, keys, used_by, **options)
+    specs = INDEX_REGISTRY.setdefault(collection, [])
+    for existing in specs:
+        if existing.name == spec.name:
+            if existing.keys != spec.keys or existing.options != spec.options:
+                raise ValueError(f"Conflicting declarations for index {collection}.{spec.name}")
+            return existing
+    specs.append(spec)
+    return spec
+
+# ---------------------------------------------------------------------------
+# Query shapes. Keep each declaration next to the others for its collection and
+# name the route or handler that issues the query.
+# ---------------------------------------------------------------------------
+
+# users
+declare_index("users", [("email", ASC)], "auth login/register, admin auth", unique=True)
+declare_index("users", [("role", ASC)], "admin customers, users filter")
+declare_index("users", [("phone", ASC)], "auth_service phone uniqueness check", sparse=True)
+declare_index("users", [("created_at", DESC), ("_id", DESC)], "admin handle_get_users keyset pages")
+
+# products
+declare_index("products", [("name", ASC)], "admin product lookups")
+declare_index("products", [("category", ASC)], "category filter, category delete check")
+declare_index("products", [("price", ASC)], "price range filter")
+declare_index("products", [("is_active", ASC), ("created_at", DESC), ("_id", DESC)], "get_products listing, keyset pages")
+declare_index("products", [("is_active", ASC), ("category", ASC), ("created_at", DESC), ("_id", DESC)], "get_products category filter")
+declare_index("products", [("is_active", ASC), ("brand", ASC), ("created_at", DESC), ("_id", DESC)], "get_products brand filter")
+declare_index("products", [("stock", ASC)], "admin send_inventory_status low stock")
+declare_index("products", [("created_at", DESC)], "admin send_products sort")
+
+# catalog_view (active products with category/brand embedded, see db.catalog_view)
+declare_index("catalog_view", [("created_at", DESC), ("_id", DESC)], "get_products listing, keyset pages")
+declare_index("catalog_view", [("category._id", ASC), ("created_at", DESC), ("_id", DESC)], "get_products category filter, refresh_category")
+declare_index("catalog_view", [("brand._id", ASC), ("created_at", DESC), ("_id", DESC)], "get_products brand filter, refresh_brand")
+declare_index("catalog_view", [("price", ASC)], "get_products price range filter")
+declare_index("catalog_view", [("synced_at", ASC), ("_id", ASC)], "products/changes delta sync keyset")
+declare_index("catalog_view", [("popularity", DESC), ("_id", DESC)], "get_products sort=popular, keyset pages")
+declare_index("catalog_view", [("category._id", ASC), ("popularity", DESC), ("_id", DESC)], "get_products sort=popular category filter")
+declare_index("catalog_view", [("brand._id", ASC), ("popularity", DESC), ("_id", DESC)], "get_products sort=popular brand filter")
+
+# product_stats (decayed sales/view scores, see app.services.product_stats)
+declare_index("product_stats", [("sales_score", DESC)], "/products/bestsellers")
+declare_index("product_stats", [("rebuilt_at", ASC)], "product_stats rebuild stale-sales reset")
+
+# product_recommendations (frequently bought together, see app.services.recommendations);
+# /products/{id}/related reads by _id
+declare_index("product_recommendations", [("built_at", ASC)], "recommendations rebuild stale cleanup")
+
+# product_tombstones (products that left catalog_view, for delta sync); expiring them
+# bounds how old a sync token can be, see app.services.catalog_sync
+declare_index(
+    "product_tombstones", [("removed_at", ASC)], "products/changes delta sync keyset, tombstone expiry",
+    expireAfterSeconds=TOMBSTONE_RETENTION_SECONDS
+)
+
+# categories / brands
+declare_index("categories", [("is_active", ASC), ("name", ASC)], "categories route, category name filter")
+declare_index("categories", [("parentId", ASC)], "admin delete_category child check", sparse=True)
+declare_index("brands", [("is_active", ASC), ("name", ASC)], "brands route, brand name filter")
+
+# orders
+declare_index("orders", [("user", ASC), ("created_at", DESC), ("_id", DESC)], "/orders/my keyset pages, coupon new-user check")
+declare_index("orders", [("order_status", ASC), ("created_at", DESC), ("_id", DESC)], "admin send_orders status filter, delivery /available")
+declare_index("orders", [("delivery_partner", ASC), ("order_status", ASC), ("created_at", DESC), ("_id", DESC)], "delivery /assigned")
+declare_index("orders", [("delivery_partner", ASC), ("order_status", ASC), ("updated_at", DESC), ("_id", DESC)], "delivery /delivered")
+declare_index("orders", [("created_at", DESC)], "admin send_orders, analytics, download")
+
+# carts
+declare_index("carts", [("user", ASC)], "cart routes, order service cart clear")
+
+# user_addresses
+declare_index("user_addresses", [("user_id", ASC), ("is_default", DESC), ("created_at", DESC)], "address list, count and label checks")
+
+# tokens
+declare_index("refresh_tokens", [("jti", ASC)], "auth refresh token lookup", unique=True)
+declare_index("password_reset_tokens", [("token", ASC)], "password reset lookup")
+declare_index("password_reset_tokens", [("user_id", ASC), ("used", ASC)], "password reset invalidation")
+
+# support
+declare_index("support_tickets", [("user_id", ASC), ("created_at", DESC), ("_id", DESC)], "/support/tickets")
+declare_index("support_tickets", [("status", ASC), ("created_at", DESC), ("_id", DESC)], "admin get_tickets status filter")
+declare_index("support_tickets", [("created_at", DESC), ("_id", DESC)], "admin get_tickets")
+declare_index("product_requests", [("user_id", ASC), ("created_at", DESC)], "/support/product-requests, duplicate check")
+declare_index("product_requests", [("created_at", DESC)], "admin get_requests")
+declare_index("product_request_votes", [("request_id", ASC), ("user_id", ASC)], "product request voting", unique=True)
+
+# coupons / settings / delivery partners
+declare_index("discount_coupons", [("code", ASC)], "coupon validation, order promo usage", unique=True)
+declare_index("pricing_config", [("active", ASC)], "pricing config lookups")
+declare_index("delivery_partners", [("user_id", ASC)], "admin delivery partner profile")
+
+async def reconcile_indexes(db, dry_run: bool = False, drop_undeclared: bool = False) -> Dict[str, Any]:
+    """Diff declared indexes against the database and converge.
+
+    Missing indexes are created. With ``drop_undeclared`` indexes whose definition
+    changed are rebuilt and indexes nobody declares are dropped; otherwise both are
+    only reported. With ``dry_run`` nothing is touched and the report only says
+    what would happen.
+    """
+    report = {"dry_run": dry_run, "created": [], "changed": [], "dropped": [], "undeclared": [], "errors": []}
+
+    existing_collections = set(await db.db.list_collection_names())
+
+    for collection, specs in INDEX_REGISTRY.items():
+        existing = {}
+        if collection in existing_collections:
+            existing = await db.db[collection].index_information()
+
+        declared_names = set()
+        for spec in specs:
+            declared_names.add(spec.name)
+            info = existing.get(spec.name) or _find_by_keys(existing, spec.keys)
+
+            if info is not None and spec.matches(info):
+                continue
+
+            if info is not None:
+                report["changed"].append(spec.to_dict())
+                if dry_run or not drop_undeclared:
+                    continue
+                current_name = spec.name if spec.name in existing else _name_for_keys(existing, spec.keys)
+                await _apply(report, db.db[collection].drop_index, current_name, spec)
+            else:
+                report["created"].append(spec.to_dict())
+                if dry_run:
+                    continue
+
+            await _apply(report, db.db[collection].create_index, spec.keys, spec, name=spec.name, **spec.options)
+
+        for name, info in existing.items():
+            if name == "_id_" or name in declared_names:
+                continue
+            if any(_same_keys(info, spec.keys) for spec in specs):
+                continue
+
+            undeclared = {"collection": collection, "name": name, "keys": info.get("key")}
+            report["undeclared"].append(undeclared)
+            if drop_undeclared and not dry_run:
+                await _apply(report, db.db[collection].drop_index, name, None)
+                report["dropped"].append(undeclared)
+
+    _log_report(report)
+    return report
+
+async def _apply(report: Dict[str, Any], operation, argument, spec: Optional[IndexSpec], **kwargs):
+    try:
+        await operation(argument, **kwargs)
+    except Exception as e:
+        target = spec.name if spec else argument
+        operation_name = getattr(operation, "__name__", "index operation")
+        logger.error(f"Index operation {operation_name} failed for {target}: {e}")
+        report["errors"].append({"index": target, "operation": operation_name, "error": str(e)})
+
+def _same_keys(info: Dict[str, Any], keys: List[Tuple[str, Any]]) -> bool:
+    # Raw values: "text", "2dsphere" or "hashed" keys just don't match, and 1.0 == 1
+    return [(field, direction) for field, direction in info.get("key", [])] == keys
+
+def _find_by_keys(existing: Dict[str, Any], keys: List[Tuple[str, int]]) -> Optional[Dict[str, Any]]:
+    name = _name_for_keys(existing, keys)
+    return existing.get(name) if name else None
+
+def _name_for_keys(existing: Dict[str, Any], keys: List[Tuple[str, int]]) -> Optional[str]:
+    for name, info in existing.items():
+        if _same_keys(info, keys):
+            return name
+    return None
+
+def _log_report(report: Dict[str, Any]):
+    prefix = "[dry run] " if report["dry_run"] else ""
+    for spec in report["created"]:
+        logger.info(f"{prefix}Create index {spec['collection']}.{spec['name']} for {spec['used_by']}")
+    for spec in report["changed"]:
+        logger.warning(f"{prefix}Index definition changed: {spec['collection']}.{spec['name']}")
+    for index in report["undeclared"]:
+        logger.warning(f"{prefix}Undeclared index {index['collection']}.{index['name']}")
+    logger.info(
+        f"{prefix}Index reconciliation: {len(report['created'])} missing, {len(report['changed'])} changed, "
+        f"{len(report['undeclared'])} undeclared, {len(report['errors'])} errors"
+    )
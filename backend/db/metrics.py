@@ -0,0 +1,213 @@
+from typing import Dict, Any, List, Optional
+from collections import deque
+from datetime import datetime
+from dotenv import load_dotenv
+import bson
+import json
+import logging
+import os
+import time
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open ended
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+SAMPLES_PER_SHAPE = 1024
+
+def normalize_shape(value: Any) -> Any:
+    """Replace literal values in a filter/pipeline with '?' so queries group by shape"""
+    if isinstance(value, dict):
+        return {key: normalize_shape(value[key]) for key in sorted(value)}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = normalize_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return "?"
+
+def shape_key(operation: str, collection: str, query: Any) -> str:
+    return f"{collection}.{operation} {json.dumps(normalize_shape(query or {}), sort_keys=True)}"
+
+class ShapeStats:
+    """Latency histogram, document and byte counters for one query shape"""
+
+    def __init__(self, operation: str, collection: str, shape: Any):
+        self.operation = operation
+        self.collection = collection
+        self.shape = shape
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.samples = deque(maxlen=SAMPLES_PER_SHAPE)
+        self.docs_returned = 0
+        self.sampled_docs = 0
+        self.sampled_bytes = 0
+        self.slow_count = 0
+        self.explain: Optional[Dict[str, Any]] = None
+
+    def observe(self, duration_ms: float, docs: int):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.docs_returned += docs
+        self.samples.append(duration_ms)
+
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if duration_ms <= bound:
+                self.buckets[index] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        avg_doc_bytes = self.sampled_bytes / self.sampled_docs if self.sampled_docs else 0
+        return {
+            "collection": self.collection,
+            "operation": self.operation,
+            "shape": self.shape,
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0,
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(self.max_ms, 3),
+            "histogram": {
+                **{f"le_{bound}ms": count for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets)},
+                "inf": self.buckets[-1]
+            },
+            "docs_returned": self.docs_returned,
+            "bytes_decoded_est": int(avg_doc_bytes * self.docs_returned),
+            "slow_count": self.slow_count,
+            "explain": self.explain
+        }
+
+class QueryMetrics:
+    """Per-shape query timings shared by every DatabaseManager in the process"""
+
+    def __init__(self):
+        self.enabled = os.getenv('DB_METRICS_ENABLED', 'true').lower() == 'true'
+        self.slow_query_ms = float(os.getenv('DB_SLOW_QUERY_MS', 100))
+        # Measure BSON size of returned documents on every Nth call of a shape
+        self.byte_sample_every = max(1, int(os.getenv('DB_METRICS_BYTE_SAMPLE_EVERY', 10)))
+        # Documents examined per document returned above which an index is flagged as poor
+        self.poor_index_ratio = float(os.getenv('DB_POOR_INDEX_RATIO', 10))
+        self.explain_enabled = os.getenv('DB_EXPLAIN_SLOW_QUERIES', 'true').lower() == 'true'
+        self.shapes: Dict[str, ShapeStats] = {}
+        self.started_at = datetime.utcnow()
+
+    def record(self, operation: str, collection: str, query: Any, started: float, docs: Optional[List[Any]] = None, doc_count: Optional[int] = None) -> Optional[ShapeStats]:
+        """Record one call; returns the shape stats when the call was slow and still needs an explain"""
+        if not self.enabled:
+            return None
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        key = shape_key(operation, collection, query)
+        stats = self.shapes.get(key)
+        if stats is None:
+            stats = self.shapes[key] = ShapeStats(operation, collection, normalize_shape(query or {}))
+
+        returned = doc_count if doc_count is not None else len(docs or [])
+        stats.observe(duration_ms, returned)
+
+        if docs and stats.count % self.byte_sample_every == 1 % self.byte_sample_every:
+            try:
+                stats.sampled_bytes += sum(len(bson.encode(doc)) for doc in docs if isinstance(doc, dict))
+                stats.sampled_docs += len(docs)
+            except Exception:
+                pass
+
+        if duration_ms >= self.slow_query_ms:
+            stats.slow_count += 1
+            logger.warning(f"Slow query {key}: {duration_ms:.1f}ms, {returned} docs")
+            if self.explain_enabled and stats.explain is None:
+                stats.explain = {"status": "pending"}
+                return stats
+        return None
+
+    def summarize_explain(self, explain: Dict[str, Any]) -> Dict[str, Any]:
+        """Reduce an executionStats explain to the plan stages and the flags we care about"""
+        planner = explain.get("queryPlanner")
+        execution = explain.get("executionStats", {})
+        if planner is None and explain.get("stages"):
+            cursor_stage = explain["stages"][0].get("$cursor", {})
+            planner = cursor_stage.get("queryPlanner", {})
+            execution = cursor_stage.get("executionStats", {})
+        planner = planner or {}
+
+        stages = []
+        indexes = []
+        _walk_plan(planner.get("winningPlan", {}), stages, indexes)
+
+        docs_examined = execution.get("totalDocsExamined", 0)
+        keys_examined = execution.get("totalKeysExamined", 0)
+        returned = execution.get("nReturned", 0)
+        collscan = "COLLSCAN" in stages
+        poor_index = not collscan and docs_examined > self.poor_index_ratio * max(returned, 1)
+
+        return {
+            "status": "captured",
+            "captured_at": datetime.utcnow().isoformat(),
+            "stages": stages,
+            "indexes": indexes,
+            "docs_examined": docs_examined,
+            "keys_examined": keys_examined,
+            "returned": returned,
+            "execution_ms": execution.get("executionTimeMillis"),
+            "collscan": collscan,
+            "poor_index": poor_index,
+            "in_memory_sort": "SORT" in stages
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        shapes = sorted(self.shapes.values(), key=lambda stats: stats.total_ms, reverse=True)
+        return {
+            "started_at": self.started_at.isoformat(),
+            "generated_at": datetime.utcnow().isoformat(),
+            "slow_query_ms": self.slow_query_ms,
+            "total_ms": round(sum(stats.total_ms for stats in shapes), 3),
+            "shapes": [stats.to_dict() for stats in shapes],
+            "flagged": [
+                {"collection": stats.collection, "operation": stats.operation, "shape": stats.shape, "explain": stats.explain}
+                for stats in shapes
+                if stats.explain and (stats.explain.get("collscan") or stats.explain.get("poor_index"))
+            ]
+        }
+
+    def dump(self, path: str, extra: Optional[Dict[str, Any]] = None):
+        """Write the current snapshot (plus any extra sections) as JSON"""
+        with open(path, "w") as dump_file:
+            json.dump({**self.snapshot(), **(extra or {})}, dump_file, indent=2, default=str)
+        logger.info(f"Query metrics written to {path}")
+
+    def reset(self):
+        self.shapes.clear()
+        self.started_at = datetime.utcnow()
+
+def _walk_plan(stage: Dict[str, Any], stages: List[str], indexes: List[str]):
+    if not stage:
+        return
+    if stage.get("stage"):
+        stages.append(stage["stage"])
+    if stage.get("indexName"):
+        indexes.append(stage["indexName"])
+    if stage.get("inputStage"):
+        _walk_plan(stage["inputStage"], stages, indexes)
+    for child in stage.get("inputStages", []):
+        _walk_plan(child, stages, indexes)
+    if stage.get("queryPlan"):
+        _walk_plan(stage["queryPlan"], stages, indexes)
+
+query_metrics = QueryMetrics()
@@ -0,0 +1,82 @@
+from typing import Dict, Any, List, Optional, Tuple
+from bson import json_util
+import base64
+import binascii
+
+# Page size used by list endpoints that had no pagination before, once a client opts in
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(document: Dict[str, Any], sort_field: str = "created_at") -> str:
+    """Opaque cursor pointing just after ``document`` in a (sort_field, _id) ordering"""
+    payload = json_util.dumps({"v": document.get(sort_field), "id": document["_id"]})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Any, Any]:
+    """Return the (sort value, _id) pair of a cursor; raises ValueError when it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return payload["v"], payload["id"]
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid pagination cursor: {e}")
+
+def keyset_sort(sort_field: str = "created_at", direction: int = -1) -> List[Tuple[str, int]]:
+    """Sort for keyset pages; _id breaks ties so the order is total"""
+    return [(sort_field, direction), ("_id", direction)]
+
+def keyset_filter(cursor: str, sort_field: str = "created_at", direction: int = -1) -> Dict[str, Any]:
+    """Filter selecting the documents that come after ``cursor`` in ``keyset_sort`` order"""
+    value, last_id = decode_cursor(cursor)
+    op = "$lt" if direction < 0 else "$gt"
+
+    if value is None:
+        # Missing sort values sort lowest: last when descending, first when ascending
+        same_value = {sort_field: None, "_id": {op: last_id}}
+        if direction < 0:
+            return same_value
+        return {"$or": [same_value, {sort_field: {"$ne": None}}]}
+
+    return {"$or": [
+        {sort_field: {op: value}},
+        {sort_field: value, "_id": {op: last_id}}
+    ]}
+
+def apply_cursor(query: Dict[str, Any], cursor: Optional[str], sort_field: str = "created_at", direction: int = -1) -> Dict[str, Any]:
+    """AND the keyset filter onto an existing query (which may carry its own $or)"""
+    if not cursor:
+        return query
+    keyset = keyset_filter(cursor, sort_field, direction)
+    if not query:
+        return keyset
+    return {"$and": [query, keyset]}
+
+def split_page(documents: List[Dict[str, Any]], limit: int, sort_field: str = "created_at") -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Trim a limit+1 fetch to ``limit`` and return the cursor for the next page (None on the last).
+
+    A ``limit`` of 0 means the fetch was unbounded: everything is one page.
+    """
+    if not limit or len(documents) <= limit:
+        return documents, None
+    page = documents[:limit]
+    return page, encode_cursor(page[-1], sort_field)
+
+def opt_in_limit(limit: Optional[int], cursor: Optional[str], default: int = DEFAULT_PAGE_LIMIT, maximum: int = MAX_PAGE_LIMIT) -> int:
+    """Page size for list endpoints that returned every row before they were paginated.
+
+    Clients that send neither ``limit`` nor ``cursor`` keep the old unbounded result
+    (0, no limit); the others get ``clamp_limit`` pages. Fetch ``limit + 1`` when it
+    is non-zero, and 0 (no limit) otherwise.
+    """
+    if limit is None and not cursor:
+        return 0
+    return clamp_limit(limit, default, maximum)
+
+def clamp_limit(limit: Optional[int], default: int = DEFAULT_PAGE_LIMIT, maximum: int = MAX_PAGE_LIMIT) -> int:
+    try:
+        limit = int(limit) if limit is not None else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
@@ -0,0 +1,55 @@
+from typing import Dict, Any, Optional, Union
+
+# Named projection profiles for the hot read paths. Routes pass the profile
+# name (or a raw projection dict) to any DatabaseManager read method so only
+# the fields they actually use are decoded and sent over the wire.
+PROJECTIONS: Dict[str, Dict[str, Any]] = {
+    # Product tile / order line item: name and images only
+    "product_card": {
+        "name": 1,
+        "images": 1,
+        "image": 1,
+        "price": 1,
+        "stock": 1,
+    },
+    # Stock check during checkout and cart updates
+    "product_stock": {
+        "name": 1,
+        "stock": 1,
+        "price": 1,
+        "is_active": 1,
+    },
+    # Everything decode_token needs to build a UserinDB
+    "user_principal": {
+        "email": 1,
+        "role": 1,
+        "name": 1,
+        "is_active": 1,
+    },
+    # Contact details shown next to orders and tickets
+    "user_contact": {
+        "name": 1,
+        "email": 1,
+        "phone": 1,
+    },
+    # Order list rows without the status history (opt-in, the response then carries an
+    # empty history)
+    "order_summary": {
+        "status_change_history": 0,
+    },
+    # Public-facing user documents never carry credentials
+    "user_public": {
+        "hashed_password": 0,
+        "password": 0,
+    },
+}
+
+def get_projection(projection: Optional[Union[str, Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """Resolve a projection profile name or pass a raw projection dict through"""
+    if projection is None or isinstance(projection, dict):
+        return projection
+
+    try:
+        return PROJECTIONS[projection]
+    except KeyError:
+        raise ValueError(f"Unknown projection profile: {projection}")
@@ -0,0 +1,157 @@
+from typing import Dict, Any, Optional, Tuple, Iterable, Set
+from collections import OrderedDict
+from bson import json_util
+from dotenv import load_dotenv
+import copy
+import logging
+import os
+import time
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# collection:ttl_seconds pairs cached out of the box; reference data read on every request.
+# The cache is per process and only change streams invalidate it across workers, so
+# data that checkout decides on (coupons, pricing) is not cached by default.
+DEFAULT_CACHED_COLLECTIONS = "categories:300,brands:300"
+
+def cache_settings() -> Dict[str, float]:
+    """Collections to cache and their TTLs from QUERY_CACHE_COLLECTIONS (empty string disables)"""
+    settings = {}
+    for entry in os.getenv('QUERY_CACHE_COLLECTIONS', DEFAULT_CACHED_COLLECTIONS).split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        collection, _, ttl = entry.partition(":")
+        settings[collection.strip()] = float(ttl) if ttl else float(os.getenv('QUERY_CACHE_TTL', 60))
+    return settings
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0,
+            "invalidations": self.invalidations
+        }
+
+class QueryCache:
+    """TTL + LRU cache of read results for opted-in collections.
+
+    Entries are keyed by operation and normalized query and grouped by collection so
+    a write through the same DatabaseManager drops every cached read of that
+    collection. Writes made by other processes are only picked up once the TTL
+    expires. Values are deep-copied in and out so callers can mutate what they get.
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or int(os.getenv('QUERY_CACHE_MAX_ENTRIES', 2000))
+        self.ttls: Dict[str, float] = {}
+        # Per collection, fields whose updates leave cached reads to expire by TTL
+        self.ttl_only_fields: Dict[str, frozenset] = {}
+        self._entries: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        self._keys_by_collection: Dict[str, set] = {}
+        # Bumped on every invalidation; a read that raced a write must not refill the cache
+        self._generations: Dict[str, int] = {}
+        self.stats: Dict[str, CacheStats] = {}
+        self.evictions = 0
+
+    def enable(self, collection: str, ttl: float, ttl_only_fields: Iterable[str] = ()):
+        """Cache reads of ``collection`` for ``ttl`` seconds.
+
+        Change-stream updates that touch nothing but ``ttl_only_fields`` don't invalidate;
+        cached reads may trail those fields by up to the TTL.
+        """
+        self.ttls[collection] = ttl
+        self.ttl_only_fields[collection] = frozenset(ttl_only_fields)
+        self.stats.setdefault(collection, CacheStats())
+        logger.info(f"Query cache enabled for {collection} (ttl {ttl}s)")
+
+    def disable(self, collection: str):
+        self.ttls.pop(collection, None)
+        self.invalidate(collection)
+
+    def is_enabled(self, collection: str) -> bool:
+        return collection in self.ttls
+
+    def ignores(self, collection: str, fields: Optional[Set[str]]) -> bool:
+        """True when an update that changed ``fields`` (None: not an update) can wait for the TTL"""
+        return fields is not None and fields <= self.ttl_only_fields.get(collection, frozenset())
+
+    def generation(self, collection: str) -> int:
+        return self._generations.get(collection, 0)
+
+    @staticmethod
+    def make_key(operation: str, collection: str, *parts: Any) -> str:
+        return f"{collection}.{operation} {json_util.dumps(parts, sort_keys=True)}"
+
+    def get(self, key: str, collection: str) -> Tuple[bool, Any]:
+        """Return (hit, value); misses and expired entries return (False, None)"""
+        stats = self.stats.setdefault(collection, CacheStats())
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._drop(key)
+            stats.misses += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        stats.hits += 1
+        return True, copy.deepcopy(entry[2])
+
+    def set(self, key: str, collection: str, value: Any, generation: int):
+        if not self.is_enabled(collection) or generation != self.generation(collection):
+            return
+        self._entries[key] = (time.monotonic() + self.ttls[collection], collection, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        self._keys_by_collection.setdefault(collection, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def invalidate(self, collection: str):
+        """Forget every cached read of ``collection``"""
+        self._generations[collection] = self.generation(collection) + 1
+        keys = self._keys_by_collection.pop(collection, set())
+        for key in keys:
+            self._entries.pop(key, None)
+        if collection in self.stats:
+            self.stats[collection].invalidations += 1
+
+    def clear(self):
+        for collection in list(self._keys_by_collection):
+            self.invalidate(collection)
+        self._entries.clear()
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_collection.get(entry[1])
+            if keys is not None:
+                keys.discard(key)
+
+    def snapshot(self) -> Dict[str, Any]:
+        totals = CacheStats()
+        for stats in self.stats.values():
+            totals.hits += stats.hits
+            totals.misses += stats.misses
+            totals.invalidations += stats.invalidations
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "ttls": self.ttls,
+            **totals.to_dict(),
+            "collections": {collection: stats.to_dict() for collection, stats in self.stats.items()}
+        }
+
+query_cache = QueryCache()
@@ -0,0 +1,110 @@
+from typing import Dict, Any, Optional
+from db.db_connection import get_connection, warm_pool
+from db.db_manager import DatabaseManager
+from db.query_cache import cache_settings
+from dotenv import load_dotenv
+import httpx
+import logging
+import os
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+class AppResources:
+    """Process-wide resources shared by the /api and /admin sub-apps.
+
+    main.lifespan starts and closes it; routes and handlers receive the same
+    DatabaseManager, HTTP client and caches instead of building their own.
+    """
+
+    def __init__(self):
+        self._db: Optional[DatabaseManager] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self.caches: Dict[str, Any] = {}
+        # ChangeStreamListener, set by main.lifespan when CHANGE_STREAMS_ENABLED
+        self.change_streams = None
+        # CatalogSnapshots, set by main.lifespan when CATALOG_SNAPSHOT_PATH is configured
+        self.catalog_snapshots = None
+        # CatalogFollower, set by main.lifespan when change streams are off
+        self.catalog_follower = None
+        # product_stats StatsRecorder, started by main.lifespan
+        self.stats_recorder = None
+        self.started = False
+
+    @property
+    def db(self) -> DatabaseManager:
+        # Created lazily so modules can grab it at import time, before lifespan runs
+        if self._db is None:
+            self._db = DatabaseManager(get_connection(), os.getenv('DB_NAME'))
+            for collection, ttl in cache_settings().items():
+                self._db.enable_cache(collection, ttl)
+            self.register_cache("query", self._db.cache)
+        return self._db
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                timeout=float(os.getenv('HTTP_CLIENT_TIMEOUT', 10.0)),
+                limits=httpx.Limits(
+                    max_connections=int(os.getenv('HTTP_CLIENT_MAX_CONNECTIONS', 100)),
+                    max_keepalive_connections=int(os.getenv('HTTP_CLIENT_MAX_KEEPALIVE', 20))
+                )
+            )
+        return self._http_client
+
+    def register_cache(self, name: str, cache: Any) -> Any:
+        """Keep a cache alive for the process lifetime and make it reachable by name"""
+        self.caches[name] = cache
+        return cache
+
+    def get_cache(self, name: str) -> Any:
+        return self.caches.get(name)
+
+    async def startup(self):
+        if self.started:
+            return
+        await self.db.client.admin.command('ping') #test the db connection
+        logger.info("Database connected successfully!!")
+
+        await warm_pool(self.db.client)
+        self.started = True
+
+    async def shutdown(self):
+        if self.change_streams is not None:
+            await self.change_streams.stop()
+            self.change_streams = None
+
+        if self.catalog_follower is not None:
+            await self.catalog_follower.stop()
+            self.catalog_follower = None
+
+        if self.catalog_snapshots is not None:
+            await self.catalog_snapshots.stop()
+            self.catalog_snapshots = None
+
+        if self.stats_recorder is not None:
+            # Flushes buffered views, so it runs before the client closes
+            await self.stats_recorder.stop()
+            self.stats_recorder = None
+
+        if self._http_client is not None and not self._http_client.is_closed:
+            await self._http_client.aclose()
+            logger.info("HTTP client closed")
+
+        for name, cache in self.caches.items():
+            if hasattr(cache, "clear"):
+                cache.clear()
+        self.caches.clear()
+
+        if self._db is not None:
+            self._db.client.close()
+            logger.info("Database connecton closed")
+
+        self.started = False
+
+resources = AppResources()
+
+def get_resources() -> AppResources:
+    return resources
@@ -0,0 +1,96 @@
+from typing import Dict, Any, List, Optional, Tuple
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+import time
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_COLLECTION = "collection_versions"
+
+# Collections whose versions back catalog ETags
+DEFAULT_VERSIONED_COLLECTIONS = "catalog_view,categories,brands,pricing_config"
+
+class CollectionVersions:
+    """Per-collection write counters, the validators behind catalog ETags.
+
+    Counters live in ``collection_versions`` ({_id: collection, version}) so all workers
+    agree on them. Writes through DatabaseManager bump the counter ($inc, in the
+    background) and drop this worker's copy. Other workers re-read a counter once their
+    copy is older than VERSION_TTL seconds. With change streams on, they hear about it
+    right away. A conditional GET costs no Mongo read while the copy is fresh.
+    """
+
+    def __init__(self, collections: List[str], ttl: float):
+        self.collections = set(collections)
+        self.ttl = ttl
+        self._local: Dict[str, Tuple[int, float]] = {}
+        self._tasks: set = set()
+
+    @classmethod
+    def from_env(cls) -> "CollectionVersions":
+        collections = [
+            name.strip() for name in os.getenv('VERSIONED_COLLECTIONS', DEFAULT_VERSIONED_COLLECTIONS).split(",")
+            if name.strip()
+        ]
+        return cls(collections, float(os.getenv('VERSION_TTL', 5)))
+
+    def tracks(self, collection: str) -> bool:
+        return collection in self.collections
+
+    def bump(self, database, collection: str):
+        """Record a write to ``collection``; ``database`` is the Motor database"""
+        if collection not in self.collections:
+            return
+        self._local.pop(collection, None)
+        task = asyncio.ensure_future(self._increment(database, collection))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _increment(self, database, collection: str):
+        try:
+            await database[VERSIONS_COLLECTION].update_one(
+                {"_id": collection},
+                {"$inc": {"version": 1}, "$currentDate": {"updated_at": True}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to bump {collection} version: {e}")
+        # A read that raced the increment may have cached the old value
+        self._local.pop(collection, None)
+
+    def forget(self, collection: Optional[str] = None):
+        """Drop the local copy of one counter, or of all of them"""
+        if collection is None:
+            self._local.clear()
+        else:
+            self._local.pop(collection, None)
+
+    async def get(self, database, collections: List[str]) -> Dict[str, int]:
+        now = time.monotonic()
+        stale = [name for name in collections if name not in self._local or self._local[name][1] + self.ttl < now]
+        if stale:
+            documents = await database[VERSIONS_COLLECTION].find({"_id": {"$in": stale}}).to_list(length=None)
+            found = {document["_id"]: document.get("version", 0) for document in documents}
+            for name in stale:
+                self._local[name] = (found.get(name, 0), now)
+        return {name: self._local[name][0] for name in collections}
+
+    def change_stream_subscriber(self):
+        """Subscriber for collection_versions change events published by ChangeStreamListener"""
+        def on_event(collection: str, event: Dict[str, Any]):
+            changed = (event.get("documentKey") or {}).get("_id")
+            self.forget(changed if collection != "*" else None)
+        return on_event
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "collections": sorted(self.collections),
+            "ttl": self.ttl,
+            "versions": {name: version for name, (version, _) in self._local.items()}
+        }
+
+collection_versions = CollectionVersions.from_env()
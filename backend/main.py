@@ -3,7 +3,19 @@ from app.app import create_customer_app
 from admin.app import create_admin_app
 from contextlib import asynccontextmanager
 import logging
-from db.db_manager import get_database
+from db.resources import resources
+from db.indexes import reconcile_indexes
+from db import catalog_view
+from app.services.search_index import product_search_index
+from app.services.suggest_index import suggest_index
+from app.services.columnar_catalog import columnar_catalog
+from app.services.catalog_snapshot import CatalogSnapshots
+from app.services.catalog_follower import CatalogFollower
+from app.services.product_stats import stats_recorder
+from app.services import catalog_counts, catalog_facets
+from db.db_connection import pool_metrics
+from db.change_streams import ChangeStreamListener, change_stream_settings
+from db.versions import VERSIONS_COLLECTION
 import os
 from dotenv import load_dotenv
 
@@ -15,18 +27,71 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# $sortArray (app.services.recommendations) needs 5.2; $lookup with both localField
+# and a pipeline (db.catalog_view) needs 5.0
+MIN_SERVER_VERSION = (5, 2)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     try:
-        db = get_database()
-        app.state.db = db
+        await resources.startup()
+        db = resources.db
 
-        db.client.admin.command('ping') #test the db connection
-        logger.info("Database connected successfully!!")
+        # Mounted sub-apps don't run their own lifespan, share the container with them
+        for target in (app, app.state.customer_app, app.state.ws_app):
+            target.state.resources = resources
+            target.state.db = db
         
+        await check_server_version(db)
         await create_indexes(db)
-
-        logger.info("Database indexes created...")
+        await catalog_view.ensure_built(db)
+        catalog_view.add_listener(catalog_counts.on_catalog_change)
+        catalog_view.add_listener(catalog_facets.on_catalog_change)
+        for index in (product_search_index, suggest_index, columnar_catalog):
+            catalog_view.add_listener(index.on_catalog_change)
+        # Search and suggestions don't index stock
+        catalog_view.add_stock_listener(columnar_catalog.on_stock_change)
+
+        # With CATALOG_SNAPSHOT_PATH set the columnar catalog is shared through a mapped file
+        snapshots = CatalogSnapshots.from_env(columnar_catalog)
+
+        # Other workers' catalog edits reach the in-process structures through change
+        # streams when they are on, otherwise through the follower's polling
+        settings = change_stream_settings()
+        if not settings["enabled"]:
+            followers = [index.on_catalog_change for index in (product_search_index, suggest_index, columnar_catalog)]
+            if snapshots is not None:
+                followers.append(snapshots.on_remote_change)
+            follower = CatalogFollower.from_env(followers)
+            if follower is not None:
+                # Before the loads, so a write during them isn't missed
+                await follower.start(db)
+                resources.catalog_follower = follower
+
+        await product_search_index.load(db)
+        await suggest_index.load(db)
+        if snapshots is not None:
+            catalog_view.add_listener(snapshots.on_catalog_change)
+            catalog_view.add_stock_listener(snapshots.on_stock_change)
+            await snapshots.start(db)
+            resources.catalog_snapshots = snapshots
+        else:
+            await columnar_catalog.load(db)
+
+        await stats_recorder.start(db)
+        resources.stats_recorder = stats_recorder
+
+        if settings["enabled"]:
+            listener = ChangeStreamListener(db.db, settings["collections"], settings["max_backoff"])
+            for cache in resources.caches.values():
+                listener.subscribe_cache(cache)
+            for index in (product_search_index, suggest_index, columnar_catalog):
+                listener.subscribe(index.change_stream_subscriber(db), [catalog_view.CATALOG_VIEW])
+            listener.subscribe(db.versions.change_stream_subscriber(), [VERSIONS_COLLECTION])
+            if snapshots is not None:
+                listener.subscribe(snapshots.change_stream_subscriber(), [catalog_view.CATALOG_VIEW])
+            await listener.start()
+            resources.change_streams = listener
 
     except Exception as e:
         logger.info(f"Failed to initiate the appication: {str(e)}")
@@ -34,25 +99,45 @@ async def lifespan(app: FastAPI):
 
     yield
     #cleanup the shutdowm
-    if hasattr(app.state,'db'):
-        app.state.db.client.close()
-        logger.info("Database connecton closed")
+    dump_path = os.getenv('DB_METRICS_DUMP_PATH')
+    if dump_path:
+        try:
+            resources.db.metrics.dump(dump_path, {"pool": pool_metrics.snapshot(), "cache": resources.db.cache.snapshot()})
+        except Exception as e:
+            logger.error(f"Failed to dump query metrics: {str(e)}")
 
-async def create_indexes(db):
-    try:
-        #user indexing
-        await db.db['users'].create_index("email",unique = True)
-        # await db.db['users'].create_index('phone',unique=True)
-        await db.db['users'].create_index('role')
+    await resources.shutdown()
 
-        #product indexing
-        await db.db['products'].create_index("name")
-        await db.db['products'].create_index("category")
-        await db.db['products'].create_index("price")
+async def check_server_version(db):
+    """Warn at startup rather than on the first order or catalog rebuild"""
+    try:
+        version = await db.server_version()
+    except Exception as e:
+        logger.error(f"Failed to read the MongoDB server version: {str(e)}")
+        return
+    if version < MIN_SERVER_VERSION:
+        required = ".".join(str(part) for part in MIN_SERVER_VERSION)
+        logger.warning(
+            f"MongoDB {'.'.join(str(part) for part in version)} is older than {required}: "
+            f"catalog view rebuilds and order recommendation updates will fail"
+        )
 
-        logger.info("All indexes created successfully!!")
+async def create_indexes(db):
+    """Reconcile declared indexes; INDEX_RECONCILE_MODE is apply, dry_run or off"""
+    mode = os.getenv('INDEX_RECONCILE_MODE', 'apply').lower()
+    if mode == 'off':
+        logger.info("Index reconciliation disabled")
+        return None
+    try:
+        report = await reconcile_indexes(
+            db,
+            dry_run = mode == 'dry_run',
+            drop_undeclared = os.getenv('INDEX_DROP_UNDECLARED', 'false').lower() == 'true'
+        )
+        logger.info("Database indexes reconciled")
+        return report
     except Exception as e:
-        logger.info(f"Error creating indexes: {str(e)}")
+        logger.info(f"Error reconciling indexes: {str(e)}")
 
 app = FastAPI(
     title = "Main-Server",
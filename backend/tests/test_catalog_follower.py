@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app.services import catalog_follower
+from app.services.catalog_follower import CatalogFollower
+from db.catalog_view import CATALOG_VIEW, SYNC_FIELD, TOMBSTONES
+
+START = datetime(2024, 5, 1)
+
+class Untracked:
+    def tracks(self, collection):
+        return False
+
+class Documents:
+    """find_many over in-memory collections, for the $ne/$gte filters the follower sends"""
+
+    def __init__(self):
+        self.collections = {CATALOG_VIEW: [], TOMBSTONES: []}
+
+    async def find_many(self, collection, filter_dict, projection=None, sort=None, limit=0):
+        (field, condition), = filter_dict.items()
+        documents = [d for d in self.collections[collection] if d.get(field) is not None]
+        if "$gte" in condition:
+            documents = [d for d in documents if d[field] >= condition["$gte"]]
+        (sort_field, direction), = sort
+        documents.sort(key=lambda d: d[sort_field], reverse=direction < 0)
+        return documents[:limit] if limit else documents
+
+def _follower(monkeypatch, db):
+    monkeypatch.setattr(catalog_follower, "collection_versions", Untracked())
+    heard = []
+
+    async def listener(db, product_ids):
+        heard.append(None if product_ids is None else set(product_ids))
+
+    follower = CatalogFollower([listener])
+    follower._db = db
+    return follower, heard
+
+def test_poll_hands_over_changed_and_removed_ids(monkeypatch):
+    db = Documents()
+    old = {"_id": ObjectId(), SYNC_FIELD: START}
+    db.collections[CATALOG_VIEW].append(old)
+    follower, heard = _follower(monkeypatch, db)
+    follower._synced_since = START + timedelta(minutes=10)
+
+    edited = {"_id": ObjectId(), SYNC_FIELD: START + timedelta(minutes=11)}
+    gone = {"_id": ObjectId(), "removed_at": START + timedelta(minutes=12)}
+    db.collections[CATALOG_VIEW].append(edited)
+    db.collections[TOMBSTONES].append(gone)
+    asyncio.run(follower.poll())
+
+    assert heard == [{edited["_id"], gone["_id"]}]
+    assert follower._synced_since == edited[SYNC_FIELD]
+    assert follower._removed_since == gone["removed_at"]
+
+def test_poll_without_changes_calls_nobody(monkeypatch):
+    db = Documents()
+    follower, heard = _follower(monkeypatch, db)
+    asyncio.run(follower.poll())
+    assert heard == []
+
+def test_too_many_changes_reload_in_full(monkeypatch):
+    db = Documents()
+    monkeypatch.setattr(catalog_follower, "MAX_REFRESH", 2)
+    db.collections[CATALOG_VIEW].extend({"_id": ObjectId(), SYNC_FIELD: START + timedelta(seconds=i)} for i in range(3))
+    follower, heard = _follower(monkeypatch, db)
+    asyncio.run(follower.poll())
+    assert heard == [None]
+    assert follower._synced_since == START + timedelta(seconds=2)
@@ -0,0 +1,49 @@
+import asyncio
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app.services.catalog_snapshot import CatalogSnapshots, map_snapshot, write_snapshot
+from app.services.columnar_catalog import ColumnarCatalog
+
+def _catalog():
+    catalog = ColumnarCatalog()
+    catalog.ready = True
+    category = {"_id": ObjectId(), "name": "Fruit"}
+    for i in range(5):
+        catalog.add({
+            "_id": ObjectId(),
+            "name": f"product {i}",
+            "price": 10.0 + i,
+            "stock": i,
+            "category": category,
+            "created_at": datetime(2024, 5, 1) + timedelta(minutes=i),
+            "tags": ["fresh"],
+        })
+    return catalog, category
+
+def test_write_map_roundtrip(tmp_path):
+    catalog, category = _catalog()
+    path = str(tmp_path / "catalog.snap")
+    version = asyncio.run(write_snapshot(catalog, path))
+
+    state, mapped_version = map_snapshot(path)
+    reader = ColumnarCatalog()
+    reader.attach(state)
+    assert mapped_version == version
+    assert reader.mapped and set(reader.rows) == set(catalog.rows)
+    query = {"category._id": category["_id"], "price": {"$gte": 12}}
+    assert reader.list_page(query, limit=10) == catalog.list_page(query, limit=10)
+
+def test_reader_changes_reach_the_builder(tmp_path):
+    path = str(tmp_path / "catalog.snap")
+    reader = CatalogSnapshots(ColumnarCatalog(), path)
+    builder = CatalogSnapshots(ColumnarCatalog(), path)
+    builder.is_builder = True
+    changed = [ObjectId(), ObjectId()]
+
+    asyncio.run(reader.on_catalog_change(None, [changed[0]]))
+    asyncio.run(reader.on_stock_change(None, {changed[1]: -1}))
+    assert builder._take_pending() == [str(product_id) for product_id in changed]
+    assert builder._take_pending() == []
+
+    asyncio.run(reader.on_catalog_change(None, None))
+    assert builder._take_pending() == ["*"]
@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app.services.columnar_catalog import ColumnarCatalog
+from db.pagination import encode_cursor
+
+FRUIT = ObjectId()
+DAIRY = ObjectId()
+START = datetime(2024, 5, 1)
+
+def _catalog(count=10):
+    catalog = ColumnarCatalog()
+    catalog.ready = True
+    products = []
+    for i in range(count):
+        product = {
+            "_id": ObjectId(),
+            "name": f"product {i}",
+            "price": float(i * 10),
+            "stock": i % 3,
+            "category": {"_id": FRUIT if i % 2 else DAIRY, "name": "Fruit" if i % 2 else "Dairy"},
+            # Two products per timestamp, so _id breaks ties
+            "created_at": START + timedelta(minutes=i // 2),
+        }
+        products.append(product)
+        catalog.add(product)
+    return catalog, products
+
+def _newest_first(products):
+    return sorted(products, key=lambda product: (product["created_at"], product["_id"]), reverse=True)
+
+def test_match_evaluates_product_query_filters():
+    catalog, products = _catalog()
+    mask = catalog.match({"category._id": FRUIT, "price": {"$gte": 30, "$lt": 80}, "stock": {"$gt": 0}})
+    expected = {p["_id"] for p in products if p["category"]["_id"] == FRUIT and 30 <= p["price"] < 80 and p["stock"] > 0}
+    assert {product_id for product_id, row in catalog.rows.items() if mask[row]} == expected
+
+def test_match_unknown_category_matches_nothing():
+    catalog, _ = _catalog()
+    assert not catalog.match({"category._id": ObjectId()}).any()
+
+def test_match_returns_none_for_filters_it_cannot_evaluate():
+    catalog, _ = _catalog()
+    assert catalog.match({"name": "product 1"}) is None
+    assert catalog.match({"price": {"$in": [10, 20]}}) is None
+
+def test_list_page_is_newest_first_with_total():
+    catalog, products = _catalog()
+    documents, total = catalog.list_page({}, skip=2, limit=3)
+    assert total == len(products)
+    assert [d["_id"] for d in documents] == [p["_id"] for p in _newest_first(products)[2:5]]
+
+def test_cursor_pages_walk_the_whole_listing_once():
+    catalog, products = _catalog()
+    seen, cursor = [], None
+    while True:
+        documents, _ = catalog.list_page({}, limit=3, cursor=cursor)
+        if not documents:
+            break
+        seen.extend(d["_id"] for d in documents)
+        cursor = encode_cursor(documents[-1])
+    assert seen == [p["_id"] for p in _newest_first(products)]
+
+def test_after_cursor_breaks_created_at_ties_by_id():
+    catalog, products = _catalog()
+    ordered = _newest_first(products)
+    # ordered[0] and ordered[1] share created_at
+    mask = catalog._after_cursor(encode_cursor(ordered[0]))
+    assert {product_id for product_id, row in catalog.rows.items() if mask[row]} == {p["_id"] for p in ordered[1:]}
+
+def test_removed_rows_are_reused_and_unlisted():
+    catalog, products = _catalog()
+    catalog.remove(products[0]["_id"])
+    documents, total = catalog.list_page({}, limit=100)
+    assert total == len(products) - 1
+    assert products[0]["_id"] not in {d["_id"] for d in documents}
+    replacement = {**products[0], "_id": ObjectId()}
+    catalog.add(replacement)
+    assert catalog.size == len(products)
+
+def test_stock_change_is_applied_in_place():
+    catalog, products = _catalog()
+    product = products[2]
+    asyncio.run(catalog.on_stock_change(None, {product["_id"]: -2, ObjectId(): -1}))
+    assert catalog.stock[catalog.rows[product["_id"]]] == product["stock"] - 2
+    assert catalog.documents([product["_id"]])[0]["stock"] == product["stock"] - 2
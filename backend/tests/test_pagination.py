@@ -0,0 +1,45 @@
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from db.pagination import (
+    MAX_PAGE_LIMIT, decode_cursor, encode_cursor, keyset_filter, opt_in_limit, split_page
+)
+
+def test_cursor_roundtrip_keeps_types():
+    document = {"_id": ObjectId(), "created_at": datetime(2024, 5, 1, 12, 30, 0, 123000), "price": 9.5}
+    assert decode_cursor(encode_cursor(document)) == (document["created_at"], document["_id"])
+    assert decode_cursor(encode_cursor(document, "price")) == (9.5, document["_id"])
+
+def test_cursor_for_missing_sort_value():
+    document = {"_id": ObjectId()}
+    assert decode_cursor(encode_cursor(document)) == (None, document["_id"])
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor({"_id": ObjectId(), "created_at": datetime(2024, 5, 1)})
+    assert not set(cursor) - set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "e30", "!!!!"])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def test_keyset_filter_descending():
+    document = {"_id": ObjectId(), "created_at": datetime(2024, 5, 1)}
+    assert keyset_filter(encode_cursor(document)) == {"$or": [
+        {"created_at": {"$lt": document["created_at"]}},
+        {"created_at": document["created_at"], "_id": {"$lt": document["_id"]}}
+    ]}
+
+def test_split_page_returns_cursor_only_when_more_remain():
+    documents = [{"_id": ObjectId(), "created_at": datetime(2024, 5, day)} for day in (3, 2, 1)]
+    page, cursor = split_page(documents, 2)
+    assert page == documents[:2]
+    assert decode_cursor(cursor) == (documents[1]["created_at"], documents[1]["_id"])
+    assert split_page(documents[:2], 2) == (documents[:2], None)
+    assert split_page(documents, 0) == (documents, None)
+
+def test_opt_in_limit():
+    assert opt_in_limit(None, None) == 0
+    assert opt_in_limit(10, None) == 10
+    assert opt_in_limit(None, "cursor", default=25) == 25
+    assert opt_in_limit(MAX_PAGE_LIMIT * 2, None) == MAX_PAGE_LIMIT
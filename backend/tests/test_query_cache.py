@@ -0,0 +1,32 @@
+import asyncio
+from db.change_streams import ChangeStreamListener
+from db.query_cache import QueryCache
+
+def _update(*fields):
+    return {"operationType": "update", "ns": {"coll": "catalog_view"}, "changedFields": list(fields)}
+
+def _listener_with(cache):
+    listener = ChangeStreamListener(None, ["catalog_view"])
+    listener.subscribe_cache(cache)
+    return listener
+
+def _cached(cache):
+    cache.set("key", "catalog_view", 1, cache.generation("catalog_view"))
+    return cache.get("key", "catalog_view")[0]
+
+def test_updates_to_ttl_only_fields_keep_entries():
+    cache = QueryCache(10)
+    cache.enable("catalog_view", 30, ttl_only_fields=("stock", "synced_at"))
+    listener = _listener_with(cache)
+    assert _cached(cache)
+    asyncio.run(listener._publish(_update("stock", "synced_at")))
+    assert cache.get("key", "catalog_view")[0]
+
+def test_other_changes_invalidate():
+    cache = QueryCache(10)
+    cache.enable("catalog_view", 30, ttl_only_fields=("stock",))
+    listener = _listener_with(cache)
+    for event in (_update("stock", "price"), _update("brand.name"), {"operationType": "replace", "ns": {"coll": "catalog_view"}}):
+        assert _cached(cache)
+        asyncio.run(listener._publish(event))
+        assert not cache.get("key", "catalog_view")[0]
@@ -0,0 +1,49 @@
+import numpy as np
+from bson import ObjectId
+from app.services.recommendations import CoOccurrence, _basket, basket_pairs
+
+def test_basket_pairs_are_every_ordered_pair_within_each_basket():
+    members = np.array([1, 2, 3, 7, 8], dtype=np.int64)
+    sizes = np.array([3, 2], dtype=np.int64)
+    left, right = basket_pairs(members, sizes)
+    assert sorted(zip(left.tolist(), right.tolist())) == sorted([
+        (1, 2), (1, 3), (2, 1), (2, 3), (3, 1), (3, 2), (7, 8), (8, 7)
+    ])
+
+def test_basket_pairs_of_single_item_baskets_is_empty():
+    left, right = basket_pairs(np.array([4, 5], dtype=np.int64), np.array([1, 1], dtype=np.int64))
+    assert len(left) == len(right) == 0
+
+def test_top_related_counts_orders_ranks_and_limits():
+    matrix = CoOccurrence()
+    for basket in (["a", "b", "c"], ["a", "b"], ["a", "c"], ["a", "b", "d"], ["e"]):
+        matrix.add(basket)
+    codes = matrix.codes
+    related = matrix.top_related(limit=2, min_count=1)
+
+    assert matrix.orders == 5
+    assert matrix.product_orders[codes["a"]] == 4
+    codes_a, counts_a = related[codes["a"]]
+    assert codes_a.tolist() == [codes["b"], codes["c"]]
+    assert counts_a.tolist() == [3, 2]
+    assert codes["e"] not in related
+
+def test_top_related_drops_pairs_under_min_count():
+    matrix = CoOccurrence()
+    for basket in (["a", "b"], ["a", "b"], ["a", "c"]):
+        matrix.add(basket)
+    related = matrix.top_related(limit=10, min_count=2)
+    assert related[matrix.codes["a"]][0].tolist() == [matrix.codes["b"]]
+    assert matrix.codes["c"] not in related
+
+def test_top_related_sums_counts_across_chunks():
+    matrix = CoOccurrence()
+    matrix.add(["a", "b"])
+    matrix._fold()
+    matrix.add(["b", "a"])
+    assert matrix.top_related(limit=10, min_count=2)[matrix.codes["a"]][1].tolist() == [2]
+
+def test_basket_skips_invalid_and_repeated_products():
+    product = str(ObjectId())
+    order = {"items": [{"product": product}, {"product": product}, {"product": "bad"}, {"product": None}]}
+    assert _basket(order) == [product]
@@ -0,0 +1,58 @@
+from bson import ObjectId
+from app.services.suggest_index import SuggestIndex, MAX_LIMIT
+
+def _product(name, brand=None, keywords=None):
+    product = {"_id": ObjectId(), "name": name, "keywords": keywords or []}
+    if brand:
+        product["brand"] = {"_id": ObjectId(), "name": brand}
+    return product
+
+def _loaded(products, popularity=None):
+    index = SuggestIndex()
+    index.popularity = popularity or {}
+    index._begin_load()
+    for product in products:
+        index.add(product)
+    index._end_load()
+    return index
+
+def test_bulk_load_sorts_keys_once():
+    index = _loaded([_product("Olive Oil"), _product("Fortune Sunflower Oil", "Fortune"), _product("Apple Juice")])
+    assert index.keys == sorted(index.keys)
+
+def test_ranks_by_popularity_then_kind_then_text():
+    oats, olive, oil = _product("Organic Oats"), _product("Olive Oil"), _product("Fortune Sunflower Oil")
+    index = _loaded([oats, olive, oil], {oats["_id"]: 5.0, olive["_id"]: 1.0})
+    assert [s["text"] for s in index.suggest("o")] == ["Organic Oats", "Olive Oil", "Fortune Sunflower Oil"]
+
+def test_shared_suggestion_sums_product_weights():
+    index = _loaded([_product("Fortune Sunflower Oil", "Fortune"), _product("Fortune Rice Bran Oil", "Fortune")])
+    top = index.suggest("fortune")[0]
+    assert (top["text"], top["type"], top["products"]) == ("Fortune", "brand", 2)
+
+def test_name_matched_through_several_suffixes_counts_once():
+    index = _loaded([_product("Oil Oil Oil")])
+    assert len(index.suggest("oil")) == 1
+
+def test_popular_match_past_many_unpopular_ones_is_found():
+    # The best match sorts alphabetically after every other one
+    products = [_product(f"a{i:04d}") for i in range(1000)]
+    best = _product("azzz")
+    index = _loaded(products + [best], {best["_id"]: 10.0})
+    assert index.suggest("a", 1)[0]["text"] == "azzz"
+
+def test_limit_is_capped():
+    index = _loaded([_product(f"item {i}") for i in range(MAX_LIMIT + 10)])
+    assert len(index.suggest("item", 100)) == MAX_LIMIT
+
+def test_incremental_changes_after_load_keep_keys_sorted_and_memo_fresh():
+    olive = _product("Olive Oil")
+    index = _loaded([olive])
+    assert [s["text"] for s in index.suggest("o")] == ["Olive Oil"]
+    oats = _product("Organic Oats")
+    index.popularity[oats["_id"]] = 3.0
+    index.add(oats)
+    assert index.keys == sorted(index.keys)
+    assert [s["text"] for s in index.suggest("o")] == ["Organic Oats", "Olive Oil"]
+    index.remove(oats["_id"])
+    assert [s["text"] for s in index.suggest("o")] == ["Olive Oil"]